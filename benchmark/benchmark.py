@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+性能测试：用合成的音乐库测量各处理过程的耗时、峰值内存和处理速度
+
+- make_names: 按标签分布（Zipf 偏斜）和文件名形式生成合成文件名
+- make_mp3: 生成由静音帧组成的极小 MP3 文件（不依赖 ffmpeg）
+- make_library: 在文件夹中生成合成音乐库
+- STAGES: 各处理过程的测试（准备函数、运行函数、所需依赖）
+- run_stage: 在独立进程中运行一个过程的测试，返回耗时、峰值内存（RSS）和处理速度
+- compare: 与之前的结果（JSON）比较，列出变慢的过程
+- main: 命令行入口，结果输出为 JSON，便于在不同提交之间比较
+
+用法：python benchmark/benchmark.py --sizes 100 1000 10000 -o result.json [--compare baseline.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from os import path, makedirs
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), 'mp3random'))
+
+from loudness import apply_gain  # noqa: E402
+from metadata import read_music_info  # noqa: E402
+from mp3_frames import mp3_info  # noqa: E402
+from mp3_operations import _re_name, backup, to_mp3, mp3_clip, mp3_gain, mp3_gain_native  # noqa: E402
+from randomization import _get_random, _label_stats, mp3_random  # noqa: E402
+from tokenizer import parse_name  # noqa: E402
+from tools import FFMPEG, MP3GAIN  # noqa: E402
+from utils import check_dependence  # noqa: E402
+
+try:  # Windows 下没有 resource 模块，不记录峰值内存
+    import resource
+except ImportError:
+    resource = None
+
+# MPEG-1 Layer III、128kbps、44.1kHz、立体声的静音帧（边信息和主数据全为 0），每帧 417 字节、约 26ms
+SILENT_FRAME = b'\xff\xfb\x90\x00' + bytes(413)
+# 文件名形式：普通、带切片时间、全角括号、重命名（括号内无时间）、无标签
+SHAPES = ('plain', 'clip', 'fullwidth', 'rename', 'nolabel')
+
+
+def make_names(count: int, labels: int = 20, skew: float = 1.0, shapes: tuple = SHAPES, seed: int = 0) -> list[str]:
+    """
+    生成合成文件名，标签数量按 Zipf 分布（第 k 个标签的权重为 1 / k^skew）
+
+    :param count: 文件数
+    :param labels: 标签数
+    :param skew: 偏斜程度，0 为均匀分布，越大则第一个标签越多
+    :param shapes: 文件名形式，从 SHAPES 中选择，按顺序轮流使用
+    :param seed: 随机种子
+    :return: 文件名列表（不重复）
+    """
+    rng = random.Random(seed)
+    weights = [1 / (k + 1) ** skew for k in range(labels)]
+    chosen = rng.choices(range(labels), weights, k=count)
+    names = []
+    for i, k in enumerate(chosen):
+        shape = shapes[i % len(shapes)]
+        if shape == 'clip':
+            names.append(f'[标签{k}]歌曲{i}({rng.randint(0, 5)}-{rng.randint(-3, -1)}).mp3')
+        elif shape == 'fullwidth':
+            names.append(f'【标签{k}】歌曲{i}（--{rng.randint(1, 5)}）.mp3')
+        elif shape == 'rename':
+            names.append(f'[标签{k}]歌曲{i}(---).mp3')
+        elif shape == 'nolabel':
+            names.append(f'歌曲{i}.mp3')
+        else:
+            names.append(f'[标签{k}]歌曲{i}.mp3')
+    return names
+
+
+def make_mp3(file_path: str, frames: int = 40):
+    """
+    生成由静音帧组成的 MP3 文件
+
+    :param file_path: 文件的完整路径
+    :param frames: 帧数，默认为 40（约 1 秒，16KB）
+    """
+    with open(file_path, 'wb') as f:
+        f.write(SILENT_FRAME * frames)
+
+
+def make_library(folder: str, names: list[str], frames: int = 40) -> str:
+    """
+    在文件夹中生成合成音乐库（已存在时先删除）
+
+    :param folder: 音乐文件夹
+    :param names: 文件名列表
+    :param frames: 每个文件的帧数
+    :return: 音乐文件夹
+    """
+    if path.exists(folder):
+        shutil.rmtree(folder)
+    makedirs(folder)
+    data = SILENT_FRAME * frames
+    for name in names:
+        with open(path.join(folder, name), 'wb') as f:
+            f.write(data)
+    return folder
+
+
+def _logger() -> logging.Logger:
+    """各过程使用的日志记录器：生成日志记录但不输出，避免控制台输出影响计时"""
+    logger = logging.getLogger('MP3Random.benchmark')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+# 各过程的测试：准备函数 setup(工作目录, 文件名列表, 参数) 返回运行函数的参数，运行函数 run(*参数) 即被计时的部分
+def _setup_random_names(work, names, args):  # 固定随机种子，使各次测试的排列（及耗时）可比较
+    return names, None, random.Random(args.seed)
+
+
+def _setup_lengths(work, names, args):
+    return ([(name, 60.0) for name in names],)
+
+
+def _setup_labels(work, names, args):
+    return [parse_name(name).label for name in names], [60.0] * len(names)
+
+
+def _setup_library(work, names, args):
+    music = make_library(path.join(work, 'music'), names, args.frames)
+    return music, names
+
+
+def _setup_library_cached(work, names, args):
+    music, names = _setup_library(work, names, args)
+    read_music_info(music, names)  # 预先建立缓存
+    return music, names
+
+
+def _setup_files(work, names, args):
+    music, names = _setup_library(work, names, args)
+    return ([path.join(music, name) for name in names],)
+
+
+def _run_mp3_info(files):
+    for file in files:
+        mp3_info(file)
+
+
+def _run_mutagen(files):
+    from mutagen.mp3 import MP3
+    for file in files:
+        MP3(file)
+
+
+def _setup_gain(work, names, args):
+    music, names = _setup_library(work, names, args)
+    return [path.join(music, name) for name in names], 2
+
+
+def _run_apply_gain(files, steps):
+    for file in files:
+        apply_gain(file, steps)
+
+
+def _setup_backup(work, names, args):
+    music = _setup_library(work, names, args)[0]
+    backup(music, path.join(work, 'backup'), _logger())  # 预先完整备份一次
+    return music, path.join(work, 'backup')
+
+
+def _run_backup(music, backup_path):
+    backup(music, backup_path, _logger())
+
+
+def _setup_random(link_mode):
+    def setup(work, names, args):
+        music, names = _setup_library(work, names, args)
+        return music, path.join(work, 'random'), path.join(work, 'result.txt'), link_mode, args.seed
+
+    return setup
+
+
+def _run_mp3_random(music, output, result_txt, link_mode, seed):
+    mp3_random(music, output, result_txt, _logger(), link_mode=link_mode, seed=seed)
+
+
+def _setup_ffmpeg(work, names, args):
+    music = _setup_library(work, names, args)[0]
+    return music, path.join(work, 'new'), args.ffmpeg, args.jobs
+
+
+def _run_to_mp3(music, output, ffmpeg_path, jobs):
+    to_mp3(music, output, _logger(), None, ffmpeg_path, remove_flag=False, jobs=jobs)
+
+
+def _run_mp3_clip(music, output, ffmpeg_path, jobs):
+    mp3_clip(music, music, _logger(), None, ffmpeg_path, remove_flag=True, native=False)
+
+
+def _setup_clip_native(work, names, args):
+    return (_setup_library(work, names, args)[0],)
+
+
+def _run_mp3_clip_native(music):
+    mp3_clip(music, music, _logger(), remove_flag=True)
+
+
+def _run_mp3_gain_native(music, output, ffmpeg_path, jobs):
+    mp3_gain_native(music, 92, _logger(), None, ffmpeg_path, jobs=jobs)
+
+
+def _setup_mp3gain(work, names, args):
+    return _setup_library(work, names, args)[0], args.mp3gain
+
+
+def _run_mp3_gain(music, mp3gain_path):
+    mp3_gain(music, 92, _logger(), None, mp3gain_path)
+
+
+# 过程名: (准备函数, 运行函数, 所需依赖)，依赖为 None、'ffmpeg' 或 'mp3gain'
+STAGES = {
+    'get_random': (_setup_random_names, _get_random, None),
+    're_name': (_setup_lengths, _re_name, None),
+    'label_stats': (_setup_labels, _label_stats, None),
+    'read_music_info_cold': (_setup_library, read_music_info, None),
+    'read_music_info_warm': (_setup_library_cached, read_music_info, None),
+    'mp3_info': (_setup_files, _run_mp3_info, None),
+    'mp3_info_mutagen': (_setup_files, _run_mutagen, None),
+    'apply_gain': (_setup_gain, _run_apply_gain, None),
+    'backup_unchanged': (_setup_backup, _run_backup, None),
+    'mp3_random_copy': (_setup_random('copy'), _run_mp3_random, None),
+    'mp3_random_hardlink': (_setup_random('hardlink'), _run_mp3_random, None),
+    'to_mp3': (_setup_ffmpeg, _run_to_mp3, 'ffmpeg'),
+    'mp3_clip_native': (_setup_clip_native, _run_mp3_clip_native, None),
+    'mp3_clip': (_setup_ffmpeg, _run_mp3_clip, 'ffmpeg'),
+    'mp3_gain_native': (_setup_ffmpeg, _run_mp3_gain_native, 'ffmpeg'),
+    'mp3_gain': (_setup_mp3gain, _run_mp3_gain, 'mp3gain'),
+}
+
+
+def _max_rss_kb() -> int:
+    """当前进程的峰值内存（KB），不支持时返回 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # macOS 的单位为字节
+
+
+def _measure(stage: str, count: int, args: argparse.Namespace, queue):
+    """
+    子进程中运行：准备数据后运行并计时，将结果放入队列
+
+    :param stage: 过程名
+    :param count: 文件数
+    :param args: 命令行参数
+    :param queue: 结果队列
+    """
+    setup, run, _ = STAGES[stage]
+    work = tempfile.mkdtemp(prefix='mp3random-bench-', dir=args.work_dir)
+    try:
+        names = make_names(count, args.labels, args.skew, tuple(args.shapes), args.seed)
+        params = setup(work, names, args)
+        rss_before = _max_rss_kb()
+        start = time.perf_counter()
+        run(*params)
+        seconds = time.perf_counter() - start
+        queue.put({'seconds': seconds, 'rss_before_kb': rss_before, 'peak_rss_kb': _max_rss_kb()})
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def run_stage(stage: str, count: int, args: argparse.Namespace) -> dict:
+    """
+    在独立进程中运行一个过程的测试，使峰值内存互不影响
+
+    :param stage: 过程名
+    :param count: 文件数
+    :param args: 命令行参数
+    :return: 结果：过程名、文件数、耗时、处理速度、峰值内存，缺少依赖或出错时记录 skipped / error
+    """
+    result = {'stage': stage, 'files': count}
+    dependence = STAGES[stage][2]
+    if dependence is not None and not check_dependence(getattr(args, dependence)):
+        result['skipped'] = f'未找到{dependence}'
+        return result
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(stage, count, args, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0 or queue.empty():
+        result['error'] = f'返回值 {process.exitcode}'
+        return result
+    result.update(queue.get())
+    result['files_per_sec'] = count / result['seconds'] if result['seconds'] > 0 else None
+    return result
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float = 1.2) -> list[str]:
+    """
+    与之前的结果比较，耗时超过之前的 threshold 倍时视为变慢
+
+    :param results: 本次结果
+    :param baseline: 之前的结果
+    :param threshold: 判断变慢的倍数，默认为 1.2
+    :return: 变慢的过程说明列表
+    """
+    old = {(r['stage'], r['files']): r for r in baseline if 'seconds' in r}
+    slower = []
+    for r in results:
+        before = old.get((r['stage'], r['files']))
+        if 'seconds' not in r or before is None or before['seconds'] <= 0:
+            continue
+        ratio = r['seconds'] / before['seconds']
+        if ratio > threshold:
+            slower.append(f'{r["stage"]}[{r["files"]}]：{before["seconds"]:.4f}s -> {r["seconds"]:.4f}s（{ratio:.2f}倍）')
+    return slower
+
+
+def _git_commit() -> str:
+    """当前提交（不在 git 仓库中时返回 None）"""
+    from subprocess import run
+    try:
+        result = run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                     cwd=path.dirname(path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def main(argv: list[str] = None) -> int:
+    """
+    命令行入口
+
+    :param argv: 命令行参数，默认为 sys.argv[1:]
+    :return: 退出码，0 表示成功，1 表示与之前的结果相比有过程变慢（指定 --fail-on-regression 时）
+    """
+    parser = argparse.ArgumentParser(description='MP3Random 性能测试（合成音乐库）')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='文件数，默认为 100 1000 10000，最大可到 100000')
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES), help='测试的过程，默认为全部')
+    parser.add_argument('--labels', type=int, default=20, help='标签数，默认为 20')
+    parser.add_argument('--skew', type=float, default=1.0, help='标签分布的偏斜程度（Zipf 指数），默认为 1.0')
+    parser.add_argument('--shapes', nargs='+', default=list(SHAPES), choices=SHAPES, help='文件名形式，默认为全部轮流使用')
+    parser.add_argument('--frames', type=int, default=40, help='每个合成 MP3 文件的帧数，默认为 40（约 1 秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（合成文件名和随机排列），默认为 0')
+    parser.add_argument('--ffmpeg', default=FFMPEG, help='ffmpeg 的路径，未找到时跳过相关过程')
+    parser.add_argument('--mp3gain', default=MP3GAIN, help='mp3gain 的路径，未找到时跳过相关过程')
+    parser.add_argument('-j', '--jobs', type=int, help='并行进程数，默认为 CPU 核心数')
+    parser.add_argument('--work-dir', help='生成合成音乐库的目录，默认为系统临时目录')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件，默认只输出到控制台')
+    parser.add_argument('--compare', help='与之前的结果 JSON 文件比较')
+    parser.add_argument('--threshold', type=float, default=1.2, help='判断变慢的倍数，默认为 1.2')
+    parser.add_argument('--fail-on-regression', action='store_true', help='有过程变慢时返回 1')
+    args = parser.parse_args(argv)
+
+    results = []
+    for stage in args.stages:
+        for count in args.sizes:
+            result = run_stage(stage, count, args)
+            results.append(result)
+            if 'seconds' in result:
+                rss = f'，峰值内存 {result["peak_rss_kb"] / 1024:.1f}MB' if result['peak_rss_kb'] else ''
+                print(f'{stage:<22}{count:>8} 个：{result["seconds"]:.4f}s，{result["files_per_sec"]:.0f} 个/秒{rss}')
+            else:
+                print(f'{stage:<22}{count:>8} 个：{result.get("skipped") or result.get("error")}')
+    report = {'meta': {'commit': _git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+                       'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'labels': args.labels, 'skew': args.skew,
+                       'shapes': args.shapes, 'frames': args.frames, 'seed': args.seed},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            slower = compare(results, json.load(f)['results'], args.threshold)
+        for line in slower:
+            print(f'变慢：{line}')
+        if slower and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+MP3Random
+
+各模块之间以顶层模块名相互导入（如 from utils import ...），以便直接运行 main.py 或打包为 exe；
+作为包导入（如 setup.py 安装的 mp3random 命令）时，将本目录加入模块搜索路径
+"""
+import sys
+from os import path
+
+_here = path.dirname(path.abspath(__file__))
+if _here not in sys.path:
+    sys.path.insert(0, _here)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+命令行入口（无界面运行，可用于批处理、定时任务）
+
+- create_parser: 创建命令行参数解析器
+- config_from_args: 由命令行参数得到处理流程的配置
+- print_progress: 在控制台（标准错误）同一行输出进度、处理速度和剩余时间
+- main: 解析命令行参数并执行处理流程
+"""
+import argparse
+import signal
+import sys
+
+from dedup import DEDUP_MODES
+from pipeline import PipelineConfig, GAIN_ENGINES, check_config, run_pipeline
+from randomization import LINK_MODES
+from report import REPORT_FORMATS
+from scheduler import parse_constraint
+from tools import FFMPEG, MP3GAIN
+from utils import create_logger, speed_text, ProgressReporter, CancelToken
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """
+    创建命令行参数解析器
+
+    :return: 命令行参数解析器
+    """
+    parser = argparse.ArgumentParser(prog='mp3random', description='按标签不相邻原则随机排列音乐文件，并统一音乐格式和音量')
+    parser.add_argument('-m', '--music-path', required=True, help='转换后音乐目录（切片、音量调整、随机排列的输入）')
+    parser.add_argument('-o', '--old-path', default='', help='转换前音乐目录')
+    parser.add_argument('-r', '--random-path', default='', help='随机排列后目录')
+    parser.add_argument('--result-txt', default='result.txt', help='结果文件输出至，默认为 result.txt')
+    parser.add_argument('--report-format', nargs='+', default=['txt'], choices=REPORT_FORMATS,
+                        help='结果文件的格式，可多选：txt 分类统计和排序结果，jsonl、csv 每行一首（保存在结果文件旁），默认为 txt')
+    parser.add_argument('-b', '--backup-path', default='', help='备份音乐文件至')
+    # 处理过程
+    parser.add_argument('--to-mp3', action='store_true', help='开启[格式转换]')
+    parser.add_argument('--clip', action='store_true', help='开启[音乐切片]')
+    parser.add_argument('--gain', type=int, metavar='DB', help='开启[音量调整]，并将音量调整至 DB 分贝')
+    parser.add_argument('--random', action='store_true', help='开启[随机排列]')
+    # 备份与删除
+    parser.add_argument('--backup', nargs='+', default=[], choices=('old', 'music', 'random'),
+                        help='备份的目录：转换前音乐目录、转换后音乐目录、随机排列后目录')
+    parser.add_argument('--backup-checksum', action='store_true',
+                        help='备份时比较文件内容的哈希值判断是否修改（默认比较大小和修改时间）')
+    parser.add_argument('--backup-manifest', action='store_true', help='备份时在备份文件夹旁写入哈希记录，用于之后校验')
+    parser.add_argument('--remove-old', action='store_true', help='格式转换后删除原文件')
+    parser.add_argument('--remove-music', action='store_true', help='随机排列后删除转换后音乐目录')
+    # 随机排列参数
+    parser.add_argument('--label', action='store_true', help='随机排列后文件名包含标签')
+    parser.add_argument('--name', action='store_true', help='随机排列后文件名包含原文件名')
+    parser.add_argument('--link-mode', default='copy', choices=LINK_MODES, help='随机排列的输出方式，默认为 copy')
+    parser.add_argument('--constraint', action='append', default=[], type=parse_constraint, metavar='KIND:SIZE[:WEIGHT]',
+                        help='随机排列的约束，可重复：label:N 相同标签至少间隔 N 首，artist:N 相同艺术家至少间隔 N 首，'
+                             'duration:秒 各时间段总时长均衡')
+    parser.add_argument('--time-budget', type=float, default=1.0, help='按约束排列的求解时间（秒），默认为 1')
+    parser.add_argument('--seed', type=int, help='随机种子，相同的音乐和种子得到相同的排列，默认随机生成（记录在结果文件中）')
+    parser.add_argument('--replay', action='store_true',
+                        help='按上次结果文件中的排序结果重新生成随机排列后目录，不重新排列')
+    # 依赖与性能
+    parser.add_argument('--ffmpeg', default=FFMPEG, help=f'ffmpeg 的路径，默认为 {FFMPEG}')
+    parser.add_argument('--mp3gain', default=MP3GAIN, help=f'mp3gain 的路径，默认为 {MP3GAIN}')
+    parser.add_argument('--gain-engine', default='auto', choices=GAIN_ENGINES,
+                        help='音量调整方式：auto 找到 ffmpeg 时使用内置响度分析，否则使用 mp3gain')
+    parser.add_argument('-j', '--jobs', type=int, help='并行进程数，默认为 CPU 核心数')
+    parser.add_argument('--bitrate', default='128k', help='格式转换后的码率，默认为 128k')
+    parser.add_argument('--timeout', type=float, help='调用 ffmpeg、mp3gain 时单个文件的超时时间（秒），超时时跳过该文件，默认不限制')
+    parser.add_argument('--full', action='store_true', help='忽略运行记录，重新处理全部文件')
+    parser.add_argument('--dedup', default='', choices=DEDUP_MODES,
+                        help='查重方式：content 文件内容相同，audio 音频内容相似（需要 ffmpeg）；重复文件只保留一个')
+    # 输出
+    parser.add_argument('--log-file', default='mp3random.log', help='日志文件，默认为 mp3random.log')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不输出进度')
+    return parser
+
+
+def config_from_args(args: argparse.Namespace) -> PipelineConfig:
+    """
+    由命令行参数得到处理流程的配置
+
+    :param args: 解析后的命令行参数
+    :return: 处理流程的配置
+    """
+    return PipelineConfig(music_path=args.music_path, old_path=args.old_path, random_path=args.random_path,
+                          result_txt=args.result_txt, report_formats=tuple(args.report_format),
+                          backup_path=args.backup_path,
+                          ffmpeg_path=args.ffmpeg, mp3gain_path=args.mp3gain,
+                          db=args.gain if args.gain is not None else 89,
+                          process_to_mp3=args.to_mp3, process_clip=args.clip, process_gain=args.gain is not None,
+                          process_random=args.random,
+                          backup_old='old' in args.backup, backup_music='music' in args.backup,
+                          backup_random='random' in args.backup, backup_checksum=args.backup_checksum,
+                          backup_manifest=args.backup_manifest,
+                          remove_old=args.remove_old, remove_music=args.remove_music,
+                          label_flag=args.label, name_flag=args.name, link_mode=args.link_mode,
+                          constraints=tuple(args.constraint), time_budget=args.time_budget,
+                          seed=args.seed, replay=args.replay,
+                          gain_engine=args.gain_engine, incremental=not args.full, jobs=args.jobs,
+                          bitrate=args.bitrate, timeout=args.timeout, dedup=args.dedup)
+
+
+def print_progress(current_value: int, total_value: int, old_file, new_file, speed: float = None, eta: float = None):
+    """
+    在控制台（标准错误）同一行输出进度、处理速度和剩余时间，完成时换行
+
+    :param current_value: 当前值
+    :param total_value: 总值
+    :param old_file: 旧文件
+    :param new_file: 新文件
+    :param speed: 处理速度（个/秒）
+    :param eta: 剩余时间（秒）
+    """
+    end = '\n' if current_value >= total_value else ''
+    print(f'\r\033[K{int(current_value)}/{total_value} {speed_text(speed, eta)} {old_file}', end=end, file=sys.stderr,
+          flush=True)
+
+
+def main(argv: list[str] = None) -> int:
+    """
+    解析命令行参数并执行处理流程
+
+    :param argv: 命令行参数，默认为 sys.argv[1:]
+    :return: 退出码，0 表示成功，2 表示配置错误，130 表示被取消（Ctrl+C）
+    """
+    args = create_parser().parse_args(argv)
+    config = config_from_args(args)
+    errors = check_config(config)
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        return 2
+    logger = create_logger(log_file=args.log_file)
+    # 第一次 Ctrl+C 取消处理流程（终止正在运行的子进程，保存运行记录），第二次立即退出
+    cancel_token = CancelToken()
+
+    def interrupt(signum, frame):
+        if cancel_token.cancelled:
+            raise KeyboardInterrupt
+        print('\n正在取消，再次按 Ctrl+C 立即退出', file=sys.stderr)
+        cancel_token.cancel()
+
+    handler = signal.signal(signal.SIGINT, interrupt)
+    try:
+        result = run_pipeline(config, logger, None if args.quiet else ProgressReporter(print_progress),
+                              on_stage=None if args.quiet else lambda name: print(f'[{name}]', file=sys.stderr),
+                              cancel_token=cancel_token)
+    finally:
+        signal.signal(signal.SIGINT, handler)
+    return 0 if result.cancelled is None else 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
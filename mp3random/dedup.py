@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+查找重复的音乐文件（同一首歌以不同文件名出现多次），避免重复转换和重复排列
+
+- DEDUP_MODES: 查重方式
+- partial_hash: 文件大小和首尾数据块的哈希值（快速比较）
+- full_hash: 完整文件的 BLAKE2 哈希值
+- audio_fingerprint: 解码后 PCM 数据的音频指纹（不同编码、码率的同一首歌也相同）
+- find_duplicates: 查找文件夹中的重复文件，返回重复文件组
+- redundant_files: 每组重复文件中除保留的一个之外的其他文件
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from os import cpu_count
+from subprocess import Popen, PIPE, DEVNULL
+
+import numpy as np
+
+from scanner import scan_music
+from tools import CREATION_FLAGS, FFMPEG
+
+DEDUP_MODES = ('content', 'audio')  # 查重方式：文件内容相同、音频内容相似（需要 ffmpeg）
+_BLOCK = 64 * 1024  # 快速比较时读取的首尾数据块大小
+_FINGERPRINT_RATE = 8000  # 音频指纹的采样率
+_FINGERPRINT_FRAME = _FINGERPRINT_RATE // 2  # 每 0.5s 计算一次能量
+_FINGERPRINT_SECONDS = 120  # 只解码开头的 120s
+_FINGERPRINT_TOLERANCE = 0.1  # 音频指纹不同位的比例不超过该值时视为相同
+_FINGERPRINT_BAND = 16  # 分桶时音频指纹每段的位数
+
+
+def partial_hash(file_path: str, size: int) -> bytes:
+    """
+    计算文件首尾各 64KB 数据的哈希值（文件不大于 128KB 时即完整文件），只用于快速排除不同的文件
+
+    :param file_path: 文件的完整路径
+    :param size: 文件大小
+    :return: 哈希值
+    """
+    digest = blake2b(size.to_bytes(8, 'little'), digest_size=16)
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(_BLOCK))
+        if size > 2 * _BLOCK:
+            f.seek(-_BLOCK, 2)
+        digest.update(f.read(_BLOCK))
+    return digest.digest()
+
+
+def full_hash(file_path: str) -> bytes:
+    """
+    计算完整文件的 BLAKE2 哈希值
+
+    :param file_path: 文件的完整路径
+    :return: 哈希值
+    """
+    digest = blake2b(digest_size=32)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def audio_fingerprint(file_path: str, ffmpeg_path: str = FFMPEG) -> np.ndarray:
+    """
+    调用 ffmpeg.exe 将音乐开头的 120s 解码为 8kHz 单声道 PCM，每 0.5s 计算一次能量，
+    以相邻两段能量的大小关系作为指纹（与音量、码率、编码格式无关）
+
+    :param file_path: 音乐文件的完整路径
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG
+    :return: 音频指纹（布尔数组）
+    :raises RuntimeError: ffmpeg.exe 解码失败时
+    """
+    process = Popen([ffmpeg_path, '-v', 'error', '-i', file_path, '-vn', '-ac', '1', '-ar', str(_FINGERPRINT_RATE),
+                     '-t', str(_FINGERPRINT_SECONDS), '-f', 's16le', '-'],
+                    stdout=PIPE, stderr=DEVNULL, creationflags=CREATION_FLAGS)
+    with process:
+        data = process.stdout.read()
+    if process.returncode != 0:
+        raise RuntimeError(f'ffmpeg.exe 解码失败（返回值 {process.returncode}）')
+    samples = np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16).astype(np.float64)
+    count = len(samples) // _FINGERPRINT_FRAME
+    energy = np.square(samples[:count * _FINGERPRINT_FRAME]).reshape(count, _FINGERPRINT_FRAME).sum(axis=-1)
+    return energy[1:] > energy[:-1]
+
+
+def _try_fingerprint(file_path: str, ffmpeg_path: str) -> np.ndarray:
+    """计算音频指纹，解码失败时返回空指纹（不与任何文件相同）"""
+    try:
+        return audio_fingerprint(file_path, ffmpeg_path)
+    except (OSError, RuntimeError):
+        return np.zeros(0, dtype=bool)
+
+
+def _same_audio(a: np.ndarray, b: np.ndarray) -> bool:
+    """比较两个音频指纹：长度相差不超过 2 段（1s），且不同位的比例不超过 10%"""
+    if abs(len(a) - len(b)) > 2:
+        return False
+    n = min(len(a), len(b))
+    return n > 0 and np.count_nonzero(a[:n] != b[:n]) <= _FINGERPRINT_TOLERANCE * n
+
+
+def _group_by(items: list, key_func, executor: ThreadPoolExecutor) -> list[list]:
+    """并行计算键，按键分组，只返回多于一个元素的组"""
+    groups = {}
+    for item, key in zip(items, executor.map(key_func, items)):
+        groups.setdefault(key, []).append(item)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _enough_bands(length: int) -> bool:
+    """长度为 length 的指纹的完整段数的 2 倍是否多于允许的不同位数（此时相同的指纹至少有一段最多相差 1 位）"""
+    return 2 * (length // _FINGERPRINT_BAND) > _FINGERPRINT_TOLERANCE * length
+
+
+def _bands(fingerprint: np.ndarray) -> list[int]:
+    """将音频指纹按 16 位分段（不足一段的部分舍去），每段转换为整数"""
+    count = len(fingerprint) // _FINGERPRINT_BAND
+    bits = fingerprint[:count * _FINGERPRINT_BAND].reshape(count, _FINGERPRINT_BAND)
+    return (bits @ (1 << np.arange(_FINGERPRINT_BAND))).tolist()
+
+
+def _audio_candidates(fingerprints: list[np.ndarray]) -> list[set[int]]:
+    """
+    将音频指纹分桶，找出每个指纹可能相同的其他指纹，避免两两比较
+
+    指纹按 16 位分段，以（段序号, 段内容）分桶：相同的指纹不同位数不超过 10%，完整段数的 2 倍多于不同位数时，
+    至少有一段最多相差 1 位（抽屉原理），只需比较该段相同或相差 1 位的桶中的指纹；
+    过短的指纹与长度相差不超过 2 段的全部指纹比较
+
+    :param fingerprints: 音频指纹列表
+    :return: 每个指纹的候选指纹序号集合（包括其自身）
+    """
+    values = [_bands(fingerprint) for fingerprint in fingerprints]
+    bands, lengths = {}, {}
+    for i, fingerprint in enumerate(fingerprints):
+        lengths.setdefault(len(fingerprint), []).append(i)
+        for k, value in enumerate(values[i]):
+            bands.setdefault((k, value), []).append(i)
+    flips = [0] + [1 << bit for bit in range(_FINGERPRINT_BAND)]  # 段内容不变或改变 1 位
+    candidates = [{i} for i in range(len(fingerprints))]
+    for i, fingerprint in enumerate(fingerprints):
+        for k, value in enumerate(values[i]):
+            for flip in flips:
+                candidates[i].update(bands.get((k, value ^ flip), ()))
+        if not _enough_bands(len(fingerprint)):
+            for length in range(len(fingerprint) - 2, len(fingerprint) + 3):
+                for j in lengths.get(length, ()):
+                    candidates[i].add(j)
+                    candidates[j].add(i)
+    return candidates
+
+
+def find_duplicates(input_path: str, mode: str = 'content', ffmpeg_path: str = FFMPEG,
+                    jobs: int = None) -> list[list[str]]:
+    """
+    查找文件夹中的重复音乐文件
+
+    'content' 方式先按文件大小分组（无需读取文件），大小相同的再比较首尾数据块的哈希值，仍相同的才计算完整文件的
+    BLAKE2 哈希值；'audio' 方式比较解码后的音频指纹，可找出不同格式、码率的同一首歌（需要 ffmpeg.exe），
+    指纹先分桶（见 _audio_candidates），只比较同一桶中的指纹
+
+    :param input_path: 音乐文件夹
+    :param mode: 查重方式，见 DEDUP_MODES，默认为 'content'
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，'audio' 方式使用
+    :param jobs: 并行计算的线程数，默认为 CPU 核心数 + 4（最多 32）
+    :return: 重复文件组列表，每组为按名称排序的文件名列表
+    :raises ValueError: 查重方式不支持时
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f'不支持的查重方式：{mode}')
+    entries = list(scan_music(input_path))
+    duplicates = []
+    with ThreadPoolExecutor(max_workers=jobs or min(32, (cpu_count() or 1) + 4)) as executor:
+        if mode == 'content':
+            sizes = {}
+            for entry in entries:
+                sizes.setdefault(entry.size, []).append(entry)
+            candidates = [entry for group in sizes.values() if len(group) > 1 for entry in group]
+            for group in _group_by(candidates, lambda e: partial_hash(e.path, e.size), executor):
+                duplicates.extend(_group_by(group, lambda e: full_hash(e.path), executor))
+        else:
+            fingerprints = list(executor.map(lambda e: _try_fingerprint(e.path, ffmpeg_path), entries))
+            candidates = _audio_candidates(fingerprints)
+            used = set()
+            for i, a in enumerate(fingerprints):
+                if i in used:
+                    continue
+                same = [j for j in sorted(candidates[i])
+                        if j > i and j not in used and _same_audio(a, fingerprints[j])]
+                if same:
+                    used.update(same)
+                    duplicates.append([entries[i]] + [entries[j] for j in same])
+    return sorted(sorted(entry.name for entry in group) for group in duplicates)
+
+
+def redundant_files(duplicates: list[list[str]], logger: logging.Logger = None) -> set[str]:
+    """
+    每组重复文件保留名称排序最前的一个，返回其他文件，并记录日志
+
+    :param duplicates: 重复文件组列表（find_duplicates 的结果）
+    :param logger: 日志记录器，默认为 None（不记录）
+    :return: 可跳过的文件名集合
+    """
+    redundant = set()
+    for group in duplicates:
+        redundant.update(group[1:])
+        if logger is not None:
+            logger.info(f'重复文件：保留 {group[0]}，跳过 {"、".join(group[1:])}')
+    return redundant
+
+
+if __name__ == '__main__':
+    print('dedup')
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+响度分析与无损音量调整（替代 mp3gain.exe）
+
+- integrated_loudness: 按 ITU-R BS.1770（EBU R128）计算 PCM 数据的综合响度（LUFS）
+- track_loudness: 调用 ffmpeg.exe 解码音乐文件（管道传输 PCM），分块计算综合响度
+- analyze_file: 读取 MP3 文件的声道数并计算综合响度（供进程池调用）
+- analyze_source: 读取任意格式音乐文件的声道数并计算（切片部分的）综合响度（供进程池调用）
+- gain_steps: 计算调整到目标分贝数所需的 global_gain 步数（每步 1.5dB）
+- apply_gain: 直接修改 MP3 帧边信息中的 global_gain 字段调整音量，无需重新编码
+"""
+import mmap
+from subprocess import Popen, PIPE, DEVNULL
+
+import numpy as np
+from mutagen import File
+
+from mp3_frames import iter_frames, global_gain_bits
+from tools import CREATION_FLAGS, FFMPEG
+
+RATE = 48000  # 分析采样率，K 计权滤波器系数按 48kHz 给出
+_BLOCK = RATE // 10  # 100ms 子块，400ms 门限块由 4 个子块组成（75% 重叠）
+_CONTEXT = RATE  # 分块滤波时两侧保留的上下文长度（1s）
+_CHUNK = RATE * 30  # 每次从管道读取的采样数（30s）
+# K 计权滤波器（高架滤波器 + 高通滤波器）系数，(b, a)
+_K_WEIGHTING = (((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+                ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)))
+REFERENCE_LUFS = -18.0  # ReplayGain 2.0 参考响度，对应 mp3gain 的 89dB
+
+
+def _k_weighting(samples: np.ndarray) -> np.ndarray:
+    """
+    K 计权滤波（在频域乘以滤波器的幅频响应，零相位，不影响分块能量）
+
+    :param samples: PCM 数据，形状为 (声道数, 采样数)
+    :return: 滤波后的 PCM 数据
+    """
+    n = samples.shape[-1]
+    z = np.exp(-1j * np.pi * np.linspace(0, 1, n // 2 + 1))
+    response = np.ones_like(z, dtype=np.float64)
+    for b, a in _K_WEIGHTING:
+        response *= np.abs((b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z))
+    return np.fft.irfft(np.fft.rfft(samples, axis=-1) * response, n, axis=-1)
+
+
+def _block_loudness(powers: np.ndarray) -> np.ndarray:
+    """
+    由 100ms 子块的均方值计算 400ms 门限块（步长 100ms）的响度
+
+    :param powers: 子块均方值，形状为 (声道数, 子块数)
+    :return: 每个门限块的各声道均方值之和，形状为 (门限块数,)
+    """
+    if powers.shape[-1] < 4:
+        return np.empty(0)
+    cumsum = np.cumsum(np.pad(powers, ((0, 0), (1, 0))), axis=-1)
+    return ((cumsum[:, 4:] - cumsum[:, :-4]) / 4).sum(axis=0)
+
+
+def _gated_loudness(blocks: np.ndarray) -> float:
+    """
+    对门限块进行绝对门限（-70LUFS）和相对门限（-10LU）筛选，计算综合响度
+
+    :param blocks: 每个门限块的各声道均方值之和
+    :return: 综合响度（LUFS），全部为静音时返回 -inf
+    """
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(blocks)
+    blocks = blocks[loudness > -70]
+    if blocks.size == 0:
+        return float('-inf')
+    relative = -0.691 + 10 * np.log10(blocks.mean()) - 10
+    with np.errstate(divide='ignore'):
+        blocks = blocks[-0.691 + 10 * np.log10(blocks) > relative]
+    return float(-0.691 + 10 * np.log10(blocks.mean()))
+
+
+def integrated_loudness(samples: np.ndarray) -> float:
+    """
+    按 ITU-R BS.1770 计算 48kHz PCM 数据的综合响度
+
+    :param samples: PCM 数据，形状为 (声道数, 采样数)，取值范围 [-1, 1]
+    :return: 综合响度（LUFS），全部为静音时返回 -inf
+    """
+    filtered = _k_weighting(np.atleast_2d(samples))
+    count = filtered.shape[-1] // _BLOCK
+    powers = np.square(filtered[:, :count * _BLOCK]).reshape(filtered.shape[0], count, _BLOCK).mean(axis=-1)
+    return _gated_loudness(_block_loudness(powers))
+
+
+def track_loudness(file_path: str, ffmpeg_path: str = FFMPEG, channels: int = 2,
+                   sta: float = None, end: float = None) -> float:
+    """
+    调用 ffmpeg.exe 将音乐文件解码为 48kHz 32 位浮点 PCM（通过管道读取），分块滤波并计算综合响度
+
+    每次读取 30s 数据，滤波时两侧保留 1s 上下文以消除分块边界的影响，内存占用与音乐长度无关
+
+    :param file_path: 音乐文件的完整路径
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG
+    :param channels: 声道数
+    :param sta: 只分析切片部分时的起始时间（秒），为 None 时分析整个文件
+    :param end: 只分析切片部分时的结束时间（秒）
+    :return: 综合响度（LUFS），全部为静音时返回 -inf
+    :raises RuntimeError: ffmpeg.exe 解码失败时
+    """
+    seek = ['-ss', str(sta), '-to', str(end)] if sta is not None else []
+    process = Popen([ffmpeg_path, '-v', 'error', *seek, '-i', file_path, '-vn', '-ac', str(channels),
+                     '-ar', str(RATE), '-f', 'f32le', '-'], stdout=PIPE, stderr=DEVNULL, creationflags=CREATION_FLAGS)
+    frame_bytes = 4 * channels
+    buffer = np.empty((channels, 0), dtype=np.float32)  # 待滤波数据（包括左侧上下文）
+    start = 0  # buffer 中尚未输出的起始位置
+    rest = np.empty((channels, 0))  # 不足一个子块的滤波结果
+    powers = []
+    with process:
+        while True:
+            data = process.stdout.read(_CHUNK * frame_bytes)
+            data = data[:len(data) // frame_bytes * frame_bytes]
+            final = len(data) < _CHUNK * frame_bytes
+            chunk = np.frombuffer(data, dtype=np.float32).reshape(-1, channels).T
+            buffer = np.concatenate((buffer, chunk), axis=-1)
+            # 非最后一块时，右侧保留 1s 上下文，留到下一块再输出
+            end = buffer.shape[-1] if final else max(start, buffer.shape[-1] - _CONTEXT)
+            if end > start:
+                filtered = np.concatenate((rest, _k_weighting(buffer)[:, start:end]), axis=-1)
+                count = filtered.shape[-1] // _BLOCK
+                powers.append(np.square(filtered[:, :count * _BLOCK]).reshape(channels, count, _BLOCK).mean(axis=-1))
+                rest = filtered[:, count * _BLOCK:]
+            if final:
+                break
+            # 丢弃已输出的数据，仅保留 1s 左侧上下文
+            keep = max(0, end - _CONTEXT)
+            buffer = buffer[:, keep:]
+            start = end - keep
+    if process.returncode != 0:
+        raise RuntimeError(f'ffmpeg.exe 解码失败（返回值 {process.returncode}）')
+    return _gated_loudness(_block_loudness(np.concatenate(powers, axis=-1)))
+
+
+def _mp3_channels(file_path: str) -> int:
+    """
+    读取 MP3 文件第一帧的声道数
+
+    :param file_path: MP3 文件的完整路径
+    :return: 声道数
+    :raises ValueError: 未找到有效的 MP3 帧时
+    """
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        frame = next(iter_frames(data), None)
+    if frame is None:
+        raise ValueError('未找到有效的 MP3 帧')
+    return frame[1].channels
+
+
+def analyze_file(file_path: str, ffmpeg_path: str = FFMPEG) -> float:
+    """
+    读取 MP3 文件第一帧的声道数，并调用 ffmpeg.exe 计算综合响度（供进程池调用）
+
+    :param file_path: MP3 文件的完整路径
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG
+    :return: 综合响度（LUFS），全部为静音时返回 -inf
+    :raises ValueError: 未找到有效的 MP3 帧时
+    """
+    return track_loudness(file_path, ffmpeg_path, _mp3_channels(file_path))
+
+
+def analyze_source(file_path: str, ffmpeg_path: str = FFMPEG, sta: float = None, end: float = None) -> float:
+    """
+    读取任意格式音乐文件（如格式转换前的 flac、wav）的声道数，并调用 ffmpeg.exe 计算综合响度（供进程池调用）
+
+    MP3 文件同 analyze_file 读取第一帧，其他格式由 mutagen 自动识别；声道数多于 2 时按转换为 MP3 后的立体声计算
+
+    :param file_path: 音乐文件的完整路径
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG
+    :param sta: 只分析切片部分时的起始时间（秒），为 None 时分析整个文件
+    :param end: 只分析切片部分时的结束时间（秒）
+    :return: 综合响度（LUFS），全部为静音时返回 -inf
+    :raises ValueError: 无法识别文件格式或未找到有效的 MP3 帧时
+    """
+    if file_path.lower().endswith('.mp3'):
+        channels = _mp3_channels(file_path)
+    else:
+        audio = File(file_path)
+        if audio is None:
+            raise ValueError('无法识别的音乐文件')
+        channels = getattr(audio.info, 'channels', 2)
+    return track_loudness(file_path, ffmpeg_path, min(channels, 2), sta, end)
+
+
+def gain_steps(loudness: float, db: int) -> int:
+    """
+    计算将音乐调整到目标分贝数所需的 global_gain 步数（每步 1.5dB），与 mp3gain 的 /d 参数一致，89dB 对应 -18LUFS
+
+    :param loudness: 音乐的综合响度（LUFS）
+    :param db: 目标分贝数
+    :return: global_gain 步数，静音时为 0
+    """
+    if loudness == float('-inf'):
+        return 0
+    return round((REFERENCE_LUFS + db - 89 - loudness) / 1.5)
+
+
+def _crc16(data: bytes) -> int:
+    """MP3 帧 CRC-16 校验（多项式 0x8005，初始值 0xFFFF）"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005 if crc & 0x8000 else crc << 1) & 0xFFFF
+    return crc
+
+
+def apply_gain(file_path: str, steps: int) -> int:
+    """
+    修改每一帧边信息中的 global_gain 字段（加 steps，限制在 0-255），无需解码和重新编码即可调整音量，
+    有 CRC 校验的帧同时更新校验值；Xing/Info 信息帧不做修改
+
+    :param file_path: MP3 文件的完整路径
+    :param steps: global_gain 步数，每步 1.5dB
+    :return: 修改的帧数
+    """
+    if steps == 0:
+        return 0
+    count = 0
+    with open(file_path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as data:
+        for offset, header in iter_frames(data):
+            side_info = offset + 4 + (2 if header.protection else 0)
+            tag = data[side_info + header.side_info_size:side_info + header.side_info_size + 4]
+            if tag in (b'Xing', b'Info') or data[offset + 36:offset + 40] == b'VBRI':
+                continue
+            frame = bytearray(data[offset:side_info + header.side_info_size])
+            value = int.from_bytes(frame, 'big')
+            total = len(frame) * 8
+            for bit in global_gain_bits(header):
+                shift = total - bit - 8
+                gain = (value >> shift) & 0xFF
+                gain = min(255, max(0, gain + steps))
+                value = (value & ~(0xFF << shift)) | (gain << shift)
+            frame = bytearray(value.to_bytes(len(frame), 'big'))
+            if header.protection:
+                frame[4:6] = _crc16(frame[2:4] + frame[6:]).to_bytes(2, 'big')
+            data[offset:side_info + header.side_info_size] = bytes(frame)
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    print('loudness')
@@ -2,14 +2,20 @@
 # -*- coding:utf-8 -*-
 # 凌乱之主
 # 2024年07月25日
+import json
 import os
-from os.path import normpath
+import sys
+from multiprocessing import freeze_support
 
-import webview
+try:  # 无界面环境（如未安装 pywebview 的服务器）下仍可使用命令行
+    import webview
+except ImportError:
+    webview = None
 
-from mp3_operations import backup, to_mp3, mp3_clip, mp3_gain
-from randomization import mp3_random
-from utils import create_logger, check_dependence, update_progress
+import cli
+from pipeline import PipelineConfig, check_config, start_pipeline
+from tools import FFMPEG, MP3GAIN, EXECUTABLE_PATTERN
+from utils import create_logger, check_dependence, speed_text, ProgressReporter, CancelToken
 
 
 def get_element(window, element_id):
@@ -66,7 +72,29 @@ def get_checked(window, checkbox_id_list):
     return checked_dict
 
 
-def start(window, input_element_list, checked_id_list, frame_size, dependence_list):
+def pause_or_resume(cancel_token, pause_button):
+    # 暂停时继续运行，运行时暂停（当前文件处理完成后暂停）
+    if cancel_token.paused:
+        cancel_token.resume()
+        pause_button.text = '暂停'
+    else:
+        cancel_token.pause()
+        pause_button.text = '继续'
+
+
+def finish(window, future):
+    # 处理流程结束（完成或取消）后，停止计时，隐藏暂停、取消按钮，显示运行结果摘要
+    window.evaluate_js("""StopTimer();""")
+    get_element(window, 'pause_button').hide()
+    get_element(window, 'cancel_button').hide()
+    try:
+        summary = future.result().summary()
+    except Exception as e:  # 处理流程出错
+        summary = f'运行出错：{e}'
+    get_element(window, 'process_summary').text = summary
+
+
+def start(window, input_element_list, checked_id_list, frame_size, dependence_list, cancel_token):
     # 获取所有的输入值（手动定义）
     ffmpeg, ffmpeg_check, mp3gain, mp3gain_check = dependence_list
     ffmpeg_path, mp3gain_path = (ffmpeg.text, mp3gain.text)
@@ -74,83 +102,22 @@ def start(window, input_element_list, checked_id_list, frame_size, dependence_li
                                                                              input_element_list]
     old_path_check, music_path_check, random_path_check, old_files_delete_check, music_files_delete_check, process_to_mp3_check, process_clip_mp3_check, process_mp3gain_check, process_random_check = [
         window.evaluate_js(f'document.getElementById("{checkbox_id}").checked') for checkbox_id in checked_id_list]
-    # 根据可选项检查输入值
-    error_message = ''
-    # 检查依赖: [格式转换]、[音乐切片]使用ffmpeg，[音量调整]使用mp3gain，若未开启则不检查
-    ffmpeg_flag = check_dependence_flag(ffmpeg, ffmpeg_check)
-    mp3gain_flag = check_dependence_flag(mp3gain, mp3gain_check)
-    if (process_to_mp3_check or process_clip_mp3_check) and not ffmpeg_flag:
-        error_message += '未找到ffmpeg！\\n'
-    if process_mp3gain_check and not mp3gain_flag:
-        error_message += '未找到mp3gain！\\n'
-    # 开启[格式转换]过程时
-    if process_to_mp3_check:
-        # [转换前音乐目录]不能为空，且必须存在，且不能与[转换后音乐目录]相同
-        if old_path == '':
-            error_message += '[转换前音乐目录]不能为空！\\n'
-        if not os.path.exists(old_path):
-            error_message += '[转换前音乐目录]不存在！\\n'
-        if old_path == music_path:
-            error_message += '[转换前音乐目录]不能与[转换后音乐目录]相同！\\n'
-        # 若此条件下，再开启[音乐切片]或[音量调整]过程时
-        if process_clip_mp3_check or process_mp3gain_check:
-            pass
-        else:
-            pass
-        # 若此条件下，再开启[随机排列]过程时
-        if process_random_check:
-            # [转换前音乐目录]不能与[随机排列后目录]相同，且[转换后音乐目录]也不能与[随机排列后目录]相同
-            if old_path == random_path:
-                error_message += '[转换前音乐目录]不能与[随机排列后目录]相同！\\n'
-            if music_path == random_path:
-                error_message += '[转换后音乐目录]不能与[随机排列后目录]相同！\\n'
-        else:
-            pass
-    else:  # 未开启[格式转换]过程时
-        # 若开启[音乐切片]或[音量调整]过程时
-        if process_clip_mp3_check or process_mp3gain_check:
-            # [转换后音乐目录]不能为空，且必须存在
-            if music_path == '':
-                error_message += '[转换后音乐目录]不能为空！\\n'
-            if not os.path.exists(music_path):
-                error_message += '[转换后音乐目录]不存在！\\n'
-            # 若开启[随机排列]过程时
-            if process_random_check:
-                # [转换后音乐目录]不能与[随机排列后目录]相同
-                if music_path == random_path:
-                    error_message += '[转换后音乐目录]不能与[随机排列后目录]相同！\\n'
-            else:
-                pass
-        else:  # 未开启[音乐切片]或[音量调整]过程时
-            # 若开启[随机排列]过程时
-            if process_random_check:
-                # [转换后音乐目录]不能为空，且必须存在，且不能与[随机排列后目录]相同
-                if music_path == '':
-                    error_message += '[转换后音乐目录]不能为空！\\n'
-                if not os.path.exists(music_path):
-                    error_message += '[转换后音乐目录]不存在！\\n'
-                if music_path == random_path:
-                    error_message += '[转换后音乐目录]不能与[随机排列后目录]相同！\\n'
-            else:
-                # 任何过程都未开启时
-                error_message += '请至少开启一个处理过程！\\n'
-    # 处理备份检查
-    # 当未开启[格式转换]过程时，old_path_check设置为False；
-    # music_path_check 四个过程都可能用到，不进行修改
-    # 当未开启[随机排列]过程时，random_path_check设置为False
-    old_path_check = old_path_check and process_to_mp3_check
-    random_path_check = random_path_check and process_random_check
-    if (old_path_check or music_path_check or random_path_check) and backup_path == '':
-        error_message += '[备份音乐文件至]不能为空！\\n'
-    if old_path_check and old_path == backup_path:
-        error_message += '[转换前音乐目录]不能与[备份音乐文件至]相同！\\n'
-    if music_path_check and music_path == backup_path:
-        error_message += '[转换后音乐目录]不能与[备份音乐文件至]相同！\\n'
-    if random_path_check and random_path == backup_path:
-        error_message += '[随机排列后目录]不能与[备份音乐文件至]相同！\\n'
+    # TODO: 随机排列过程还有 label_flag 和 name_flag 两个参数，暂时未实现到界面
+    config = PipelineConfig(music_path=music_path, old_path=old_path, random_path=random_path, result_txt=result_txt,
+                            backup_path=backup_path, ffmpeg_path=ffmpeg_path, mp3gain_path=mp3gain_path,
+                            db=int(db_select), process_to_mp3=process_to_mp3_check,
+                            process_clip=process_clip_mp3_check, process_gain=process_mp3gain_check,
+                            process_random=process_random_check, backup_old=old_path_check,
+                            backup_music=music_path_check, backup_random=random_path_check,
+                            remove_old=old_files_delete_check, remove_music=music_files_delete_check)
+    # 根据可选项检查输入值（同时更新依赖的检查标志）
+    check_dependence_flag(ffmpeg, ffmpeg_check)
+    check_dependence_flag(mp3gain, mp3gain_check)
+    errors = check_config(config)
 
     # 若有错误信息，则弹出提示框
-    if error_message != '':
+    if errors:
+        error_message = ''.join(error + '\\n' for error in errors)
         window.evaluate_js(f'alert("{error_message}")')
         return
     # 若检查通过，则开始执行
@@ -161,65 +128,20 @@ def start(window, input_element_list, checked_id_list, frame_size, dependence_li
     process = get_element(window, 'process')
     process.show()
     # 调整窗口大小
-    window.resize(650 + frame_size[0], 400 + frame_size[1])
-    # 运行界面提示控件绑定
+    window.resize(650 + frame_size[0], 500 + frame_size[1])
+    # 运行界面提示控件绑定（进度每秒最多更新 10 次，每次只调用一次 JS）
     process_name = get_element(window, 'process_name')
-    progress = get_element(window, 'progress')
-    progress_value = get_element(window, 'progress_value')
-    process_old_file = get_element(window, 'process_old_file')
-    process_new_file = get_element(window, 'process_new_file')
-    process_inner_list = [progress, progress_value, process_old_file, process_new_file]
+    progress = ProgressReporter(lambda current_value, total_value, old_file, new_file, speed, eta: window.evaluate_js(
+        f'UpdateProgress({current_value}, {total_value}, {json.dumps(str(old_file))}, {json.dumps(str(new_file))}, '
+        f'{json.dumps(speed_text(speed, eta))})'))
     # 计时处理
     window.evaluate_js("""StartTimer();""")
 
-    # 开始运行 >>>
+    # 开始运行 >>>（在后台线程中运行，界面可随时暂停、继续、取消）
     # TODO: 日志记录嵌入界面
-    logger = create_logger()
-    logger.info('开始运行')
-    # 转换为normal路径
-    old_path = normpath(old_path)
-    music_path = normpath(music_path)
-    backup_path = normpath(backup_path)
-    random_path = normpath(random_path)
-    result_txt = normpath(result_txt)
-    # 备份转换前音乐目录
-    if old_path_check:
-        process_name.text = '文件备份'
-        update_progress(process_inner_list, 0, 1, old_path, backup_path)
-        backup(old_path, backup_path, logger)
-    # 转换为 MP3
-    if process_to_mp3_check:
-        process_name.text = '格式转换'
-        to_mp3(old_path, music_path, logger, process_inner_list, ffmpeg_path, old_files_delete_check)
-    # 切片
-    if process_clip_mp3_check:
-        process_name.text = '音乐切片'
-        mp3_clip(music_path, music_path, logger, process_inner_list, ffmpeg_path, True)
-    # 音量调整
-    if process_mp3gain_check:
-        process_name.text = '音量调整'
-        mp3_gain(music_path, int(db_select), logger, process_inner_list, mp3gain_path)
-    # 备份转换后音乐目录
-    if music_path_check:
-        process_name.text = '文件备份'
-        update_progress(process_inner_list, 0, 1, music_path, backup_path)
-        backup(music_path, backup_path, logger)
-    # 随机排列
-    if process_random_check:
-        process_name.text = '随机排列'
-        # TODO: 随机排列过程还有 label_flag 和 name_flag 两个参数，暂时未实现到界面
-        mp3_random(music_path, random_path, result_txt, logger, process_inner_list,
-                   remove_flag=music_files_delete_check)
-    # 备份随机排列后目录
-    if random_path_check:
-        process_name.text = '文件备份'
-        update_progress(process_inner_list, 0, 1, random_path, backup_path)
-        backup(random_path, backup_path, logger)
-    # 运行结束
-    process_name.text = '运行结束'
-    update_progress(process_inner_list, 1, 1, '', '')
-    logger.info('运行结束')
-    window.evaluate_js("""StopTimer();""")
+    future = start_pipeline(config, create_logger(), progress,
+                            on_stage=lambda name: setattr(process_name, 'text', name), cancel_token=cancel_token)
+    future.add_done_callback(lambda f: finish(window, f))
 
 
 def reset(window, default_input_dict, default_checked_dict):
@@ -240,30 +162,31 @@ def bind(window, cwd):
     # ffmpeg 和 mp3gain 初始检查
     ffmpeg = get_element(window, 'ffmpeg')
     ffmpeg_check = get_element(window, 'ffmpeg_check')
-    ffmpeg.on('click', lambda e: get_dependence_file(window, ffmpeg, ffmpeg_check, cwd,
-                                                     file_types=('ffmpeg Executable File (*.exe)',)))
-    ffmpeg_check.on('click', lambda e: get_dependence_file(window, ffmpeg, ffmpeg_check, cwd,
-                                                           file_types=('ffmpeg Executable File (*.exe)',)))
+    ffmpeg.text = FFMPEG  # 默认程序名随平台不同
+    ffmpeg_types = (f'ffmpeg Executable File ({EXECUTABLE_PATTERN})',)
+    ffmpeg.on('click', lambda e: get_dependence_file(window, ffmpeg, ffmpeg_check, cwd, file_types=ffmpeg_types))
+    ffmpeg_check.on('click', lambda e: get_dependence_file(window, ffmpeg, ffmpeg_check, cwd, file_types=ffmpeg_types))
     check_dependence_flag(ffmpeg, ffmpeg_check)
     mp3gain = get_element(window, 'mp3gain')
     mp3gain_check = get_element(window, 'mp3gain_check')
-    mp3gain.on('click', lambda e: get_dependence_file(window, mp3gain, mp3gain_check, cwd,
-                                                      file_types=('mp3gain Executable File (*.exe)',)))
+    mp3gain.text = MP3GAIN
+    mp3gain_types = (f'mp3gain Executable File ({EXECUTABLE_PATTERN})',)
+    mp3gain.on('click', lambda e: get_dependence_file(window, mp3gain, mp3gain_check, cwd, file_types=mp3gain_types))
     mp3gain_check.on('click', lambda e: get_dependence_file(window, mp3gain, mp3gain_check, cwd,
-                                                            file_types=('mp3gain Executable File (*.exe)',)))
+                                                            file_types=mp3gain_types))
     check_dependence_flag(mp3gain, mp3gain_check)
     dependence_list = [ffmpeg, ffmpeg_check, mp3gain, mp3gain_check]
 
     # 输入控件初始化
     # TODO: 或可采用mom_path的选择来初始化其他路径，提供快速设置
     old_path = get_element(window, 'old_path')
-    old_path.value = value_replace(cwd + '\\old')
+    old_path.value = value_replace(os.path.join(cwd, 'old'))
     old_path_button = get_element(window, 'old_path_button')
     old_path_button.on('click',
                        lambda e: get_path(window, old_path, cwd, path_types=('Old Music Path',), file_types=None))
 
     music_path = get_element(window, 'music_path')
-    music_path.value = value_replace(cwd + '\\new')
+    music_path.value = value_replace(os.path.join(cwd, 'new'))
     music_path_button = get_element(window, 'music_path_button')
     music_path_button.on('click',
                          lambda e: get_path(window, music_path, cwd, path_types=('New Music Path',), file_types=None))
@@ -271,19 +194,19 @@ def bind(window, cwd):
     db_select = get_element(window, 'db_select')
 
     random_path = get_element(window, 'random_path')
-    random_path.value = value_replace(cwd + '\\random')
+    random_path.value = value_replace(os.path.join(cwd, 'random'))
     random_path_button = get_element(window, 'random_path_button')
     random_path_button.on('click', lambda e: get_path(window, random_path, cwd, path_types=('Random Music Path',),
                                                       file_types=None))
 
     result_txt = get_element(window, 'result_txt')
-    result_txt.value = value_replace(cwd + '\\result.txt')
+    result_txt.value = value_replace(os.path.join(cwd, 'result.txt'))
     result_txt_button = get_element(window, 'result_txt_button')
     result_txt_button.on('click', lambda e: get_path(window, result_txt, cwd, path_types=None,
                                                      file_types=('Txt Files (*.txt)',)))
 
     backup_path = get_element(window, 'backup_path')
-    backup_path.value = value_replace(cwd + '\\backup')
+    backup_path.value = value_replace(os.path.join(cwd, 'backup'))
     backup_path_button = get_element(window, 'backup_path_button')
     backup_path_button.on('click',
                           lambda e: get_path(window, backup_path, cwd, path_types=('Backup Path',), file_types=None))
@@ -299,19 +222,31 @@ def bind(window, cwd):
     default_checked_dict = get_checked(window, checked_id_list)
 
     # 按钮绑定
+    cancel_token = CancelToken()
     start_button = get_element(window, 'start_button')
-    start_button.on('click', lambda e: start(window, input_element_list, checked_id_list, frame_size, dependence_list))
+    start_button.on('click', lambda e: start(window, input_element_list, checked_id_list, frame_size, dependence_list,
+                                             cancel_token))
     reset_button = get_element(window, 'reset_button')
     reset_button.on('click', lambda e: reset(window, default_input_dict, default_checked_dict))
     exit_button = get_element(window, 'exit_button')
     exit_button.on('click', lambda e: window.destroy())
+    pause_button = get_element(window, 'pause_button')
+    pause_button.on('click', lambda e: pause_or_resume(cancel_token, pause_button))
+    cancel_button = get_element(window, 'cancel_button')
+    cancel_button.on('click', lambda e: cancel_token.cancel())
+    # 关闭窗口时取消正在运行的处理流程（终止子进程）
+    window.events.closed += cancel_token.cancel
 
 
 def main():
+    # 带命令行参数或无法显示界面时，以命令行方式运行
+    if len(sys.argv) > 1 or webview is None:
+        return cli.main()
     cwd = os.getcwd()
     window = webview.create_window('MP3Random', 'static/index.html', width=650, height=750)
     webview.start(bind, (window, cwd))
 
 
 if __name__ == '__main__':
-    main()
+    freeze_support()  # 打包为 exe 后进程池需要
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+运行记录（增量处理）
+
+- fingerprint: 获取文件指纹（文件大小、修改时间）
+- RunManifest: 运行记录，保存每个文件的指纹及已完成的处理过程和参数，再次运行时跳过未改变的文件
+"""
+import json
+import logging
+from os import path, stat, replace, remove
+
+
+def fingerprint(file_path: str) -> list[int]:
+    """
+    获取文件指纹（文件大小、修改时间），文件不存在时返回 None
+
+    :param file_path: 文件的完整路径
+    :return: [文件大小, 修改时间（纳秒）]
+    """
+    try:
+        st = stat(file_path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class RunManifest:
+    """
+    运行记录
+
+    记录文件保存在音乐文件夹旁（同一上级目录），名称为“.<文件夹名>.mp3random.json”，格式为：
+    {"version": 1, "stages": {过程名: {文件完整路径: {"fingerprint": [大小, 修改时间], "params": {参数}[, "output": 输出文件]}}}}
+    文件指纹和参数都与记录一致（且记录的输出文件仍存在）时，视为该过程已对该文件完成。删除记录文件即可重新处理全部文件。
+    """
+    version = 1
+
+    def __init__(self, music_path: str, manifest_file: str = None):
+        """
+        :param music_path: 音乐文件夹
+        :param manifest_file: 记录文件路径，默认保存在音乐文件夹旁
+        """
+        if manifest_file is None:
+            parent, name = path.split(path.abspath(path.normpath(music_path)))
+            manifest_file = path.join(parent, f'.{name}.mp3random.json')
+        self.manifest_file = manifest_file
+        self.stages = {}
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.version:
+                self.stages = data.get('stages', {})
+        except (OSError, ValueError):  # 记录文件不存在或已损坏时重新记录
+            pass
+
+    def is_done(self, stage: str, file_path: str, params: dict, file_fingerprint: list[int] = None) -> bool:
+        """
+        判断某过程是否已以相同参数处理过该文件，且文件此后未被修改、记录的输出文件（见 record）仍存在
+
+        :param stage: 过程名，如 'to_mp3'、'mp3_clip'、'mp3_gain'
+        :param file_path: 文件的完整路径
+        :param params: 处理参数
+        :param file_fingerprint: 已知的文件指纹（如扫描文件夹时得到的 scanner.MusicEntry.fingerprint），默认为 None（重新获取）
+        :return: 是否已处理
+        """
+        record = self.stages.get(stage, {}).get(path.abspath(file_path))
+        if record is None or record['params'] != params:
+            return False
+        if 'output' in record and not path.exists(record['output']):  # 输出文件已被删除（如随机排列后删除）时重新处理
+            return False
+        if file_fingerprint is None:
+            file_fingerprint = fingerprint(file_path)
+        return record['fingerprint'] == file_fingerprint
+
+    def record(self, stage: str, file_path: str, params: dict, output: str = None):
+        """
+        记录某过程已处理该文件（记录文件当前的指纹）
+
+        :param stage: 过程名
+        :param file_path: 文件的完整路径
+        :param params: 处理参数
+        :param output: 输出文件的完整路径（如格式转换后的文件），提供时该文件不存在则视为未处理，默认为 None
+        """
+        record = {'fingerprint': fingerprint(file_path), 'params': params}
+        if output is not None:
+            record['output'] = path.abspath(output)
+        self.stages.setdefault(stage, {})[path.abspath(file_path)] = record
+
+    def save(self, logger: logging.Logger = None) -> bool:
+        """
+        清理已不存在文件的记录，并写入记录文件（先写入临时文件再替换，避免中断时损坏）
+
+        记录文件无法写入（如上级目录只读）时只记录警告并继续，下次运行将重新处理全部文件
+
+        :param logger: 日志记录器，默认为 None（使用 'MP3Random' 日志记录器）
+        :return: 是否保存成功
+        """
+        for records in self.stages.values():
+            for file_path in [p for p in records if not path.exists(p)]:
+                del records[file_path]
+        temp_file = self.manifest_file + '.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.version, 'stages': self.stages}, f, ensure_ascii=False)
+            replace(temp_file, self.manifest_file)
+        except OSError as e:
+            (logger or logging.getLogger('MP3Random')).warning(
+                f'无法保存运行记录 {self.manifest_file}（{e}），下次运行将重新处理全部文件')
+            try:
+                remove(temp_file)
+            except OSError:
+                pass
+            return False
+        return True
+
+if __name__ == '__main__':
+    print('manifest')
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+音乐文件信息读取与缓存
+
+- MusicInfo: 音乐文件信息（时长、码率、标签、名称）
+- MetadataCache: 音乐文件信息缓存（SQLite），以相对路径、文件大小、修改时间为键，保存在音乐文件夹旁
+- read_music_info: 读取文件列表的音乐信息，优先使用缓存，缓存失效的文件在线程池中重新解析并更新
+- ProbeResult: 批量读取音乐信息的结果（可读取的文件及其信息、无法读取的文件及原因）
+- probe_music: 批量读取音乐信息，单个文件损坏时不中断，单独返回无法读取的文件
+"""
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from os import path, stat, cpu_count
+from typing import NamedTuple
+
+# TODO: mutagen库是GPL开源协议的，尝试使用其他库（mp3 文件已改用 mp3_frames.mp3_info 读取）
+from mutagen import File
+
+from mp3_frames import mp3_info
+from scanner import scan_music
+from tokenizer import parse_name
+
+
+class MusicInfo(NamedTuple):
+    """音乐文件信息"""
+    length: float  # 时长（秒）
+    bitrate: int  # 码率（bps）
+    label: str  # 标签，无标签时为“无标签”
+    name: str  # 去除标签和后缀名后的名称
+
+
+def _parse_info(file_path: str, file: str) -> MusicInfo:
+    """
+    解析音乐文件头和文件名，得到音乐文件信息，mp3 文件由 mp3_frames.mp3_info 读取，
+    非 mp3 文件（如格式转换前的 flac、wav）由 mutagen 自动识别格式
+
+    :param file_path: 音乐文件的完整路径
+    :param file: 音乐文件名
+    :return: 音乐文件信息
+    :raises ValueError: 无法识别文件格式时
+    """
+    if file.lower().endswith('.mp3'):
+        info = mp3_info(file_path)
+    else:
+        audio = File(file_path)
+        if audio is None:
+            raise ValueError(f'无法识别的音乐文件：{file}')
+        info = audio.info
+    record = parse_name(file)
+    return MusicInfo(info.length, getattr(info, 'bitrate', 0), record.label, record.name)
+
+
+class MetadataCache:
+    """
+    音乐文件信息缓存
+
+    缓存文件默认保存在音乐文件夹旁（同一上级目录），名称为“.<文件夹名>.mp3random.db”，以免被当作音乐文件处理。
+    文件大小或修改时间发生变化的记录视为失效，重新解析后覆盖。
+    缓存文件无法创建（如上级目录只读）时改用内存缓存，本次运行结束后不保留。
+    """
+
+    def __init__(self, music_path: str, cache_file: str = None, logger: logging.Logger = None):
+        """
+        :param music_path: 音乐文件夹
+        :param cache_file: 缓存文件路径，默认保存在音乐文件夹旁
+        :param logger: 日志对象，用于提示无法创建缓存文件，默认为 'MP3Random'
+        """
+        self.music_path = path.normpath(music_path)
+        if cache_file is None:
+            parent, name = path.split(path.abspath(self.music_path))
+            cache_file = path.join(parent, f'.{name}.mp3random.db')
+        try:
+            self.connection = self._connect(cache_file)
+        except (sqlite3.Error, OSError) as e:
+            (logger or logging.getLogger('MP3Random')).warning(f'无法创建缓存文件 {cache_file}（{e}），改用内存缓存')
+            cache_file = ':memory:'
+            self.connection = self._connect(cache_file)
+        self.cache_file = cache_file
+        self.hits = 0  # 命中缓存的次数
+        self.misses = 0  # 重新解析的次数
+
+    @staticmethod
+    def _connect(cache_file: str) -> sqlite3.Connection:
+        """打开缓存文件并创建数据表"""
+        connection = sqlite3.connect(cache_file)
+        try:
+            connection.execute('CREATE TABLE IF NOT EXISTS music ('
+                               'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, '
+                               'length REAL, bitrate INTEGER, label TEXT, name TEXT)')
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """提交修改并关闭缓存文件"""
+        self.connection.commit()
+        self.connection.close()
+
+    def _lookup(self, file: str):
+        """
+        查询缓存
+
+        :param file: 音乐文件相对于音乐文件夹的路径
+        :return: (文件状态，无法获取时为 None, 缓存有效时的音乐文件信息，否则为 None)
+        """
+        try:
+            st = stat(path.join(self.music_path, file))
+        except OSError:  # 无法获取文件状态时不使用缓存
+            return None, None
+        row = self.connection.execute('SELECT size, mtime, length, bitrate, label, name FROM music WHERE path = ?',
+                                      (file,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return st, MusicInfo(*row[2:])
+        return st, None
+
+    def _store(self, file: str, st, info: MusicInfo):
+        """将重新解析的音乐文件信息写入缓存（文件状态为 None 时不写入）"""
+        self.misses += 1
+        if st is not None:
+            self.connection.execute('INSERT OR REPLACE INTO music VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (file, st.st_size, st.st_mtime_ns, *info))
+
+    def read(self, file: str) -> MusicInfo:
+        """
+        读取音乐文件信息，缓存有效时直接返回，否则解析文件并写入缓存
+
+        :param file: 音乐文件相对于音乐文件夹的路径
+        :return: 音乐文件信息
+        """
+        st, info = self._lookup(file)
+        if info is not None:
+            self.hits += 1
+            return info
+        info = _parse_info(path.join(self.music_path, file), file)
+        self._store(file, st, info)
+        return info
+
+    def read_many(self, files: list[str], jobs: int = None, errors: dict[str, Exception] = None) -> list[MusicInfo]:
+        """
+        读取多个音乐文件的信息，缓存失效的文件在线程池中并行解析（主要耗时为读取文件，可在等待磁盘、网络时并行）
+
+        :param files: 音乐文件列表（相对于音乐文件夹）
+        :param jobs: 并行解析的线程数，默认为 CPU 核心数 + 4（最多 32）
+        :param errors: 提供时，无法解析的文件记录至 {文件: 异常}，其音乐信息为 None；默认为 None（抛出异常）
+        :return: 与文件列表顺序一致的音乐信息列表
+        """
+        infos = []
+        misses = []  # (序号, 文件, 文件状态)
+        for i, file in enumerate(files):
+            st, info = self._lookup(file)
+            if info is None:
+                misses.append((i, file, st))
+            else:
+                self.hits += 1
+            infos.append(info)
+
+        def parse(item) -> MusicInfo:
+            file = item[1]
+            try:
+                return _parse_info(path.join(self.music_path, file), file)
+            except Exception as e:  # 文件损坏时 mutagen、mp3_info 可能抛出各种异常
+                if errors is None:
+                    raise
+                return e
+
+        if len(misses) > 1:
+            with ThreadPoolExecutor(max_workers=jobs or min(32, (cpu_count() or 1) + 4)) as executor:
+                parsed = list(executor.map(parse, misses))
+        else:
+            parsed = [parse(item) for item in misses]
+        for (i, file, st), info in zip(misses, parsed):
+            if isinstance(info, Exception):  # 无法解析的文件不写入缓存，下次重新解析
+                errors[file] = info
+                continue
+            self._store(file, st, info)
+            infos[i] = info
+        return infos
+
+    def prune(self, files: list[str]) -> int:
+        """
+        删除不在文件列表中的缓存记录（已删除或重命名的文件）
+
+        :param files: 当前音乐文件夹中的文件列表
+        :return: 删除的记录数
+        """
+        keep = set(files)
+        stale = [(p,) for p, in self.connection.execute('SELECT path FROM music') if p not in keep]
+        self.connection.executemany('DELETE FROM music WHERE path = ?', stale)
+        return len(stale)
+
+
+def read_music_info(input_path: str, files: list[str], cache_file: str = None, jobs: int = None,
+                    errors: dict[str, Exception] = None) -> list[MusicInfo]:
+    """
+    读取文件列表的音乐信息，优先使用缓存，缓存失效的文件并行解析，并清理缓存中音乐文件夹里已不存在的文件
+    （按整个文件夹清理，只读取部分文件时不删除其他文件的缓存）
+
+    :param input_path: 音乐文件夹
+    :param files: 音乐文件列表（相对于音乐文件夹）
+    :param cache_file: 缓存文件路径，默认保存在音乐文件夹旁
+    :param jobs: 并行解析的线程数，见 MetadataCache.read_many
+    :param errors: 提供时，无法解析的文件记录至 {文件: 异常}，其音乐信息为 None；默认为 None（抛出异常）
+    :return: 与文件列表顺序一致的音乐信息列表
+    """
+    with MetadataCache(input_path, cache_file) as cache:
+        infos = cache.read_many(files, jobs, errors)
+        try:
+            cache.prune([entry.name for entry in scan_music(input_path, None)])
+        except OSError:  # 无法遍历音乐文件夹时不清理
+            pass
+    return infos
+
+
+class ProbeResult(NamedTuple):
+    """批量读取音乐信息的结果"""
+    files: list[str]  # 可读取的文件，与输入顺序一致
+    infos: list[MusicInfo]  # 可读取的文件的音乐信息，与 files 一一对应
+    errors: dict[str, Exception]  # 无法读取的文件及原因
+
+
+def probe_music(input_path: str, files: list[str], jobs: int = None, cache_file: str = None) -> ProbeResult:
+    """
+    批量读取音乐信息（优先使用缓存，缓存失效的文件在线程池中并行读取文件头），单个文件损坏时不中断，
+    由调用方报告无法读取的文件并跳过
+
+    :param input_path: 音乐文件夹
+    :param files: 音乐文件列表（相对于音乐文件夹）
+    :param jobs: 并行读取的线程数，默认为 CPU 核心数 + 4（最多 32）；网络存储上可适当增大
+    :param cache_file: 缓存文件路径，默认保存在音乐文件夹旁
+    :return: 读取结果，可读取的文件保持输入顺序
+    """
+    errors = {}
+    infos = read_music_info(input_path, files, cache_file, jobs, errors)
+    readable = [(file, info) for file, info in zip(files, infos) if info is not None]
+    return ProbeResult([file for file, _ in readable], [info for _, info in readable], errors)
+
+
+if __name__ == '__main__':
+    print('metadata')
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+增量备份（类似 rsync）：只复制新增或修改过的文件，只删除源文件夹中已不存在的文件，可记录哈希值用于校验
+
+- SyncResult: 一次增量备份的结果（复制、未改变、删除、失败的文件数）
+- copy_file: 复制单个文件（优先在内核中复制，见 utils.copy_range，大缓冲区，先写入临时文件再替换）
+- manifest_path: 备份文件夹的哈希记录文件路径
+- sync_tree: 将源文件夹增量同步至备份文件夹，多线程并行复制
+- verify_backup: 按哈希记录校验备份文件夹，返回缺失或内容不一致的文件
+"""
+import errno
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os import path, replace, remove
+from shutil import copystat, rmtree
+from typing import NamedTuple
+
+from dedup import full_hash
+from utils import copy_range, update_progress, Cancelled, CancelToken
+
+BUFFER_SIZE = 8 * 1024 * 1024  # 复制时每次读写的字节数
+_MTIME_WINDOW_NS = 2_000_000_000  # 修改时间的容差（FAT/exFAT 文件系统的修改时间精度为 2 秒）
+_PART_SUFFIX = '.mp3random-part'  # 复制中的临时文件后缀，中断后残留的临时文件在下次备份时删除
+
+
+class SyncResult(NamedTuple):
+    """一次增量备份的结果"""
+    copied: int  # 复制的文件数
+    skipped: int  # 未改变的文件数
+    deleted: int  # 删除的文件数（源文件夹中已不存在）
+    failed: int  # 复制失败的文件数
+
+
+def copy_file(src: str, dst: str, buffer_size: int = BUFFER_SIZE):
+    """
+    复制单个文件及其修改时间等属性；先写入临时文件再替换，中断时备份中不会出现不完整的文件
+
+    :param src: 源文件
+    :param dst: 目标文件
+    :param buffer_size: 每次读写的字节数，默认为 8MB
+    """
+    temp = dst + _PART_SUFFIX
+    try:
+        with open(src, 'rb') as fsrc, open(temp, 'wb') as fdst:
+            copy_range(fsrc, fdst, 0, os.fstat(fsrc.fileno()).st_size, buffer_size)
+        copystat(src, temp)
+        replace(temp, dst)
+    except BaseException:
+        try:
+            remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+def _scan_tree(root: str) -> (dict[str, os.stat_result], list[str]):
+    """
+    遍历文件夹（不进入符号链接指向的文件夹）
+
+    :param root: 文件夹
+    :return: ({相对路径: 文件状态}, 子文件夹相对路径列表)，文件夹不存在时抛出 FileNotFoundError
+    """
+    files, dirs = {}, []
+    stack = ['']
+    while stack:
+        folder = stack.pop()
+        with os.scandir(path.join(root, folder)) as entries:
+            for entry in entries:
+                name = path.join(folder, entry.name) if folder else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(name)
+                    stack.append(name)
+                elif entry.is_file():
+                    files[name] = entry.stat()
+    return files, dirs
+
+
+def manifest_path(backup_place: str) -> str:
+    """
+    备份文件夹的哈希记录文件路径：保存在备份文件夹旁，名称为“.<文件夹名>.backup.json”
+
+    :param backup_place: 备份文件夹
+    :return: 记录文件路径
+    """
+    parent, name = path.split(path.abspath(path.normpath(backup_place)))
+    return path.join(parent, f'.{name}.backup.json')
+
+
+def _load_manifest(manifest_file: str) -> dict[str, list]:
+    """读取哈希记录 {相对路径（以“/”分隔）: [大小, 修改时间（纳秒）, 哈希值]}，不存在或已损坏时为空"""
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('files', {}) if data.get('version') == 1 else {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def _save_manifest(manifest_file: str, files: dict[str, list]):
+    """保存哈希记录（先写入临时文件再替换）"""
+    temp_file = manifest_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'hash': 'blake2b-256', 'files': files}, f, ensure_ascii=False)
+    replace(temp_file, manifest_file)
+
+
+def sync_tree(input_path: str, backup_place: str, logger: logging.Logger, checksum: bool = False,
+              write_manifest: bool = False, jobs: int = None, cancel_token: CancelToken = None,
+              process_inner_list=None) -> SyncResult:
+    """
+    将源文件夹增量同步至备份文件夹
+
+    大小不同或修改时间相差超过 2 秒的文件视为已修改（checksum 为真时改为比较大小相同的文件的哈希值）；
+    只复制新增或已修改的文件，删除源文件夹中已不存在的文件和文件夹，多线程并行复制
+
+    :param input_path: 源文件夹
+    :param backup_place: 备份文件夹，不存在时创建
+    :param logger: 日志对象
+    :param checksum: 是否比较文件内容的哈希值（需读取全部文件，较慢），默认为 False（比较大小和修改时间）
+    :param write_manifest: 是否在备份文件夹旁写入哈希记录（见 manifest_path、verify_backup），未改变的文件沿用上次的哈希值
+    :param jobs: 并行复制的线程数，默认为 CPU 核心数 + 4（最多 32）
+    :param cancel_token: 取消标志，每复制一个文件前检查，取消时已复制的文件保留（下次备份时跳过）
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
+    :return: 备份结果
+    :raises FileNotFoundError: 源文件夹不存在时
+    :raises Cancelled: 备份被取消时
+    """
+    src_files, src_dirs = _scan_tree(input_path)
+    os.makedirs(backup_place, exist_ok=True)
+    dst_files, dst_dirs = _scan_tree(backup_place)
+
+    # 删除源文件夹中已不存在的文件和文件夹（含中断后残留的临时文件、与源文件夹中的文件和文件夹同名但类型不同的项）
+    deleted = 0
+    for name in dst_files.keys() - src_files.keys():
+        remove(path.join(backup_place, name))
+        if not name.endswith(_PART_SUFFIX):
+            logger.info(f'删除备份中已不存在的文件：{path.join(backup_place, name)}')
+            deleted += 1
+    for name in sorted(set(dst_dirs) - set(src_dirs), key=lambda d: d.count(path.sep), reverse=True):
+        rmtree(path.join(backup_place, name), ignore_errors=True)
+    for name in src_dirs:
+        os.makedirs(path.join(backup_place, name), exist_ok=True)
+
+    # 按大小和修改时间判断，只为需要复制、比较或计算哈希值的文件创建任务
+    old_manifest = _load_manifest(manifest_path(backup_place)) if write_manifest else {}
+    manifest = {}
+    tasks = {}  # {相对路径: 'copy' 复制 | 'check' 比较哈希值 | 'hash' 仅计算哈希值}
+    for name, st in src_files.items():
+        key = name.replace(path.sep, '/')
+        dst = dst_files.get(name)
+        if dst is None or dst.st_size != st.st_size:
+            tasks[name] = 'copy'
+        elif checksum:
+            tasks[name] = 'check'
+        elif abs(dst.st_mtime_ns - st.st_mtime_ns) > _MTIME_WINDOW_NS:
+            tasks[name] = 'copy'
+        elif write_manifest:
+            record = old_manifest.get(key)
+            if record is not None and record[:2] == [st.st_size, st.st_mtime_ns]:
+                manifest[key] = record
+            else:
+                tasks[name] = 'hash'
+
+    def work(name: str) -> (bool, bytes):
+        if cancel_token is not None:
+            cancel_token.check()  # 暂停时等待
+        src, dst = path.join(input_path, name), path.join(backup_place, name)
+        digest = None
+        if tasks[name] != 'copy':
+            digest = full_hash(src)
+            if tasks[name] == 'hash' or digest == full_hash(dst):
+                return False, digest
+        copy_file(src, dst)
+        if write_manifest and digest is None:
+            digest = full_hash(dst)
+        return True, digest
+
+    copied = failed = 0
+    count = len(tasks)
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='backup') as executor:
+        futures = {executor.submit(work, name): name for name in tasks}
+        for i, future in enumerate(as_completed(futures)):
+            name = futures[future]
+            try:
+                changed, digest = future.result()
+            except Cancelled:
+                for pending in futures:
+                    pending.cancel()
+                logger.warning(f'备份已取消：完成 {i} / {count} 个文件，已复制的文件保留在 {backup_place}')
+                raise
+            except OSError as e:
+                logger.error(f'备份失败：{path.join(input_path, name)}，{e}')
+                failed += 1
+                continue
+            update_progress(process_inner_list, i + 1, count, path.join(input_path, name),
+                            path.join(backup_place, name))
+            if changed:
+                logger.info(f'备份文件：{path.join(input_path, name)} -> {path.join(backup_place, name)}')
+                copied += 1
+            if digest is not None:
+                st = src_files[name]
+                manifest[name.replace(path.sep, '/')] = [st.st_size, st.st_mtime_ns, digest.hex()]
+    if write_manifest and failed == 0:
+        _save_manifest(manifest_path(backup_place), manifest)
+    return SyncResult(copied, len(src_files) - copied - failed, deleted, failed)
+
+
+def verify_backup(backup_place: str) -> list[str]:
+    """
+    按哈希记录（sync_tree 的 write_manifest）校验备份文件夹
+
+    :param backup_place: 备份文件夹
+    :return: 缺失或内容与记录不一致的文件（相对路径，以“/”分隔），为空时表示校验通过
+    :raises FileNotFoundError: 哈希记录不存在时
+    """
+    manifest_file = manifest_path(backup_place)
+    if not path.exists(manifest_file):
+        raise FileNotFoundError(errno.ENOENT, '哈希记录不存在', manifest_file)
+    problems = []
+    for key, (size, _, digest) in _load_manifest(manifest_file).items():
+        file_path = path.join(backup_place, *key.split('/'))
+        try:
+            if path.getsize(file_path) != size or full_hash(file_path).hex() != digest:
+                problems.append(key)
+        except OSError:
+            problems.append(key)
+    return sorted(problems)
+
+
+if __name__ == '__main__':
+    print('mirror')
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+MP3 帧解析（MPEG-1/2/2.5 Layer III）
+
+- FrameHeader: 帧头信息
+- parse_header: 解析 4 字节帧头，无效时返回 None
+- skip_id3v2: 跳过文件开头的 ID3v2 标签，返回音频数据的起始位置
+- iter_frames: 遍历音频帧，返回每一帧的位置和帧头
+- global_gain_bits: 获取帧中各颗粒、各声道 global_gain 字段的位位置（相对于帧起始位置）
+- StreamInfo: 音频流信息（时长、平均码率、帧数）
+- read_vbr_header: 读取第一帧中的 Xing/Info/VBRI 信息头
+- mp3_info: 读取 MP3 文件的时长和码率（不依赖 mutagen，只读取文件开头的少量数据）
+- make_info_frame: 生成记录帧数和字节数的 Xing/Info 信息帧
+- clip_mp3: 按起止时间截取音频帧（不解码、不启动 ffmpeg.exe），写入新的信息帧
+"""
+import mmap
+from os import fstat
+from typing import NamedTuple, Iterator
+
+from utils import copy_range
+
+# 码率表（kbps），索引 0 为自由码率，索引 15 无效
+_BITRATES = {1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+             2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)}
+# 采样率表（Hz），键为 MPEG 版本：1 为 MPEG-1，2 为 MPEG-2，2.5 为 MPEG-2.5
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+_VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+
+
+class FrameHeader(NamedTuple):
+    """MP3 帧头信息"""
+    version: float  # MPEG 版本：1、2、2.5
+    protection: bool  # 是否有 CRC 校验（帧头后 2 字节）
+    bitrate: int  # 码率（bps）
+    sample_rate: int  # 采样率（Hz）
+    padding: int  # 填充字节数
+    channels: int  # 声道数
+    frame_length: int  # 帧长度（字节，包括帧头）
+    samples: int  # 每帧采样数
+    side_info_size: int  # 边信息长度（字节）
+
+
+def parse_header(header: bytes) -> FrameHeader:
+    """
+    解析 4 字节帧头，仅支持 Layer III，帧头无效时返回 None
+
+    :param header: 帧头的 4 个字节
+    :return: 帧头信息
+    """
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = _VERSIONS.get((header[1] >> 3) & 0b11)
+    layer = (header[1] >> 1) & 0b11
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0b11
+    if version is None or layer != 0b01 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = _BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 1
+    channels = 1 if header[3] >> 6 == 0b11 else 2
+    if version == 1:
+        frame_length = 144 * bitrate // sample_rate + padding
+        samples = 1152
+        side_info_size = 17 if channels == 1 else 32
+    else:
+        frame_length = 72 * bitrate // sample_rate + padding
+        samples = 576
+        side_info_size = 9 if channels == 1 else 17
+    return FrameHeader(version, not header[1] & 1, bitrate, sample_rate, padding, channels, frame_length, samples,
+                       side_info_size)
+
+
+def skip_id3v2(data) -> int:
+    """
+    跳过文件开头的 ID3v2 标签（可能有多个连续标签）
+
+    :param data: 文件数据（bytes 或 mmap）
+    :return: 音频数据的起始位置
+    """
+    offset = 0
+    while data[offset:offset + 3] == b'ID3' and len(data) >= offset + 10:
+        # 标签大小为 4 个 7 位字节（syncsafe 整数），不包括 10 字节的标签头；若有标签尾则再加 10 字节
+        size = 0
+        for b in data[offset + 6:offset + 10]:
+            size = (size << 7) | (b & 0x7F)
+        offset += 10 + size + (10 if data[offset + 5] & 0x10 else 0)
+    return offset
+
+
+def iter_frames(data, offset: int = None) -> Iterator[tuple[int, FrameHeader]]:
+    """
+    遍历音频帧，遇到无效数据时向后搜索下一个同步字，遇到 ID3v1、APE 标签或文件结尾时停止
+
+    :param data: 文件数据（bytes 或 mmap）
+    :param offset: 起始位置，默认跳过 ID3v2 标签
+    :return: 每一帧的 (起始位置, 帧头信息)
+    """
+    if offset is None:
+        offset = skip_id3v2(data)
+    size = len(data)
+    while offset + 4 <= size:
+        header = parse_header(data[offset:offset + 4])
+        if header is not None and offset + header.frame_length <= size:
+            yield offset, header
+            offset += header.frame_length
+            continue
+        if data[offset:offset + 3] == b'TAG' or data[offset:offset + 8] == b'APETAGEX':
+            return
+        # 向后搜索下一个可能的同步字
+        offset = data.find(b'\xff', offset + 1)
+        if offset < 0:
+            return
+
+
+def global_gain_bits(header: FrameHeader) -> list[int]:
+    """
+    获取帧中各颗粒、各声道 global_gain 字段（8 位）的位位置（相对于帧起始位置）
+
+    边信息中每个颗粒、每个声道的字段长度固定（MPEG-1 为 59 位，MPEG-2/2.5 为 63 位），
+    global_gain 位于 part2_3_length（12 位）和 big_values（9 位）之后
+
+    :param header: 帧头信息
+    :return: global_gain 字段的位位置列表
+    """
+    start = (4 + (2 if header.protection else 0)) * 8  # 边信息起始位置
+    if header.version == 1:
+        # main_data_begin 9 位、private_bits 5/3 位、scfsi 每声道 4 位，共 2 个颗粒
+        start += 9 + (5 if header.channels == 1 else 3) + 4 * header.channels
+        granules, block = 2, 59
+    else:
+        # main_data_begin 8 位、private_bits 1/2 位，共 1 个颗粒
+        start += 8 + header.channels
+        granules, block = 1, 63
+    return [start + (gr * header.channels + ch) * block + 21
+            for gr in range(granules) for ch in range(header.channels)]
+
+
+class StreamInfo(NamedTuple):
+    """音频流信息"""
+    length: float  # 时长（秒）
+    bitrate: int  # 平均码率（bps）
+    frames: int  # 帧数（无信息头时由文件大小估算）
+    vbr_header: str  # 信息头类型：'Xing'、'Info'、'VBRI'，无信息头时为 None
+
+
+def read_vbr_header(data, offset: int, header: FrameHeader) -> (str, int, int):
+    """
+    读取第一帧中的 Xing/Info（位于边信息之后）或 VBRI（位于帧头后 32 字节）信息头
+
+    :param data: 文件数据（bytes 或 mmap）
+    :param offset: 第一帧的起始位置
+    :param header: 第一帧的帧头信息
+    :return: (信息头类型, 帧数, 音频数据字节数)，帧数、字节数未记录时为 None；没有信息头时返回 None
+    """
+    start = offset + 4 + (2 if header.protection else 0) + header.side_info_size
+    tag = bytes(data[start:start + 4])
+    if tag in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[start + 4:start + 8], 'big')
+        position = start + 8
+        frames = size = None
+        if flags & 1:
+            frames = int.from_bytes(data[position:position + 4], 'big')
+            position += 4
+        if flags & 2:
+            size = int.from_bytes(data[position:position + 4], 'big')
+        return tag.decode(), frames, size
+    if data[offset + 36:offset + 40] == b'VBRI':
+        size = int.from_bytes(data[offset + 46:offset + 50], 'big')
+        frames = int.from_bytes(data[offset + 50:offset + 54], 'big')
+        return 'VBRI', frames, size
+    return None
+
+
+def mp3_info(file_path: str) -> StreamInfo:
+    """
+    读取 MP3 文件的时长和码率：跳过 ID3v2 标签找到第一帧，有 Xing/Info/VBRI 信息头时按帧数计算时长，
+    否则视为固定码率，按音频数据大小（去除 ID3v1 标签）和第一帧的码率计算，与 mutagen 的结果基本一致
+
+    文件以内存映射方式打开，只会读取标签、第一帧和文件末尾的少量数据
+
+    :param file_path: MP3 文件的完整路径
+    :return: 音频流信息
+    :raises ValueError: 未找到有效的 MP3 帧时
+    """
+    with open(file_path, 'rb') as f:
+        size = fstat(f.fileno()).st_size
+        if size == 0:
+            raise ValueError(f'未找到有效的 MP3 帧：{file_path}')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset, header = next(iter_frames(data), (None, None))
+            if header is None:
+                raise ValueError(f'未找到有效的 MP3 帧：{file_path}')
+            vbr = read_vbr_header(data, offset, header)
+            end = size - 128 if size >= 128 and data[size - 128:size - 125] == b'TAG' else size
+    if vbr is not None and vbr[1]:
+        tag, frames, audio_size = vbr
+        length = frames * header.samples / header.sample_rate
+        if not audio_size:
+            audio_size = end - offset
+        bitrate = round(audio_size * 8 / length) if length else header.bitrate
+        return StreamInfo(length, bitrate, frames, tag)
+    length = (end - offset) * 8 / header.bitrate
+    frames = round(length * header.sample_rate / header.samples)
+    return StreamInfo(length, header.bitrate, frames, vbr[0] if vbr is not None else None)
+
+
+def make_info_frame(header_bytes: bytes, frames: int, size: int, vbr: bool) -> bytes:
+    """
+    生成 Xing/Info 信息帧（与音频帧的版本、采样率、声道相同，无 CRC，边信息全为 0 即静音）
+
+    :param header_bytes: 参照的音频帧的 4 字节帧头
+    :param frames: 音频帧数（不包括信息帧）
+    :param size: 音频数据字节数（包括信息帧）
+    :param vbr: 是否为可变码率，是则写入“Xing”，否则写入“Info”
+    :return: 信息帧
+    :raises ValueError: 参照的帧长度不足以容纳信息帧时（如 8kbps 的 MPEG-2.5 帧）
+    """
+    header_bytes = bytes((header_bytes[0], header_bytes[1] | 1, header_bytes[2], header_bytes[3]))  # 去除 CRC 标志
+    header = parse_header(header_bytes)
+    body = bytes(header.side_info_size) + (b'Xing' if vbr else b'Info') + (3).to_bytes(4, 'big') + \
+        frames.to_bytes(4, 'big') + size.to_bytes(4, 'big')
+    if header.frame_length < 4 + len(body):
+        raise ValueError(f'帧长度 {header.frame_length} 字节不足以容纳信息帧（需要 {4 + len(body)} 字节）')
+    return header_bytes + body + bytes(header.frame_length - 4 - len(body))
+
+
+def clip_mp3(input_file: str, output_file: str, start: float, end: float) -> int:
+    """
+    按起止时间截取 MP3 音频帧：保留 ID3v2 标签，写入新的 Xing/Info 信息帧，再直接复制起止时间之间的音频帧，
+    精度为一帧（约 26ms），效果与“ffmpeg -acodec copy -ss -to”相同
+
+    :param input_file: 输入文件的完整路径
+    :param output_file: 输出文件的完整路径
+    :param start: 起始时间（秒）
+    :param end: 结束时间（秒）
+    :return: 输出的音频帧数
+    :raises ValueError: 未找到有效的 MP3 帧，或起止时间之间没有音频帧时
+    """
+    with open(input_file, 'rb') as src:
+        if fstat(src.fileno()).st_size == 0:
+            raise ValueError(f'未找到有效的 MP3 帧：{input_file}')
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            audio_start = skip_id3v2(data)
+            first = begin = stop = None
+            bitrates = set()
+            index = first_index = last_index = 0
+            for offset, header in iter_frames(data, audio_start):
+                if first is None:
+                    first = header
+                    first_index = round(start * header.sample_rate / header.samples)
+                    last_index = round(end * header.sample_rate / header.samples)
+                    if read_vbr_header(data, offset, header) is not None:  # 原信息帧不是音频帧
+                        continue
+                if index >= last_index:
+                    break
+                if index == first_index:
+                    begin = offset
+                    header_bytes = bytes(data[offset:offset + 4])
+                if begin is not None:
+                    bitrates.add(header.bitrate)
+                    stop = offset + header.frame_length
+                index += 1
+            if first is None:
+                raise ValueError(f'未找到有效的 MP3 帧：{input_file}')
+            if begin is None:
+                raise ValueError(f'起止时间之间没有音频帧：{input_file}（{start}-{end}）')
+            frames = index - first_index
+            info_frame = make_info_frame(header_bytes, frames, 0, len(bitrates) > 1)
+            info_frame = make_info_frame(header_bytes, frames, len(info_frame) + stop - begin, len(bitrates) > 1)
+            with open(output_file, 'wb') as dst:
+                dst.write(data[:audio_start])
+                dst.write(info_frame)
+                dst.flush()
+                copy_range(src, dst, begin, stop - begin)
+    return frames
+
+
+if __name__ == '__main__':
+    print('mp3_frames')
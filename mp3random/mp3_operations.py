@@ -5,94 +5,268 @@
 """
 MP3 文件操作
 
-- backup: 备份文件夹
+- backup: 增量备份文件夹
 - to_mp3: 将各种格式转换为 mp3 格式
 - mp3_clip: 将音乐文件进行切片
 - mp3_gain: 将音乐文件的音量调整到相应的分贝数
+- mp3_gain_native: 使用内置响度分析将音乐文件的音量调整到相应的分贝数（无需 mp3gain.exe）
 """
 import logging
-from os import listdir, sep, remove, path
-from re import match
-from shutil import copytree, rmtree, copy
-from subprocess import run, CREATE_NO_WINDOW
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+from os import sep, remove, path, cpu_count
+from shutil import copy
+from threading import Lock
 
-# TODO: mutagen库是GPL开源协议的，尝试使用其他库
-from mutagen.mp3 import MP3
+from loudness import analyze_file, analyze_source, gain_steps, apply_gain
+from manifest import RunManifest
+from metadata import probe_music
+from mirror import sync_tree
+from mp3_frames import clip_mp3
+from runner import run_batch
+from scanner import MusicEntry, scan_music, MP3_EXTENSIONS
+from tools import FFMPEG, MP3GAIN, mp3gain_args
+from tokenizer import parse_name
+from utils import create_path, update_progress, Cancelled, CancelToken
 
-from utils import create_path, update_progress
 
-
-def backup(input_path: str, output_path: str, logger: logging.Logger) -> bool:
+def backup(input_path: str, output_path: str, logger: logging.Logger, *, checksum: bool = False,
+           write_manifest: bool = False, jobs: int = None, cancel_token: CancelToken = None,
+           process_inner_list=None) -> bool:
     """
-    备份文件夹
+    增量备份文件夹：只复制新增或修改过的文件，只删除源文件夹中已不存在的文件（见 mirror.sync_tree）
 
     :param input_path: 输入文件夹（需要备份的文件夹路径）
     :param output_path: 输出文件夹（备份后文件夹的路径）
     :param logger: 日志对象
+    :param checksum: 是否比较文件内容的哈希值判断文件是否修改，默认为 False（比较大小和修改时间）
+    :param write_manifest: 是否在备份文件夹旁写入哈希记录，用于之后校验（见 mirror.verify_backup），默认为 False
+    :param jobs: 并行复制的线程数，默认为 CPU 核心数 + 4（最多 32）
+    :param cancel_token: 取消标志，每复制一个文件前检查，取消时已复制的文件保留，再次备份时跳过
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
     :return: 是否备份成功
+    :raises Cancelled: 备份被取消时
     """
     # 提取需要备份呢的文件夹的最后一级名称作为新的文件夹的名称
     name = path.basename(input_path)
     backup_place = path.join(output_path, name)
     backup_place = path.normpath(backup_place)
-    # 若该文件夹已存在则删除该文件夹
-    if path.exists(backup_place):
-        rmtree(backup_place)
-        logger.info(f'删除已存在的备份文件夹：{backup_place}')
-    # 复制整个文件夹
     try:
-        copytree(input_path, backup_place)
-        logger.info(f'备份文件夹：{input_path} -> {backup_place}')
+        result = sync_tree(input_path, backup_place, logger, checksum, write_manifest, jobs, cancel_token,
+                           process_inner_list)
+    except Cancelled:
+        raise
     except Exception as e:
         logger.error(f'备份文件夹 {input_path} 失败：{e}')
         return False
-    return True
+    logger.info(f'备份文件夹：{input_path} -> {backup_place}'
+                f'（复制 {result.copied} 个，未改变 {result.skipped} 个，删除 {result.deleted} 个）')
+    if result.failed:
+        logger.error(f'备份文件夹 {input_path} 失败：{result.failed} 个文件复制失败')
+    return result.failed == 0
+
+
+def _ffmpeg_to_mp3_args(ffmpeg_path: str, old: str, new: str, bitrate: str = '128k',
+                        sta: float = None, end: float = None, steps: int = None) -> list[str]:
+    """
+    调用 ffmpeg.exe 将单个文件转换为 mp3 格式的参数列表，可同时切片和调整音量，只编码一次
+
+    :param ffmpeg_path: ffmpeg.exe 文件的路径
+    :param old: 旧文件的完整路径
+    :param new: 新文件的完整路径
+    :param bitrate: 转换后的码率，默认为 '128k'
+    :param sta: 切片起始时间（秒），为 None 时不切片
+    :param end: 切片结束时间（秒）
+    :param steps: 音量调整的步数（每步 1.5dB，见 loudness.gain_steps），为 None 时不调整
+    :return: 参数列表
+    """
+    # 切片：-ss、-to 作为输入参数，直接跳转到起始位置解码
+    seek = ['-ss', str(sta), '-to', str(end)] if sta is not None else []
+    # 音量调整：volume 滤镜按固定增益线性调整，与 mp3gain.exe、mp3_gain_native 的调整方式一致（不压缩动态范围）
+    gain = ['-af', f'volume={steps * 1.5}dB'] if steps is not None else []
+    # 用 ffmpeg.exe 将其转化到新位置的 MP3 ，并设定码率（默认为 128k），使用 -y 参数可以覆盖同名文件
+    # 以参数列表传递，文件名中的空格、引号等字符无需转义
+    return [ffmpeg_path, *seek, '-i', old, *gain, '-b:a', bitrate, new, '-y']
 
 
-def to_mp3(input_path: str, output_path: str, logger: logging.Logger, process_inner_list: list,
-           ffmpeg_path: str = 'ffmpeg.exe', remove_flag: bool = True):
+def _source_gains(tasks: list[(str, str, float, float)], db: int, logger: logging.Logger,
+                  ffmpeg_path: str = FFMPEG, jobs: int = None, cancel_token: CancelToken = None) -> dict[str, int]:
     """
-    调用 ffmpeg.exe 将各种格式转换为 mp3 格式
+    在进程池中计算转换前各文件（切片部分）的综合响度，得到调整到目标分贝数所需的音量调整步数（见 loudness.gain_steps）
+
+    :param tasks: 文件列表 [(文件名, 完整路径, 切片起始时间, 切片结束时间)]，不切片时起止时间为 None
+    :param db: 音乐文件准备调整到的分贝数
+    :param logger: 日志记录器
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG
+    :param jobs: 同时分析的进程数，默认为 CPU 核心数
+    :param cancel_token: 取消标志，取消时不再开始新的分析（正在分析的文件完成后结束）
+    :return: {文件名: 音量调整步数}，无法分析的文件不包含在内（只转换、不调整音量）
+    """
+    steps = {}
+    with ProcessPoolExecutor(max_workers=jobs or cpu_count() or 1) as executor:
+        futures = {executor.submit(analyze_source, file_path, ffmpeg_path, sta, end): file
+                   for file, file_path, sta, end in tasks}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                if cancel_token is not None:
+                    cancel_token.check()  # 暂停时等待
+            except Cancelled:
+                # 取消尚未开始的分析任务
+                for pending in futures:
+                    pending.cancel()
+                logger.warning('格式转换已取消：响度分析未完成')
+                raise
+            try:
+                steps[file] = gain_steps(future.result(), db)
+            except FileNotFoundError as e:
+                if e.filename != ffmpeg_path:
+                    logger.warning(f'无法分析响度，不调整音量：{file}，{e}')
+                    continue
+                # ffmpeg.exe 未找到时转换也会失败（由转换过程报告），取消尚未开始的分析任务
+                for pending in futures:
+                    pending.cancel()
+                break
+            except Exception as e:
+                logger.warning(f'无法分析响度，不调整音量：{file}，{e}')
+    return steps
+
+
+def to_mp3(input_path: str, output_path: str, logger: logging.Logger, process_inner_list=None,
+           ffmpeg_path: str = FFMPEG, remove_flag: bool = True, jobs: int = None,
+           manifest: RunManifest = None, bitrate: str = '128k', clip_flag: bool = False, db: int = None, *,
+           exclude: set[str] = None, timeout: float = None, cancel_token: CancelToken = None):
+    """
+    调用 ffmpeg.exe 将各种格式转换为 mp3 格式，多个 ffmpeg.exe 进程并行运行（见 runner.run_batch），
+    进度条按各文件已转换的时长（ffmpeg.exe 输出的“time=”）连续更新
+
+    开启 clip_flag 或指定 db 时，转换的同时按文件名切片（同 mp3_clip）、调整音量，每个文件只编码一次，
+    无需再单独进行切片和音量调整；调整音量时先分析各文件的响度，再按 mp3gain.exe 的方式线性调整（每步 1.5dB），
+    之后再次调整到相同分贝数时音量不变
 
     :param input_path: 输入文件夹（转换前音乐文件所在的路径）
     :param output_path: 输出文件夹（转换后音乐文件所在的路径）
     :param logger: 日志记录器
-    :param process_inner_list: 进度条控件列表
-    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 'ffmpeg.exe'
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG（Windows 上为 'ffmpeg.exe'，其他平台为 'ffmpeg'）
     :param remove_flag: 是否删除原文件，默认为 True
+    :param jobs: 同时运行的 ffmpeg.exe 进程数，默认为 CPU 核心数
+    :param manifest: 运行记录，提供时跳过已以相同码率转换过、未改变且转换后的文件仍存在的文件
+    :param bitrate: 转换后的码率，默认为 '128k'
+    :param clip_flag: 是否同时按文件名切片，默认为 False
+    :param db: 同时将音量调整到的分贝数，默认为 None（不调整）
+    :param exclude: 不转换的文件名集合（如 dedup.redundant_files 得到的重复文件），默认为 None
+    :param timeout: 单个文件的转换超时时间（秒），超时时终止该 ffmpeg.exe 并继续转换其他文件，默认为 None（不限制）
+    :param cancel_token: 取消标志，取消时终止正在运行的 ffmpeg.exe 并删除未完成的输出文件
     """
     # 转换为 normal 路径
     input_path = path.normpath(input_path)
     output_path = path.normpath(output_path)
 
-    # 读取文件列表
-    old_files = listdir(input_path)
+    # 读取音乐文件列表（跳过子文件夹和非音乐文件）
+    entries = {entry.name: entry for entry in scan_music(input_path)}
+    old_files = list(entries)
+    if exclude:
+        old_files = [file for file in old_files if file not in exclude]
+        if len(old_files) < len(entries):
+            logger.info(f'跳过重复的文件：{len(entries) - len(old_files)} 个')
+    params = {'bitrate': bitrate}
+    if clip_flag:
+        params['clip'] = True
+    if db is not None:
+        params['db'] = db
+    if manifest is not None:
+        todo_files = [file for file in old_files
+                      if not manifest.is_done('to_mp3', entries[file].path, params, entries[file].fingerprint)]
+        if len(todo_files) < len(old_files):
+            logger.info(f'跳过已转换的文件：{len(old_files) - len(todo_files)} 个')
+        if old_files and not todo_files:
+            logger.info('无需转换')
+            return
+        old_files = todo_files
     count = len(old_files)
     if old_files:  # 如果读取的文件列表不为空
-        for i, old_file in enumerate(old_files):
+        output_path = create_path(output_path)
+        # 按文件名提取切片时间和新文件名：{旧文件名: (新文件名, 切片起始时间, 切片结束时间)}
+        clips = {}
+        if clip_flag:
+            probed = probe_music(input_path, old_files, jobs)
+            for file, e in probed.errors.items():  # 无法读取时长的文件只转换、不切片
+                logger.warning(f'无法读取音乐信息，不切片：{file}，{e}')
+            clip_need, rename_need = _re_name([(file, info.length) for file, info in zip(probed.files, probed.infos)])
+            clips.update({old_name: (new_name, sta, end) for old_name, new_name, sta, end in clip_need})
+            clips.update({old_name: (new_name, None, None) for old_name, new_name in rename_need})
+        # 调整音量时，按切片后的部分分析响度：{旧文件名: 音量调整步数}
+        gains = {}
+        if db is not None:
+            sources = []
+            for old_file in old_files:
+                _, sta, end = clips.get(old_file, (None, None, None))
+                sources.append((old_file, input_path + sep + old_file, sta, end))
+            gains = _source_gains(sources, db, logger, ffmpeg_path, jobs, cancel_token)
+        commands, durations, tasks = [], [], []
+        for old_file in old_files:
             # 记录两个文件名作为更新正在操作文件的依据
             t = old_file.rfind('.')
-            new_file = old_file[:t] + '.mp3'
+            new_file, sta, end = clips.get(old_file, (old_file[:t] + '.mp3', None, None))
             # 组合完整路径
             old = input_path + sep + old_file  # 旧文件的完整路径
-            new = create_path(output_path) + sep + new_file  # 新文件的完整路径，位于music_path文件夹且添加MP3后缀
-            # 更新进度条
-            update_progress(process_inner_list, i + 1, count, old_file, new_file)
-            try:
-                # 用 ffmpeg.exe 将其转化到新位置的 MP3 ，并设定码率为 128k
-                # 文件名两侧加上 “ ，可以防止 ffmpeg.exe 不识别空格、冒号等字符，使用 -y 参数可以覆盖同名文件
-                # 采用 subprocess.run 调用 ffmpeg.exe 进行音乐转换，不调用命令行
-                result = run(f'"{ffmpeg_path}" -i "{old}" -b:a 128k "{new}" -y',
-                             capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW)
-                if result.returncode == 0:  # 如果转换成功
+            new = output_path + sep + new_file  # 新文件的完整路径，位于music_path文件夹且添加MP3后缀
+            commands.append(_ffmpeg_to_mp3_args(ffmpeg_path, old, new, bitrate, sta, end, gains.get(old_file)))
+            durations.append(end - sta if sta is not None else None)  # 切片时按切片长度计算进度
+            tasks.append((old_file, new_file, old, new))
+        lock = Lock()
+        fractions = {}  # 正在转换的文件的完成比例（已启动的 ffmpeg.exe）
+        finished = 0  # 已结束的文件数
+
+        def on_progress(index: int, fraction: float):
+            with lock:
+                fractions[index] = min(fraction, 0.99)  # 结束前不显示为已完成
+                old_file, new_file = tasks[index][:2]
+                update_progress(process_inner_list, round(finished + sum(fractions.values()), 2), count,
+                                old_file, new_file)
+
+        cancelled = False
+        # 按完成顺序处理结果
+        with closing(run_batch(commands, jobs, timeout, durations, on_progress, cancel_token)) as results:
+            for i, (index, result) in enumerate(results):
+                old_file, new_file, old, new = tasks[index]
+                if isinstance(result, Cancelled):
+                    cancelled = True
+                    break
+                # 更新进度条
+                with lock:
+                    fractions.pop(index, None)
+                    finished = i + 1
+                    update_progress(process_inner_list, finished, count, old_file, new_file)
+                if isinstance(result, FileNotFoundError):
+                    logger.error(f'转换失败：ffmpeg.exe 未找到')
+                    break  # 停止迭代时尚未开始的转换任务不再运行
+                if isinstance(result, TimeoutError):
+                    logger.error(f'转换超时：{old} -> {new}， {result}')
+                    if path.exists(new):
+                        remove(new)
+                elif isinstance(result, OSError):
+                    logger.error(f'转换失败：{old} -> {new}， {result}')
+                elif result.returncode == 0:  # 如果转换成功
                     logger.info(f'转换文件：{old} -> {new}')
+                    if manifest is not None:
+                        manifest.record('to_mp3', old, params, output=new)
+                        if old_file in gains:  # 已调整音量，之后的音量调整过程跳过该文件
+                            manifest.record('mp3_gain', new, {'db': db})
                     if remove_flag:
                         remove(old)
                         logger.info(f'删除旧文件：{old}')
                 else:  # 如果转换失败
                     logger.error(f'转换失败：{old} -> {new}， {result.stderr}')
-            except FileNotFoundError:
-                logger.error(f'转换失败：ffmpeg.exe 未找到')
+        if cancelled:
+            # 正在转换的 ffmpeg.exe 已被终止，删除其未完成的输出文件，尚未开始的转换任务不再运行
+            for index in fractions:
+                new = tasks[index][3]
+                if path.exists(new):
+                    remove(new)
+            logger.warning(f'格式转换已取消：完成 {finished} / {count} 个文件')
+            raise Cancelled()
     else:  # 如果读取的文件列表为空
         logger.warning(f'音乐文件夹 {input_path} 为空')
 
@@ -108,27 +282,21 @@ def _re_name(files: list[(str, float)]):
     # 获取需要切片的文件名称
     clip_need = []  # 初始化列表作为需要操作的内容
     rename_need = []  # 初始化列表作为需要重命名的内容
-    used_name = ['']  # 已有的文件名列表
+    used_name = {''}  # 已有的文件名集合
+    last_name = {}  # 每个名称上次分配到的文件名（其前的“_2”后缀链均已被占用，从此处继续查找）
     for file, length in files:  # 遍历文件列表
-        m = match('(.*)[(（](-{0,1}?[^-]*?)-(-{0,1}?[^-]*?)[)）](.*)\..*', file)  # 正则提取各部分
+        record = parse_name(file)  # 提取各部分
         # 如果文件名中含有括号
-        if m:
-            name = m.group(1) + m.group(4)  # 将去除括号和后缀名后的部分作为新的名称
-            st = m.group(2)
-            try:  # 如果提取出数字则作为切片时间，否则设置为None
-                sta = float(st)
-            except ValueError:
-                sta = None
-            en = m.group(3)
-            try:
-                end = float(en)
-            except ValueError:
-                end = None
+        if record.clip:
+            name = record.base  # 将去除括号和后缀名后的部分作为新的名称
+            sta, end = record.start, record.end  # 如果提取出数字则作为切片时间，否则为None
 
             # 如果名称为空或已存在则添加后缀
+            base, name = name, last_name.get(name, name)
             while name in used_name:
                 name = name + '_2'
-            used_name.append(name)  # 记录已有的文件名
+            used_name.add(name)  # 记录已有的文件名
+            last_name[base] = name
 
             name = name + '.mp3'  # 为新的文件名添加后缀
             # 如果起止时间都是None，重命名文件
@@ -163,24 +331,43 @@ def _re_name(files: list[(str, float)]):
     return clip_need, rename_need
 
 
-def mp3_clip(input_path: str, output_path: str, logger: logging.Logger, process_inner_list: list,
-             ffmpeg_path: str = 'ffmpeg.exe', remove_flag: bool = True):
+def mp3_clip(input_path: str, output_path: str, logger: logging.Logger, process_inner_list=None,
+             ffmpeg_path: str = FFMPEG, remove_flag: bool = True, manifest: RunManifest = None, *,
+             native: bool = True, jobs: int = None, timeout: float = None, cancel_token: CancelToken = None):
     """
-    调用 ffmpeg.exe 进行音乐切片
+    进行音乐切片：默认直接截取 MP3 音频帧（见 mp3_frames.clip_mp3），无法解析的文件再并行调用 ffmpeg.exe（见 runner.run_batch）
 
     :param input_path: 输入文件夹（需要切片的音乐文件所在的路径）
     :param output_path: 输出文件夹（切片后音乐文件所在的路径）
     :param logger: 日志记录器
-    :param process_inner_list: 进度条控件列表
-    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 'ffmpeg.exe'
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG（Windows 上为 'ffmpeg.exe'，其他平台为 'ffmpeg'）
     :param remove_flag: 是否删除原文件，默认为 True
+    :param manifest: 运行记录，提供时跳过已以相同起止时间切片过且未改变的文件
+    :param native: 是否优先直接截取音频帧（不启动 ffmpeg.exe），默认为 True
+    :param jobs: 并行读取音乐时长的线程数（默认为 CPU 核心数 + 4，最多 32，见 metadata.probe_music），
+                 及同时运行的 ffmpeg.exe 进程数（默认为 CPU 核心数）
+    :param timeout: 调用 ffmpeg.exe 时单个文件的超时时间（秒），超时时终止该 ffmpeg.exe 并继续切片其他文件，默认为 None（不限制）
+    :param cancel_token: 取消标志，每个文件开始前检查，取消时终止正在运行的 ffmpeg.exe 并删除未完成的输出文件
     """
     # 转换为 normal 路径
     input_path = path.normpath(input_path)
-    # 读取文件列表
-    music_files = listdir(input_path)
-    music_files = [(file, MP3(input_path + sep + file).info.length) for file in music_files if file.endswith('.mp3')]
+    # 读取 MP3 文件列表
+    entries = {entry.name: entry for entry in scan_music(input_path, MP3_EXTENSIONS)}
+    music_files = list(entries)
+    # 并行读取音乐时长（优先使用缓存），无法读取的文件跳过
+    probed = probe_music(input_path, music_files, jobs)
+    for file, e in probed.errors.items():
+        logger.error(f'切片失败：{file}，无法读取音乐信息：{e}')
+    music_files = [(file, info.length) for file, info in zip(probed.files, probed.infos)]
     clip_need, rename_need = _re_name(music_files)  # 读取需要切片和需要重命名的文件列表
+    if manifest is not None:
+        todo_clip = [item for item in clip_need
+                     if not manifest.is_done('mp3_clip', entries[item[0]].path, {'start': item[2], 'end': item[3]},
+                                             entries[item[0]].fingerprint)]
+        if len(todo_clip) < len(clip_need):
+            logger.info(f'跳过已切片的文件：{len(clip_need) - len(todo_clip)} 个')
+        clip_need = todo_clip
     count = 1 + len(clip_need)
     # 更新进度条
     update_progress(process_inner_list, 1, count, input_path, input_path)
@@ -196,63 +383,225 @@ def mp3_clip(input_path: str, output_path: str, logger: logging.Logger, process_
             logger.warning(f'文件已存在：{new_name}')
     # 如果有需要切片的文件
     if clip_need:
-        for i, (old_name, new_name, sta, end) in enumerate(clip_need):  # 解包需切片文件列表：旧文件名，新文件名，切片起始时间，切片结束时间
+        def clipped(old: str, new: str, sta: float, end: float):
+            logger.info(f'切片文件：{old} -> {new}')
+            if manifest is not None:
+                manifest.record('mp3_clip', old, {'start': sta, 'end': end})
+            if remove_flag:
+                remove(old)
+                logger.info(f'删除旧文件：{old}')
+
+        # 先直接截取音频帧（进程内，耗时极少），无法解析的文件再并行调用 ffmpeg.exe
+        fallback = []  # (旧文件名, 新文件名, 旧文件完整路径, 新文件完整路径, 切片起始时间, 切片结束时间)
+        finished = 0
+        for old_name, new_name, sta, end in clip_need:  # 解包需切片文件列表：旧文件名，新文件名，切片起始时间，切片结束时间
             # 设置新旧文件完整路径
             old = input_path + sep + old_name
             new = output_path + sep + new_name
-            # 更新进度条
-            update_progress(process_inner_list, i + 2, count, old_name, new_name)
+            if not native:
+                fallback.append((old_name, new_name, old, new, sta, end))
+                continue
             try:
-                # 利用 subprocess.run 调用 ffmpeg.exe 进行音乐切片处理(单位:s)，不调用命令行
-                # '-vn -acodec copy' 可以使用原音乐编码，否则编码不同会导致表现出的长度不同
-                result = run(f'"{ffmpeg_path}" -i "{old}" -vn -acodec copy -ss {sta} -to {end} "{new}" -y',
-                             capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW)
-                if result.returncode == 0:
-                    logger.info(f'切片文件：{old} -> {new}')
-                    if remove_flag:
-                        remove(old)
-                        logger.info(f'删除旧文件：{old}')
-                else:
-                    logger.error(f'切片失败：{old} -> {new}， {result.stderr}')
-            except FileNotFoundError:
-                logger.error(f'切片失败：ffmpeg.exe 未找到')
-                break
+                if cancel_token is not None:
+                    cancel_token.check()  # 暂停时等待，开始切片前已取消则不产生输出文件
+            except Cancelled:
+                logger.warning(f'音乐切片已取消：完成 {finished} / {len(clip_need)} 个文件')
+                raise
+            try:
+                clip_mp3(old, new, sta, end)
+            except ValueError as e:  # 无法解析的文件改用 ffmpeg.exe
+                logger.debug(f'无法直接截取音频帧，改用 ffmpeg.exe：{e}')
+                fallback.append((old_name, new_name, old, new, sta, end))
+                continue
+            except OSError as e:  # 读写失败（如文件被占用、磁盘已满）时删除未完成的输出文件，继续切片其他文件
+                logger.error(f'切片失败：{old} -> {new}， {e}')
+                if path.exists(new):
+                    remove(new)
+            else:
+                clipped(old, new, sta, end)
+            finished += 1
+            # 更新进度条
+            update_progress(process_inner_list, finished + 1, count, old_name, new_name)
+        if fallback:
+            # '-vn -acodec copy' 可以使用原音乐编码，否则编码不同会导致表现出的长度不同
+            commands = [[ffmpeg_path, '-i', old, '-vn', '-acodec', 'copy', '-ss', str(sta), '-to', str(end), new, '-y']
+                        for _, _, old, new, sta, end in fallback]
+            durations = [end - sta for *_, sta, end in fallback]
+            started = set()  # 已启动的 ffmpeg.exe（进度回调函数在启动时调用）
+            cancelled = False
+            with closing(run_batch(commands, jobs, timeout, durations, lambda index, fraction: started.add(index),
+                                   cancel_token)) as results:
+                for index, result in results:
+                    started.discard(index)
+                    old_name, new_name, old, new, sta, end = fallback[index]
+                    if isinstance(result, Cancelled):
+                        started.add(index)
+                        cancelled = True
+                        break
+                    finished += 1
+                    update_progress(process_inner_list, finished + 1, count, old_name, new_name)
+                    if isinstance(result, FileNotFoundError):
+                        logger.error(f'切片失败：ffmpeg.exe 未找到')
+                        break  # 停止迭代时尚未开始的切片任务不再运行
+                    if isinstance(result, OSError):  # 超时等
+                        logger.error(f'切片失败：{old} -> {new}， {result}')
+                        if isinstance(result, TimeoutError) and path.exists(new):
+                            remove(new)
+                    elif result.returncode == 0:
+                        clipped(old, new, sta, end)
+                    else:
+                        logger.error(f'切片失败：{old} -> {new}， {result.stderr}')
+            if cancelled:
+                # 正在切片的 ffmpeg.exe 已被终止，删除其未完成的输出文件
+                for index in started:
+                    new = fallback[index][3]
+                    if path.exists(new):
+                        remove(new)
+                logger.warning(f'音乐切片已取消：完成 {finished} / {len(clip_need)} 个文件')
+                raise Cancelled()
     else:  # 如果没有需要切片的文件
         logger.info('无需切片')
 
 
-def mp3_gain(input_path: str, db: int, logger: logging.Logger, process_inner_list: list,
-             mp3gain_path: str = 'mp3gain.exe'):
+def _skip_gained(entries: list[MusicEntry], db: int, logger: logging.Logger, manifest: RunManifest) -> list[str]:
+    """
+    根据运行记录去除已调整到相同分贝数且此后未改变的文件
+
+    :param entries: 扫描得到的音乐文件列表
+    :param db: 目标分贝数
+    :param logger: 日志记录器
+    :param manifest: 运行记录
+    :return: 需要调整音量的文件名列表，全部已调整时返回 None
+    """
+    music_files = [entry.name for entry in entries]
+    todo_files = [entry.name for entry in entries
+                  if not manifest.is_done('mp3_gain', entry.path, {'db': db}, entry.fingerprint)]
+    if len(todo_files) < len(music_files):
+        logger.info(f'跳过已调整音量的文件：{len(music_files) - len(todo_files)} 个')
+    if music_files and not todo_files:
+        logger.info('无需调整音量')
+        return None
+    return todo_files
+
+
+def mp3_gain(input_path: str, db: int, logger: logging.Logger, process_inner_list=None,
+             mp3gain_path: str = MP3GAIN, manifest: RunManifest = None, *, jobs: int = None, timeout: float = None,
+             cancel_token: CancelToken = None):
     """
-    调用 mp3gain.exe 程序将输入 mp3 音乐文件的音量调整到相应的分贝数
+    调用 mp3gain.exe 程序将输入 mp3 音乐文件的音量调整到相应的分贝数，多个 mp3gain.exe 进程并行运行（见 runner.run_batch）
 
     :param input_path: 输入文件夹（需要调整音量的音乐文件所在的路径）
     :param db: 音乐文件准备调整到的分贝数
     :param logger: 日志记录器
-    :param process_inner_list: 进度条控件列表
-    :param mp3gain_path: mp3gain.exe 文件的路径，默认为 'mp3gain.exe'
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
+    :param mp3gain_path: mp3gain.exe 文件的路径，默认为 MP3GAIN（Windows 上为 'mp3gain.exe'，其他平台为 'mp3gain'）
+    :param manifest: 运行记录，提供时跳过已调整到相同分贝数且此后未改变的文件
+    :param jobs: 同时运行的 mp3gain.exe 进程数，默认为 CPU 核心数
+    :param timeout: 单个文件的超时时间（秒），超时时终止该 mp3gain.exe 并继续调整其他文件，默认为 None（不限制）
+    :param cancel_token: 取消标志，暂停时不再启动新的 mp3gain.exe，取消时终止正在运行的 mp3gain.exe
     """
     # 转换为 normal 路径
     input_path = path.normpath(input_path)
-    # 读取音乐文件列表
-    music_files = listdir(input_path)
+    # 读取 MP3 文件列表
+    entries = list(scan_music(input_path, MP3_EXTENSIONS))
+    music_files = [entry.name for entry in entries]
+    if manifest is not None:
+        music_files = _skip_gained(entries, db, logger, manifest)
+        if music_files is None:
+            return
     count = len(music_files)
     if music_files:  # 如果音乐文件列表不为空
-        for i, music in enumerate(music_files):
-            # 更新进度条
-            update_progress(process_inner_list, i + 1, count, music, music)
-            try:
-                # 利用 subprocess.Popen 调用 mp3gain.exe 进行音量调整，不调用命令行
-                # /d 意为调整分贝数，为相对于 89dB 的相对分贝数； /c 代表无需确认； /r 后跟需要进行操作的文件
-                result = run(f'"{mp3gain_path}" /d {db - 89} /c /r "{input_path}\\{music}"',
-                             capture_output=True, text=True, creationflags=CREATE_NO_WINDOW)
-                if result.returncode == 0:
+        # 并行调用 mp3gain.exe 进行音量调整，以参数列表传递，不调用命令行
+        # -d 意为调整分贝数，为相对于 89dB 的相对分贝数； -c 代表无需确认； -r 代表按单曲调整
+        commands = [mp3gain_args(mp3gain_path, db - 89, input_path + sep + music) for music in music_files]
+        finished = 0
+        with closing(run_batch(commands, jobs, timeout, cancel_token=cancel_token)) as results:
+            for index, result in results:
+                music = music_files[index]
+                if isinstance(result, Cancelled):
+                    logger.warning(f'音量调整已取消：完成 {finished} / {count} 个文件')
+                    raise result
+                finished += 1
+                # 更新进度条
+                update_progress(process_inner_list, finished, count, music, music)
+                if isinstance(result, FileNotFoundError):
+                    logger.error(f'调整音量失败：mp3gain.exe 未找到')
+                    break  # 停止迭代时尚未开始的任务不再运行
+                if isinstance(result, OSError):  # 超时等
+                    logger.error(f'调整音量失败：{music} -> {db}dB， {result}')
+                elif result.returncode == 0:
                     logger.info(f'调整音量：{music} -> {db}dB')
+                    if manifest is not None:  # 记录调整后的文件指纹
+                        manifest.record('mp3_gain', input_path + sep + music, {'db': db})
                 else:
                     logger.error(f'调整音量失败：{music} -> {db}dB， {result.stderr}')
-            except FileNotFoundError:
-                logger.error(f'调整音量失败：mp3gain.exe 未找到')
-                break
+    else:  # 如果音乐文件列表为空
+        logger.warning(f'音乐文件夹 {input_path} 为空')
+
+
+def mp3_gain_native(input_path: str, db: int, logger: logging.Logger, process_inner_list=None,
+                    ffmpeg_path: str = FFMPEG, jobs: int = None, manifest: RunManifest = None, *,
+                    cancel_token: CancelToken = None):
+    """
+    使用内置响度分析将输入 mp3 音乐文件的音量调整到相应的分贝数（无需 mp3gain.exe）
+
+    在进程池中调用 ffmpeg.exe 解码并计算 EBU R128 综合响度，再直接修改 MP3 帧的 global_gain 字段（每步 1.5dB），
+    不重新编码，与 mp3gain.exe 的调整方式一致
+
+    :param input_path: 输入文件夹（需要调整音量的音乐文件所在的路径）
+    :param db: 音乐文件准备调整到的分贝数
+    :param logger: 日志记录器
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
+    :param ffmpeg_path: ffmpeg.exe 文件的路径，默认为 FFMPEG（Windows 上为 'ffmpeg.exe'，其他平台为 'ffmpeg'）
+    :param jobs: 同时分析的进程数，默认为 CPU 核心数
+    :param manifest: 运行记录，提供时跳过已调整到相同分贝数且此后未改变的文件
+    :param cancel_token: 取消标志，每个文件修改前检查，取消时不再开始新的分析（正在分析的文件完成后结束）
+    """
+    # 转换为 normal 路径
+    input_path = path.normpath(input_path)
+    # 读取 MP3 文件列表
+    entries = list(scan_music(input_path, MP3_EXTENSIONS))
+    music_files = [entry.name for entry in entries]
+    if manifest is not None:
+        music_files = _skip_gained(entries, db, logger, manifest)
+        if music_files is None:
+            return
+    count = len(music_files)
+    if music_files:  # 如果音乐文件列表不为空
+        # 解码和滤波为 CPU 密集型操作，使用进程池
+        with ProcessPoolExecutor(max_workers=jobs or cpu_count() or 1) as executor:
+            futures = {executor.submit(analyze_file, input_path + sep + music, ffmpeg_path): music
+                       for music in music_files}
+            for i, future in enumerate(as_completed(futures)):
+                music = futures[future]
+                try:
+                    if cancel_token is not None:
+                        cancel_token.check()  # 暂停时等待
+                except Cancelled:
+                    # 取消尚未开始的分析任务
+                    for pending in futures:
+                        pending.cancel()
+                    logger.warning(f'音量调整已取消：完成 {i} / {count} 个文件')
+                    raise
+                # 更新进度条
+                update_progress(process_inner_list, i + 1, count, music, music)
+                try:
+                    steps = gain_steps(future.result(), db)
+                    apply_gain(input_path + sep + music, steps)
+                    logger.info(f'调整音量：{music} -> {db}dB（{steps * 1.5:+.1f}dB）')
+                    if manifest is not None:  # 记录调整后的文件指纹
+                        manifest.record('mp3_gain', input_path + sep + music, {'db': db})
+                except FileNotFoundError as e:
+                    if e.filename != ffmpeg_path:
+                        logger.error(f'调整音量失败：{music} -> {db}dB， {e}')
+                        continue
+                    logger.error(f'调整音量失败：ffmpeg.exe 未找到')
+                    # 取消尚未开始的分析任务
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                except Exception as e:
+                    logger.error(f'调整音量失败：{music} -> {db}dB， {e}')
     else:  # 如果音乐文件列表为空
         logger.warning(f'音乐文件夹 {input_path} 为空')
 
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+处理流程（与图形界面无关，供界面、命令行和脚本调用）
+
+- PipelineConfig: 处理流程的配置（路径、依赖、开启的过程及其参数）
+- check_config: 检查配置，返回错误信息列表
+- PipelineResult: 处理流程的运行结果（已完成的过程、取消时所在的过程、耗时）
+- run_pipeline: 按配置依次执行备份、查重、格式转换、音乐切片、音量调整、随机排列过程，可暂停、继续、取消
+- start_pipeline: 在后台线程中执行处理流程
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from os import path
+from time import monotonic
+from typing import NamedTuple, Callable
+
+from dedup import DEDUP_MODES, find_duplicates, redundant_files
+from manifest import RunManifest
+from mp3_operations import backup, to_mp3, mp3_clip, mp3_gain, mp3_gain_native
+from randomization import mp3_random, LINK_MODES
+from report import REPORT_FORMATS
+from tools import FFMPEG, MP3GAIN, probe_tool
+from utils import create_logger, check_dependence, update_progress, time_from, Cancelled, CancelToken
+
+GAIN_ENGINES = ('auto', 'native', 'mp3gain')  # 音量调整方式：自动选择、内置响度分析（需 ffmpeg）、mp3gain
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline')  # 后台运行处理流程的线程
+
+
+class PipelineConfig(NamedTuple):
+    """处理流程的配置，各字段与界面上的选项一一对应"""
+    music_path: str  # 转换后音乐目录（切片、音量调整、随机排列的输入）
+    old_path: str = ''  # 转换前音乐目录
+    random_path: str = ''  # 随机排列后目录
+    result_txt: str = 'result.txt'  # 结果文件输出至
+    report_formats: tuple = ('txt',)  # 结果文件的格式，见 report.REPORT_FORMATS（'jsonl'、'csv' 保存在结果文件旁）
+    backup_path: str = ''  # 备份音乐文件至
+    ffmpeg_path: str = FFMPEG  # ffmpeg 的路径（Windows 上默认为 ffmpeg.exe，其他平台为 ffmpeg）
+    mp3gain_path: str = MP3GAIN  # mp3gain 的路径（Windows 上默认为 mp3gain.exe，其他平台为 mp3gain）
+    db: int = 89  # 音乐音量调整至（分贝数）
+    process_to_mp3: bool = False  # 开启[格式转换]
+    process_clip: bool = False  # 开启[音乐切片]
+    process_gain: bool = False  # 开启[音量调整]
+    process_random: bool = False  # 开启[随机排列]
+    backup_old: bool = False  # 备份转换前音乐目录（仅开启[格式转换]时）
+    backup_music: bool = False  # 备份转换后音乐目录
+    backup_random: bool = False  # 备份随机排列后目录（仅开启[随机排列]时）
+    backup_checksum: bool = False  # 备份时比较文件内容的哈希值（默认比较大小和修改时间）
+    backup_manifest: bool = False  # 备份时在备份文件夹旁写入哈希记录，用于之后校验
+    remove_old: bool = False  # 格式转换后删除原文件
+    remove_music: bool = False  # 随机排列后删除转换后音乐目录
+    label_flag: bool = False  # 随机排列后文件名包含标签
+    name_flag: bool = False  # 随机排列后文件名包含原文件名
+    link_mode: str = 'copy'  # 随机排列的输出方式，见 randomization.mp3_random
+    constraints: tuple = ()  # 随机排列的约束（scheduler.Constraint），为空时仅保证相同标签尽量不相邻
+    time_budget: float = 1.0  # 按约束排列的求解时间（秒）
+    seed: int = None  # 随机排列的随机种子，默认随机生成（记录在结果文件中）
+    replay: bool = False  # 按上次结果文件中的排序结果重新生成随机排列后目录
+    gain_engine: str = 'auto'  # 音量调整方式，见 GAIN_ENGINES
+    incremental: bool = True  # 是否使用运行记录跳过未改变的文件
+    dedup: str = ''  # 查重方式，见 dedup.DEDUP_MODES，为空时不查重；重复文件只保留一个参与转换和随机排列
+    jobs: int = None  # 并行进程数，默认为 CPU 核心数
+    bitrate: str = '128k'  # 格式转换后的码率
+    timeout: float = None  # 调用 ffmpeg、mp3gain 时单个文件的超时时间（秒），默认不限制
+
+
+class PipelineResult(NamedTuple):
+    """处理流程的运行结果"""
+    completed: list[str]  # 已完成的过程
+    cancelled: str  # 取消时所在的过程，未取消时为 None
+    elapsed: float  # 耗时（秒）
+
+    def summary(self) -> str:
+        """
+        运行结果摘要
+
+        :return: 如“已完成：格式转换、音乐切片；在[音量调整]过程中取消；耗时：00h01m05s”
+        """
+        text = f'已完成：{"、".join(self.completed) or "无"}'
+        if self.cancelled is not None:
+            text += f'；在[{self.cancelled}]过程中取消'
+        return text + f'；耗时：{time_from(self.elapsed)}'
+
+
+def _tool_path(name: str, logger: logging.Logger) -> str:
+    """
+    查找外部程序（只查找一次），记录其完整路径和版本
+
+    :param name: 程序名或路径
+    :param logger: 日志记录器
+    :return: 完整路径，未找到时为原名称（由各过程报告未找到）
+    """
+    tool = probe_tool(name)
+    if tool is None:
+        return name
+    logger.info(f'外部程序：{tool.path}（版本：{tool.version or "未知"}）')
+    return tool.path
+
+
+def _use_native_gain(config: PipelineConfig) -> bool:
+    """
+    判断音量调整是否使用内置响度分析：'auto' 时找到 ffmpeg 即使用，否则使用 mp3gain
+
+    :param config: 处理流程的配置
+    :return: 是否使用内置响度分析
+    """
+    if config.gain_engine == 'auto':
+        return check_dependence(config.ffmpeg_path)
+    return config.gain_engine == 'native'
+
+
+def check_config(config: PipelineConfig) -> list[str]:
+    """
+    检查配置：依赖是否存在，开启的过程所需的目录是否存在，各目录之间是否冲突
+
+    :param config: 处理流程的配置
+    :return: 错误信息列表，为空时表示检查通过
+    """
+    errors = []
+    old_path, music_path, random_path, backup_path = (config.old_path, config.music_path, config.random_path,
+                                                      config.backup_path)
+    # 检查依赖: [格式转换]使用ffmpeg，[音量调整]使用ffmpeg（内置响度分析）或mp3gain，若未开启则不检查
+    # [音乐切片]直接截取音频帧，仅无法解析的文件使用ffmpeg，因此不要求ffmpeg
+    if config.process_to_mp3 and not check_dependence(config.ffmpeg_path):
+        errors.append('未找到ffmpeg！')
+    if config.process_gain:
+        if config.gain_engine not in GAIN_ENGINES:
+            errors.append(f'不支持的音量调整方式：{config.gain_engine}')
+        elif config.gain_engine == 'auto' and not (check_dependence(config.ffmpeg_path) or
+                                                   check_dependence(config.mp3gain_path)):
+            errors.append('未找到ffmpeg或mp3gain！')
+        elif config.gain_engine == 'native' and not check_dependence(config.ffmpeg_path):
+            errors.append('未找到ffmpeg！')
+        elif config.gain_engine == 'mp3gain' and not check_dependence(config.mp3gain_path):
+            errors.append('未找到mp3gain！')
+    if config.dedup and config.dedup not in DEDUP_MODES:
+        errors.append(f'不支持的查重方式：{config.dedup}')
+    elif config.dedup == 'audio' and not check_dependence(config.ffmpeg_path):
+        errors.append('未找到ffmpeg！')
+    if config.process_random and config.link_mode not in LINK_MODES:
+        errors.append(f'不支持的输出方式：{config.link_mode}')
+    if config.process_random:
+        errors.extend(f'不支持的结果文件格式：{report_format}' for report_format in config.report_formats
+                      if report_format not in REPORT_FORMATS)
+    # 开启[格式转换]过程时
+    if config.process_to_mp3:
+        # [转换前音乐目录]不能为空，且必须存在，且不能与[转换后音乐目录]相同
+        if old_path == '':
+            errors.append('[转换前音乐目录]不能为空！')
+        if not path.exists(old_path):
+            errors.append('[转换前音乐目录]不存在！')
+        if old_path == music_path:
+            errors.append('[转换前音乐目录]不能与[转换后音乐目录]相同！')
+        # [转换前音乐目录]不能与[随机排列后目录]相同
+        if config.process_random and old_path == random_path:
+            errors.append('[转换前音乐目录]不能与[随机排列后目录]相同！')
+    elif config.process_clip or config.process_gain or config.process_random:
+        # 未开启[格式转换]时，[转换后音乐目录]不能为空，且必须存在
+        if music_path == '':
+            errors.append('[转换后音乐目录]不能为空！')
+        if not path.exists(music_path):
+            errors.append('[转换后音乐目录]不存在！')
+    else:
+        # 任何过程都未开启时
+        errors.append('请至少开启一个处理过程！')
+    # 开启[随机排列]时，[转换后音乐目录]不能与[随机排列后目录]相同
+    if config.process_random and music_path == random_path:
+        errors.append('[转换后音乐目录]不能与[随机排列后目录]相同！')
+    # 处理备份检查：未开启[格式转换]时不备份转换前音乐目录，未开启[随机排列]时不备份随机排列后目录
+    backup_old = config.backup_old and config.process_to_mp3
+    backup_random = config.backup_random and config.process_random
+    if (backup_old or config.backup_music or backup_random) and backup_path == '':
+        errors.append('[备份音乐文件至]不能为空！')
+    if backup_old and old_path == backup_path:
+        errors.append('[转换前音乐目录]不能与[备份音乐文件至]相同！')
+    if config.backup_music and music_path == backup_path:
+        errors.append('[转换后音乐目录]不能与[备份音乐文件至]相同！')
+    if backup_random and random_path == backup_path:
+        errors.append('[随机排列后目录]不能与[备份音乐文件至]相同！')
+    return errors
+
+
+def run_pipeline(config: PipelineConfig, logger: logging.Logger = None, progress=None,
+                 on_stage: Callable[[str], None] = None, cancel_token: CancelToken = None) -> PipelineResult:
+    """
+    按配置依次执行各过程：备份转换前音乐目录、查重、格式转换、音乐切片、音量调整、备份转换后音乐目录、随机排列、备份随机排列后目录
+
+    调用前应先通过 check_config 检查配置。取消时当前过程在当前文件处停止（终止正在运行的子进程），
+    已完成的文件仍写入运行记录，再次运行时从中断处继续
+
+    :param config: 处理流程的配置
+    :param logger: 日志记录器，默认创建新的日志记录器（输出至控制台和 mp3random.log）
+    :param progress: 进度条控件列表或进度回调函数 callback(current_value, total_value, old_file, new_file)，
+                     见 utils.update_progress，默认为 None（不显示进度）
+    :param on_stage: 过程开始时的回调函数 callback(过程名)，默认为 None
+    :param cancel_token: 取消标志，用于暂停、继续、取消，默认为 None（不可取消）
+    :return: 运行结果（已完成的过程、取消时所在的过程、耗时）
+    """
+    if logger is None:
+        logger = create_logger()
+    start_time = monotonic()
+    completed = []  # 已完成的过程
+    current = []  # 正在运行的过程
+
+    def stage(name: str):
+        completed.extend(current)
+        current[:] = [name]
+        if on_stage is not None:
+            on_stage(name)
+
+    logger.info('开始运行')
+    # 转换为normal路径
+    old_path = path.normpath(config.old_path)
+    music_path = path.normpath(config.music_path)
+    backup_path = path.normpath(config.backup_path)
+    random_path = path.normpath(config.random_path)
+    result_txt = path.normpath(config.result_txt)
+    # 外部程序只查找一次，各过程直接使用其完整路径
+    ffmpeg_path = _tool_path(config.ffmpeg_path, logger)
+    mp3gain_path = _tool_path(config.mp3gain_path, logger)
+    # 运行记录：跳过上次运行后未改变的文件（增量处理）
+    manifest = RunManifest(music_path) if config.incremental else None
+    try:
+        # 备份转换前音乐目录
+        if config.backup_old and config.process_to_mp3:
+            stage('文件备份')
+            update_progress(progress, 0, 1, old_path, backup_path)
+            backup(old_path, backup_path, logger, checksum=config.backup_checksum,
+                   write_manifest=config.backup_manifest, jobs=config.jobs, cancel_token=cancel_token,
+                   process_inner_list=progress)
+        # 查重：开启[格式转换]时查找转换前音乐目录，重复文件不转换；否则查找转换后音乐目录，重复文件不参与随机排列
+        exclude = None
+        if config.dedup and (config.process_to_mp3 or config.process_random):
+            stage('查重')
+            dedup_path = old_path if config.process_to_mp3 else music_path
+            update_progress(progress, 0, 1, dedup_path, '')
+            duplicates = find_duplicates(dedup_path, config.dedup, ffmpeg_path, config.jobs)
+            exclude = redundant_files(duplicates, logger)
+            logger.info(f'查重完成：{len(duplicates)} 组重复文件，跳过 {len(exclude)} 个')
+        # 转换为 MP3（同时开启[音乐切片]或[音量调整]时，转换的同时进行切片和音量调整，每个文件只编码一次）
+        if config.process_to_mp3:
+            stage('格式转换')
+            to_mp3(old_path, music_path, logger, progress, ffmpeg_path, config.remove_old, jobs=config.jobs,
+                   manifest=manifest, bitrate=config.bitrate, clip_flag=config.process_clip,
+                   db=config.db if config.process_gain else None, exclude=exclude, timeout=config.timeout,
+                   cancel_token=cancel_token)
+        # 切片（转换时已切片的文件不再包含切片时间，将被跳过）
+        if config.process_clip:
+            stage('音乐切片')
+            mp3_clip(music_path, music_path, logger, progress, ffmpeg_path, True, manifest=manifest, jobs=config.jobs,
+                     timeout=config.timeout, cancel_token=cancel_token)
+        # 音量调整（转换时已调整音量的文件已记录在运行记录中，将被跳过）
+        if config.process_gain:
+            stage('音量调整')
+            if _use_native_gain(config):
+                mp3_gain_native(music_path, config.db, logger, progress, ffmpeg_path, jobs=config.jobs,
+                                manifest=manifest, cancel_token=cancel_token)
+            else:
+                mp3_gain(music_path, config.db, logger, progress, mp3gain_path, manifest=manifest, jobs=config.jobs,
+                         timeout=config.timeout, cancel_token=cancel_token)
+        if manifest is not None:
+            manifest.save(logger)
+            manifest = None
+        # 备份转换后音乐目录
+        if config.backup_music:
+            stage('文件备份')
+            update_progress(progress, 0, 1, music_path, backup_path)
+            backup(music_path, backup_path, logger, checksum=config.backup_checksum,
+                   write_manifest=config.backup_manifest, jobs=config.jobs, cancel_token=cancel_token,
+                   process_inner_list=progress)
+        # 随机排列
+        if config.process_random:
+            stage('随机排列')
+            mp3_random(music_path, random_path, result_txt, logger, progress, config.label_flag, config.name_flag,
+                       config.remove_music, config.link_mode, constraints=list(config.constraints),
+                       time_budget=config.time_budget, exclude=None if config.process_to_mp3 else exclude,
+                       report_formats=config.report_formats, jobs=config.jobs, seed=config.seed,
+                       replay=config.replay, cancel_token=cancel_token)
+        # 备份随机排列后目录
+        if config.backup_random and config.process_random:
+            stage('文件备份')
+            update_progress(progress, 0, 1, random_path, backup_path)
+            backup(random_path, backup_path, logger, checksum=config.backup_checksum,
+                   write_manifest=config.backup_manifest, jobs=config.jobs, cancel_token=cancel_token,
+                   process_inner_list=progress)
+        completed.extend(current)
+        current.clear()
+    except Cancelled:
+        pass
+    finally:
+        # 取消时也保存已完成文件的运行记录
+        if manifest is not None:
+            manifest.save(logger)
+    result = PipelineResult(completed, current[0] if current else None, monotonic() - start_time)
+    # 运行结束
+    if on_stage is not None:
+        on_stage('运行结束' if result.cancelled is None else '运行已取消')
+    if result.cancelled is None:
+        update_progress(progress, 1, 1, '', '')
+    else:
+        # 取消时立即输出暂存的进度，界面显示取消时的位置
+        getattr(progress, 'flush', lambda: None)()
+    logger.info(result.summary())
+    logger.info('运行结束' if result.cancelled is None else '运行已取消')
+    return result
+
+
+def start_pipeline(config: PipelineConfig, logger: logging.Logger = None, progress=None,
+                   on_stage: Callable[[str], None] = None, cancel_token: CancelToken = None) -> Future:
+    """
+    在后台线程中执行处理流程（参数同 run_pipeline），调用方（如界面）不会被阻塞，同一时间只运行一个处理流程
+
+    :return: 处理流程的 Future，结果为 PipelineResult
+    """
+    return _executor.submit(run_pipeline, config, logger, progress, on_stage, cancel_token)
+
+
+if __name__ == '__main__':
+    print('pipeline')
@@ -5,85 +5,139 @@
 """
 随机排列音乐文件
 
-- mp3_random: 进行随机排列，并将结果保存至文件夹，生成结果统计txt文件
+- mp3_random: 进行随机排列（可按多个约束继续优化，见 scheduler.py；可指定随机种子或按上次的结果重新生成），并将结果保存至文件夹（复制、硬链接、写时复制、符号链接或仅生成播放列表），生成结果统计文件（文本、JSON Lines、CSV，见 report.py）
 """
 import logging
-from os import path, sep, listdir, remove
-from random import shuffle
-from re import match, compile
+from heapq import heapify, heappop, heappush, heapreplace
+from os import path, sep, remove, link, symlink
+from random import Random, getrandbits
 from shutil import copy, rmtree
 
-# TODO: mutagen库是GPL开源协议的，尝试使用其他库
-from mutagen.mp3 import MP3
+from metadata import probe_music
+from report import REPORT_FORMATS, ReportWriter, read_report
+from scanner import list_music
+from scheduler import Constraint, schedule
+from tokenizer import parse_name
+from utils import create_path, time_list_from, update_progress, Cancelled, CancelToken
 
-from utils import create_path, time_list_from, update_progress
+LINK_MODES = ('copy', 'hardlink', 'reflink', 'symlink', 'playlist')  # 随机排列结果的输出方式
+_FICLONE = 0x40049409  # Linux 写时复制克隆文件的 ioctl 请求码
 
 
-def _get_random(music_files: list[str], process_inner_list: list) -> (list[str], int, float):
+def _get_random(music_files: list[str], process_inner_list: list = None, *,
+                rng: Random = None) -> (list[str], int, float):
     """
     随机排列音乐文件
 
+    每次从剩余文件数最多、且与上一个标签不同的标签中取出一个文件，剩余数相同的标签随机决定先后，
+    可一次构造出相邻次数最小（max(0, 2 * 最多标签数 - 文件数 - 1)）的排列，复杂度为 O(n log k)
+
     :param music_files: 音乐文件列表
-    :param process_inner_list: 进度条控件列表
-    :return: 随机排列的结果，包括文件名列表、最小相邻次数、随机质量
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
+    :param rng: 随机数生成器，相同种子（如 Random(seed)）对相同的文件得到相同的排列（与文件列表的顺序无关），
+                默认为 None（使用新的随机种子）
+    :return: 随机排列的结果，包括文件名列表、最小相邻次数、随机质量（相邻文件标签不同的比例）
     """
     count = len(music_files)
     if count == 0:
         return [], 0, 0.0
+    if rng is None:
+        rng = Random()
+
+    # 按标签分组（按文件名排序后分组，结果不受文件列表顺序影响），并随机排列组内文件
+    groups = {}
+    for name in sorted(music_files):
+        groups.setdefault(parse_name(name).label, []).append(name)
+    # 最大堆（取负数），元素为：(-剩余文件数, 随机数, 标签)，随机数用于打乱剩余文件数相同的标签
+    heap = []
+    for key, group in groups.items():
+        rng.shuffle(group)
+        heap.append((-len(group), rng.random(), key))
+    heapify(heap)
+
+    result = []
+    adjacent_count = 0
+    last_label = None
+    step = max(1, count // 100)  # 进度条最多更新 100 次
+    while heap:
+        num, _, key = heappop(heap)
+        if key == last_label:
+            if heap:  # 与上一个标签相同时，改取剩余文件数次多的标签
+                num, _, key = heapreplace(heap, (num, rng.random(), key))
+            else:  # 只剩该标签时，相邻不可避免
+                adjacent_count += 1
+        result.append(groups[key].pop())
+        last_label = key
+        if num + 1 < 0:
+            heappush(heap, (num + 1, rng.random(), key))
+        if len(result) % step == 0:
+            update_progress(process_inner_list, len(result), count, '', '')
+
+    quality = (1 - adjacent_count / (count - 1)) * 100 if count > 1 else 100.0
+    return result, adjacent_count, quality
+
+
+def _label_stats(labels: list[str], time_list: list[float]) -> (list[tuple[int, str]], dict[str, tuple[str, str]]):
+    """
+    按标签分类统计：一次遍历按标签分组（哈希表），复杂度为 O(n)，与标签数无关
+
+    :param labels: 各文件的标签
+    :param time_list: 各文件的时长（秒），与标签一一对应
+    :return: (按个数降序排列的 (个数, 标签) 列表, {标签: (总时长, 平均时长)})
+    """
+    groups = {}
+    for label, length in zip(labels, time_list):
+        groups.setdefault(label, []).append(length)
+    # 对每个标签进行计数，并按照数量降序排列（数量相同时按标签降序）
+    labels_num = sorted(((len(lengths), label) for label, lengths in groups.items()), reverse=True)
+    # 获取分组时间列表，并将其格式化为总时长、平均时长
+    time_group = {label: time_list_from(lengths) for label, lengths in groups.items()}
+    return labels_num, time_group
+
+
+def _reflink(src: str, dst: str):
+    """
+    写时复制克隆文件（Linux 上的 Btrfs、XFS 等文件系统支持），不支持时抛出 OSError
+
+    :param src: 源文件
+    :param dst: 目标文件
+    """
+    try:
+        from fcntl import ioctl
+    except ImportError:
+        raise OSError('当前系统不支持写时复制')
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            ioctl(d.fileno(), _FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            remove(dst)
+            raise
+
 
-    min_adjacent_count = float('inf')  # 初始化为无穷大
-    best_result = []
-    best_quality = 0.0
-    # 获取文件标签
-    label = compile('[\[【［](.*)[]】］].*')
-    labels_dict = {name: label.match(name).group(1) if label.match(name) else '无标签' for name in music_files}
-    # 将文件按标签排序
-    sorted_files = sorted(music_files, key=lambda x: labels_dict[x])
-    max_num_range = int(count * 0.7)
-    # 遍历每个可能的分组大小
-    for max_num in range(1, max_num_range + 1):
-        update_progress(process_inner_list, max_num, max_num_range, '', '')
-        # 按照最大允许数量分组
-        groups = [sorted_files[i: i + max_num] for i in range(0, count, max_num)]
-
-        # 循环100次寻找当前分组大小下的最优结果
-        for _ in range(100):
-            # 随机排列组内文件及组间分组
-            [shuffle(group) for group in groups]
-            shuffle(groups)
-
-            # 交叉合并分组
-            interleaved = []
-            i = 0
-            j = len(groups) - 1
-            while i <= j:
-                # 若 i == j ，则该组为单组，可将其随机插入到结果中
-                if i == j:
-                    interleaved.extend(groups[i])
-                else:  # 否则将两组交叉插入到结果中
-                    for k in range(max_num):
-                        if k < len(groups[i]):
-                            interleaved.append(groups[i][k])
-                        if k < len(groups[j]):
-                            interleaved.append(groups[j][k])
-                i += 1
-                j -= 1
-
-            # 计算标签和相邻次数
-            interleaved_labels = [labels_dict[name] for name in interleaved]
-            adjacent_count = sum(a == b for a, b in zip(interleaved_labels[1:], interleaved_labels[:-1]))
-
-            # 更新最优结果（查找最小相邻次数和最大分组大小）
-            if adjacent_count <= min_adjacent_count:
-                min_adjacent_count = adjacent_count
-                best_result = interleaved
-                best_quality = max_num / max_num_range * 100
-
-    return best_result, min_adjacent_count, best_quality
-
-
-def mp3_random(input_path: str, output_path: str, result_txt: str, logger: logging.Logger, process_inner_list: list,
-               label_flag: bool = False, name_flag: bool = False, remove_flag: bool = False):
+def _place_file(src: str, dst: str, link_mode: str):
+    """
+    按输出方式将源文件放置到目标位置
+
+    :param src: 源文件
+    :param dst: 目标文件
+    :param link_mode: 输出方式：'copy' 复制，'hardlink' 硬链接，'reflink' 写时复制，'symlink' 符号链接
+    """
+    if link_mode == 'hardlink':
+        link(src, dst)
+    elif link_mode == 'reflink':
+        _reflink(src, dst)
+    elif link_mode == 'symlink':
+        symlink(path.abspath(src), dst)
+    else:
+        copy(src, dst)
+
+
+def mp3_random(input_path: str, output_path: str, result_txt: str, logger: logging.Logger, process_inner_list=None,
+               label_flag: bool = False, name_flag: bool = False, remove_flag: bool = False, link_mode: str = 'copy', *,
+               constraints: list[Constraint] = None, time_budget: float = 1.0, exclude: set[str] = None,
+               report_formats: tuple = ('txt',), jobs: int = None, seed: int = None, replay: bool = False,
+               cancel_token: CancelToken = None):
     """
     进行随机排列，并将结果保存至文件夹，生成结果统计txt文件
 
@@ -91,18 +145,54 @@ def mp3_random(input_path: str, output_path: str, result_txt: str, logger: loggi
     :param output_path: 输出文件夹（随机排列后的音乐文件保存路径）
     :param result_txt: 结果统计txt文件
     :param logger: 日志对象
-    :param process_inner_list: 进度条控件列表
+    :param process_inner_list: 进度条控件列表或进度回调函数（见 utils.update_progress），默认为 None（不显示进度）
     :param label_flag: 是否将标签添加到随机后文件名，若标签和原文件名都添加，则标签在前
     :param name_flag: 是否将原文件名添加到随机后文件名，若标签和原文件名都添加，则标签在前
-    :param remove_flag: 是否删除原文件夹，默认为False
+    :param remove_flag: 是否删除原文件夹，默认为False；输出方式为符号链接或播放列表时不删除
+    :param link_mode: 输出方式，默认为 'copy'（复制）；'hardlink' 硬链接（同一文件系统内）、'reflink' 写时复制（Btrfs、XFS 等）、
+                      'symlink' 符号链接、'playlist' 仅生成 M3U8 播放列表（playlist.m3u8）不输出文件；
+                      硬链接、写时复制、符号链接失败时自动改为复制
+    :param constraints: 约束列表（见 scheduler.Constraint），默认为 None（仅保证相同标签尽量不相邻）；
+                        设置时以标签不相邻的排列为初始排列，在 time_budget 秒内按约束继续优化
+    :param time_budget: 按约束优化的时间（秒），默认为 1 秒
+    :param exclude: 不参与排列的文件名集合（如 dedup.redundant_files 得到的重复文件），默认为 None
+    :param report_formats: 结果统计文件的格式（见 report.REPORT_FORMATS），默认只生成文本格式；'jsonl'、'csv' 格式
+                           保存在 result_txt 旁（替换后缀名），每行一首，供其他程序读取排列顺序
+    :param jobs: 并行读取音乐信息的线程数，默认为 CPU 核心数 + 4（最多 32），见 metadata.probe_music
+    :param seed: 随机种子，相同的文件和种子得到相同的排列（按约束优化受 time_budget 限制，结果可能不同），
+                 记录在结果统计文件中；默认为 None（随机生成）
+    :param replay: 是否按上次的结果统计文件（result_txt，需包含文本格式）中的排序结果重新生成，不重新排列和按约束优化；
+                   已不存在的文件跳过，上次未参与排列的文件不输出
+    :param cancel_token: 取消标志，每输出一个文件前检查，取消时已输出的文件保留，结果统计txt文件中为完整的排序结果
     """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f'不支持的输出方式：{link_mode}')
+    for report_format in report_formats:
+        if report_format not in REPORT_FORMATS:
+            raise ValueError(f'不支持的结果文件格式：{report_format}')
+    if remove_flag and link_mode in ('symlink', 'playlist'):
+        logger.warning(f'输出方式为 {link_mode} 时需保留原文件，不删除原文件')
+        remove_flag = False
     logger.info('开始随机排列')
+    if replay:  # 读取上次的排序结果（在生成新的结果统计文件之前）
+        try:
+            seed, order = read_report(result_txt)
+        except FileNotFoundError:
+            logger.error(f'结果统计文件 {result_txt} 未找到，无法按上次的结果重新生成')
+            return
+        except (UnicodeDecodeError, ValueError, IndexError) as e:  # 文件已损坏或被手动修改
+            logger.error(f'结果统计文件 {result_txt} 格式错误，无法按上次的结果重新生成：{e}')
+            return
+    elif seed is None:
+        seed = getrandbits(32)
     # 读取音乐文件列表
     try:
-        music_files = listdir(input_path)
+        music_files = list_music(input_path)
     except FileNotFoundError:
         logger.error(f'音乐文件夹 {input_path} 未找到')
         return
+    if exclude:
+        music_files = [file for file in music_files if file not in exclude]
     count = len(music_files)
     if music_files:  # 如果文件列表不为空
         # 如果随机文件保存目录存在则删除该目录
@@ -111,44 +201,78 @@ def mp3_random(input_path: str, output_path: str, result_txt: str, logger: loggi
             logger.info(f'删除已存在的随机文件保存目录：{output_path}')
         # 重新创建随机文件保存目录
         create_path(output_path)
-        # 进行随机排列
-        random_result, random_same, random_quality = _get_random(music_files, process_inner_list)
+        # 并行读取原文件的标签、名称和时长（优先使用缓存）进行分类统计，无法读取的文件不参与排列
+        music_files = sorted(music_files)  # 按文件名排序，使相同的种子不受文件系统返回顺序的影响（也用于按约束优化）
+        music_files, infos, errors = probe_music(input_path, music_files, jobs)
+        for file, e in errors.items():
+            logger.error(f'随机排列跳过：{file}，无法读取音乐信息：{e}')
+        constraint_cost = None
+        if replay:  # 按上次的排序结果，只保留仍存在的文件
+            present = set(music_files)
+            random_result = [file for file in order if file in present]
+            if len(random_result) < len(order):
+                logger.warning(f'上次排序结果中的 {len(order) - len(random_result)} 个文件已不存在，跳过')
+            ordered = set(random_result)
+            if len(ordered) < len(music_files):
+                logger.warning(f'{len(music_files) - len(ordered)} 个文件未参与上次的排列，不输出')
+                kept = [(file, info) for file, info in zip(music_files, infos) if file in ordered]
+                music_files, infos = [file for file, _ in kept], [info for _, info in kept]
+            logger.info(f'按上次的排序结果重新生成（随机种子：{seed}）')
+        else:
+            logger.info(f'随机种子：{seed}')
+            rng = Random(seed)
+            # 进行随机排列
+            random_result, random_same, random_quality = _get_random(music_files, process_inner_list, rng=rng)
+            if constraints:  # 按约束继续优化
+                random_result, constraint_cost = schedule(music_files, constraints, [info.length for info in infos],
+                                                          time_budget, initial=random_result, rng=rng)
+                logger.info(f'按约束排列完成，剩余代价：{constraint_cost:g}')
+        count = len(music_files)
+        labels = [info.label for info in infos]
+        labels_dict = dict(zip(music_files, labels))
+        if replay or constraints:  # 重新统计相邻次数和随机质量
+            random_same = sum(labels_dict[a] == labels_dict[b] for a, b in zip(random_result, random_result[1:]))
+            random_quality = (1 - random_same / (count - 1)) * 100 if count > 1 else 100.0
         # 创建符合文件数量的相应数字符串型列表
         new_ids = ["{:0{}d}".format(i, len(str(count))) for i in range(1, count + 1)]
 
-        # 获取原文件标签进行分类统计
-        labels = [match('[\[【［](.*)[]】］].*', name).group(1)
-                  if match('[\[【［](.*)[]】］].*', name) else '无标签' for name in music_files]
-        labels_dict = {name: label for name, label in zip(music_files, labels)}
-        names = [match('.*[\[【［].*[]】］](.*)', name).group(1)
-                 if match('.*[\[【［].*[]】］](.*)', name) else name for name in music_files]
-        names_dict = {name: path.splitext(n)[0] for name, n in zip(music_files, names)}
-        # 获取每个标签的文件位置索引
-        labels_index = {ll: [i for i, l in enumerate(labels) if l == ll] for ll in set(labels)}
-        # 对每个标签进行计数，并按照数量降序排列
-        labels_num = {ll: len(l) for ll, l in labels_index.items()}
-        labels_num = sorted(zip(labels_num.values(), labels_num.keys()), reverse=True)
+        names_dict = {name: info.name for name, info in zip(music_files, infos)}
         # 获取原文件的时间列表
-        time_list = [MP3(input_path + sep + file).info.length for file in music_files]
-        # 获取分组时间列表，并将其格式化为总时长、平均时长
-        time_group = {ll: time_list_from([time_list[t] for t in i]) for ll, i in labels_index.items()}
+        time_list = [info.length for info in infos]
+        # 按标签分类统计个数（降序排列）、总时长和平均时长
+        labels_num, time_group = _label_stats(labels, time_list)
         # 计算全部文件的总时长和平均时长
         time_all = time_list_from(time_list)
-        # 将分类统计结果和排序结果放在txt文件中
-        with open(result_txt, 'w') as txt:
-            txt.write('【分类统计】\n标签：个数 - 总时长 - 平均时长\n')
-            txt.write('总计：{} - {} - {}\n'.format(len(music_files), time_all[0], time_all[1]))
-            for num, key in labels_num:
-                txt.write('{}：{} - {} - {}\n'.format(key, num, time_group[key][0], time_group[key][1]))
-            txt.write('【排序结果】\n')
-            txt.write('  相邻次数：{}\n'.format(random_same))
-            txt.write('  随机质量：{:.1f}%\n'.format(random_quality))
-            for i in range(len(random_result)):
-                txt.write(new_ids[i] + ' ' + random_result[i] + '\n')
-        logger.info(f'生成结果统计文件：{result_txt}')
+        lengths_dict = {name: info.length for name, info in zip(music_files, infos)}
+        # 将分类统计结果和排序结果逐行写入结果统计文件
+        with ReportWriter(result_txt, report_formats) as report:
+            report.write_summary(count, time_all, labels_num, time_group, random_same, random_quality, constraint_cost,
+                                 seed)
+            for new_id, old_name in zip(new_ids, random_result):
+                report.write_track(new_id, old_name, labels_dict[old_name], lengths_dict[old_name])
+        logger.info(f'生成结果统计文件：{"、".join(report.paths.values())}')
+
+        # 仅生成播放列表，不输出文件
+        if link_mode == 'playlist':
+            playlist = path.join(output_path, 'playlist.m3u8')
+            with open(playlist, 'w', encoding='utf-8') as m3u:
+                m3u.write('#EXTM3U\n')
+                for old_name in random_result:
+                    m3u.write(f'#EXTINF:{round(lengths_dict[old_name])},{path.splitext(old_name)[0]}\n')
+                    m3u.write(path.abspath(input_path + sep + old_name) + '\n')
+            logger.info(f'生成播放列表：{playlist}')
+            logger.info('随机排列完成')
+            return
 
         # 遍历新旧文件名称列表，进行随机排列
-        for old_name, new_id in zip(random_result, new_ids):
+        for i, (old_name, new_id) in enumerate(zip(random_result, new_ids)):
+            try:
+                if cancel_token is not None:
+                    cancel_token.check()  # 暂停时等待
+            except Cancelled:
+                logger.warning(f'随机排列已取消：完成 {i} / {count} 个文件')
+                raise
+            update_progress(process_inner_list, i + 1, count, old_name, new_id)
             old_file_name = input_path + sep + old_name
             # 获取新文件名
             new_file_name = output_path + sep + new_id
@@ -157,7 +281,12 @@ def mp3_random(input_path: str, output_path: str, result_txt: str, logger: loggi
             if name_flag:
                 new_file_name += f'{names_dict[old_name]}'
             new_file_name += '.mp3'
-            copy(old_file_name, new_file_name)
+            try:
+                _place_file(old_file_name, new_file_name, link_mode)
+            except OSError as e:  # 不支持该输出方式（如跨文件系统硬链接）时，改为复制，并不再尝试
+                logger.warning(f'无法以 {link_mode} 方式输出（{e}），改为复制文件')
+                link_mode = 'copy'
+                copy(old_file_name, new_file_name)
             logger.info(f'随机排列：{old_file_name} -> {new_file_name}')
             if remove_flag:
                 remove(old_file_name)
@@ -165,11 +294,8 @@ def mp3_random(input_path: str, output_path: str, result_txt: str, logger: loggi
 
         logger.info('随机排列完成')
     else:  # 如果文件列表为空
-        time_zero = time_list_from([])
-        with open(result_txt, 'w') as txt:
-            txt.write('【分类统计】\n标签：个数 - 总时长 - 平均时长\n')
-            txt.write('总计：{} - {} - {}\n'.format(0, time_zero[0], time_zero[1]))
-            txt.write('【排序结果】\n  相邻次数：-\n  随机质量：-%\n')
+        with ReportWriter(result_txt, report_formats) as report:
+            report.write_summary(0, time_list_from([]), [], {})
         logger.warning('音乐文件夹为空，未进行随机排列')
 
 
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+随机排列的结果文件：边生成边写入，支持文本、JSON Lines、CSV 格式，写入临时文件后再替换（中途出错时不留下不完整的文件）
+
+- REPORT_FORMATS: 支持的结果文件格式
+- report_path: 各格式结果文件的路径
+- ReportWriter: 结果文件写入器（上下文管理器），可同时写入多种格式
+- read_report: 读取文本格式结果文件中的随机种子和排序结果（用于按上次的结果重新生成）
+"""
+import csv
+import json
+from os import path, replace, remove
+
+# 结果文件格式：'txt' 分类统计和排序结果（供阅读），'jsonl'、'csv' 每行一首（序号、原文件名、标签、时长、开始时间，供其他程序读取）
+REPORT_FORMATS = ('txt', 'jsonl', 'csv')
+_FIELDS = ('index', 'id', 'name', 'label', 'duration', 'start')  # JSON Lines、CSV 的字段
+_SEED_PREFIX = '  随机种子：'
+
+
+def report_path(result_file: str, report_format: str) -> str:
+    """
+    各格式结果文件的路径：文本格式为 result_file 本身（其后缀名为 .jsonl 或 .csv 时改为 .txt），其他格式替换后缀名
+
+    :param result_file: 结果文件，如 'result.txt'
+    :param report_format: 结果文件格式，见 REPORT_FORMATS
+    :return: 结果文件的路径，如 'result.csv'
+    """
+    root, ext = path.splitext(result_file)
+    ext = ext.lower()
+    if ext == f'.{report_format}' or (report_format == 'txt' and ext[1:] not in REPORT_FORMATS):
+        return result_file
+    return f'{root}.{report_format}'
+
+
+class ReportWriter:
+    """
+    结果文件写入器，用法：
+
+    with ReportWriter('result.txt', ('txt', 'csv')) as report:
+        report.write_summary(...)
+        for ...:
+            report.write_track(...)
+
+    各格式均以 UTF-8 编码写入“<结果文件>.tmp”，正常退出时替换为结果文件，出错时删除临时文件
+    """
+
+    def __init__(self, result_file: str, report_formats: tuple = ('txt',)):
+        """
+        :param result_file: 结果文件（文本格式的路径，其他格式见 report_path）
+        :param report_formats: 写入的格式，见 REPORT_FORMATS，默认只写入文本格式
+        :raises ValueError: 格式不支持时
+        """
+        for report_format in report_formats:
+            if report_format not in REPORT_FORMATS:
+                raise ValueError(f'不支持的结果文件格式：{report_format}')
+        self.paths = {report_format: report_path(result_file, report_format) for report_format in report_formats}
+        self._files = {}
+        self._csv = None
+        self._start = 0.0  # 下一首的开始时间（之前各首时长之和）
+        self._count = 0
+
+    def __enter__(self):
+        try:
+            for report_format, file_path in self.paths.items():
+                if report_format == 'csv':  # 换行由 csv 模块处理，带 BOM 以便 Excel 识别编码
+                    self._files[report_format] = open(file_path + '.tmp', 'w', newline='', encoding='utf-8-sig')
+                else:
+                    self._files[report_format] = open(file_path + '.tmp', 'w', encoding='utf-8')
+        except BaseException:
+            self._close(False)
+            raise
+        if 'csv' in self._files:
+            self._csv = csv.writer(self._files['csv'])
+            self._csv.writerow(_FIELDS)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._close(exc_type is None)
+        return False
+
+    def _close(self, commit: bool):
+        """关闭各临时文件，commit 为真时替换为结果文件，否则删除临时文件"""
+        for report_format, file in self._files.items():
+            file.close()
+            temp_file = self.paths[report_format] + '.tmp'
+            if commit:
+                replace(temp_file, self.paths[report_format])
+            else:
+                try:
+                    remove(temp_file)
+                except OSError:
+                    pass
+        self._files.clear()
+
+    def write_summary(self, count: int, time_all: (str, str), labels_num: list[tuple[int, str]],
+                      time_group: dict[str, tuple[str, str]], random_same: int = None, random_quality: float = None,
+                      constraint_cost: float = None, seed: int = None):
+        """
+        写入分类统计和排序结果的统计部分（仅文本格式），应在 write_track 之前调用
+
+        :param count: 文件数
+        :param time_all: 全部文件的 (总时长, 平均时长)
+        :param labels_num: 按个数降序排列的 (个数, 标签) 列表
+        :param time_group: {标签: (总时长, 平均时长)}
+        :param random_same: 相邻次数，为 None 时（未进行随机排列）写入“-”
+        :param random_quality: 随机质量（百分比）
+        :param constraint_cost: 约束代价，为 None 时（未按约束排列）不写入
+        :param seed: 随机种子，为 None 时不写入
+        """
+        txt = self._files.get('txt')
+        if txt is None:
+            return
+        txt.write('【分类统计】\n标签：个数 - 总时长 - 平均时长\n')
+        txt.write('总计：{} - {} - {}\n'.format(count, time_all[0], time_all[1]))
+        for num, key in labels_num:
+            txt.write('{}：{} - {} - {}\n'.format(key, num, time_group[key][0], time_group[key][1]))
+        txt.write('【排序结果】\n')
+        if random_same is None:
+            txt.write('  相邻次数：-\n  随机质量：-%\n')
+        else:
+            txt.write('  相邻次数：{}\n'.format(random_same))
+            txt.write('  随机质量：{:.1f}%\n'.format(random_quality))
+        if constraint_cost is not None:
+            txt.write('  约束代价：{:g}\n'.format(constraint_cost))
+        if seed is not None:
+            txt.write(f'{_SEED_PREFIX}{seed}\n')
+
+    def write_track(self, new_id: str, name: str, label: str, duration: float):
+        """
+        写入排序结果中的一首（按排列顺序依次调用），开始时间为之前各首时长之和
+
+        :param new_id: 随机排列后的编号，如 '001'
+        :param name: 原文件名
+        :param label: 标签
+        :param duration: 时长（秒）
+        """
+        self._count += 1
+        start, self._start = self._start, self._start + max(duration, 0.0)
+        if 'txt' in self._files:
+            self._files['txt'].write(new_id + ' ' + name + '\n')
+        row = (self._count, new_id, name, label, round(duration, 3), round(start, 3))
+        if 'jsonl' in self._files:
+            self._files['jsonl'].write(json.dumps(dict(zip(_FIELDS, row)), ensure_ascii=False) + '\n')
+        if self._csv is not None:
+            self._csv.writerow(row)
+
+
+def read_report(result_file: str) -> (int, list[str]):
+    """
+    读取文本格式结果文件（见 ReportWriter）中的随机种子和排序结果
+
+    :param result_file: 结果文件（文本格式的路径见 report_path）
+    :return: (随机种子，未记录时为 None, 按排列顺序的原文件名列表)
+    :raises FileNotFoundError: 结果文件不存在时
+    :raises UnicodeDecodeError, ValueError, IndexError: 结果文件已损坏或格式错误时
+    """
+    seed, order = None, []
+    in_result = False
+    with open(report_path(result_file, 'txt'), 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line == '【排序结果】':
+                in_result = True
+            elif not in_result:
+                continue
+            elif line.startswith(_SEED_PREFIX):
+                seed = int(line[len(_SEED_PREFIX):])
+            elif line and not line.startswith('  '):  # 排序结果每行为“编号 原文件名”
+                order.append(line.split(' ', 1)[1])
+    return seed, order
+
+
+if __name__ == '__main__':
+    print('report')
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+基于 asyncio 的外部程序（ffmpeg.exe、mp3gain.exe）运行器
+
+以参数列表启动子进程（不经过命令行，无需为文件名加引号），边运行边读取标准错误并解析 ffmpeg 的“time=”进度，
+只保留最后若干行用于错误信息；每个任务可设置超时时间，超时时终止子进程；同时运行的子进程数由信号量限制
+
+- parse_time: 解析 ffmpeg 输出中的“HH:MM:SS.xx”格式时间
+- run_tool: 运行单个外部程序（协程），返回运行结果
+- run_batch: 并行运行多个外部程序，按完成顺序逐个返回结果（生成器）
+"""
+import asyncio
+import re
+from collections import deque
+from os import cpu_count
+from queue import Queue
+from subprocess import CompletedProcess, DEVNULL, PIPE
+from threading import Thread
+from typing import Callable, Iterator
+
+from tools import CREATION_FLAGS
+from utils import Cancelled, CancelToken
+
+_TIME_PATTERN = re.compile(r'time=\s*(-?\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+_DURATION_PATTERN = re.compile(r'Duration:\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+_TAIL_LINES = 20  # 保留的标准错误行数
+
+
+def parse_time(line: str, pattern: re.Pattern = _TIME_PATTERN) -> float:
+    """
+    解析 ffmpeg 输出中的时间，如“size=  512kB time=00:01:02.50 bitrate=...”中的 62.5 秒
+
+    :param line: ffmpeg 输出的一行
+    :param pattern: 时间的正则表达式，默认为“time=”进度，也可为“Duration:”总时长
+    :return: 时间（秒），未找到时为 None
+    """
+    match = pattern.search(line)
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+class _Killer:
+    """由其他线程（如取消标志）终止事件循环中的子进程"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, process: asyncio.subprocess.Process):
+        self.loop = loop
+        self.process = process
+
+    def kill(self):
+        self.loop.call_soon_threadsafe(self._kill)
+
+    def _kill(self):
+        try:
+            self.process.kill()
+        except ProcessLookupError:  # 子进程已结束
+            pass
+
+
+async def _wait_resume(cancel_token: CancelToken):
+    """暂停时等待（不阻塞事件循环），已取消时抛出 Cancelled"""
+    while cancel_token.paused:
+        await asyncio.sleep(0.1)
+    if cancel_token.cancelled:
+        raise Cancelled()
+
+
+async def run_tool(args: list[str], timeout: float = None, duration: float = None,
+                   on_progress: Callable[[float], None] = None, cancel_token: CancelToken = None) -> CompletedProcess:
+    """
+    运行单个外部程序，逐行读取标准错误（ffmpeg 的进度行以“\\r”结尾）并解析进度
+
+    :param args: 参数列表，第一项为程序路径
+    :param timeout: 超时时间（秒），默认为 None（不限制）
+    :param duration: 输出的总时长（秒），用于计算进度，默认从 ffmpeg 输出的“Duration:”读取
+    :param on_progress: 进度回调函数 callback(已完成比例)，比例在 0~1 之间，启动时为 0，默认为 None
+    :param cancel_token: 取消标志，暂停时等待后再启动，取消时终止子进程
+    :return: 运行结果，stderr 为标准错误的最后 20 行
+    :raises FileNotFoundError: 程序未找到时
+    :raises TimeoutError: 超时时（子进程已被终止）
+    :raises Cancelled: 运行前或运行期间被取消时
+    """
+    if cancel_token is not None:
+        await _wait_resume(cancel_token)
+    process = await asyncio.create_subprocess_exec(*args, stdin=DEVNULL, stdout=DEVNULL, stderr=PIPE,
+                                                   creationflags=CREATION_FLAGS)
+    if on_progress is not None:
+        on_progress(0.0)  # 已启动
+    tail = deque(maxlen=_TAIL_LINES)
+
+    async def read_stderr():
+        nonlocal duration
+        buffer = ''
+        while chunk := await process.stderr.read(4096):
+            buffer += chunk.decode('utf-8', errors='replace')
+            *lines, buffer = re.split(r'[\r\n]', buffer)
+            for line in lines:
+                if not line.strip():
+                    continue
+                tail.append(line)
+                if duration is None:
+                    duration = parse_time(line, _DURATION_PATTERN)
+                if on_progress is not None and duration:
+                    seconds = parse_time(line)
+                    if seconds is not None:
+                        on_progress(min(1.0, max(0.0, seconds / duration)))
+        if buffer.strip():
+            tail.append(buffer)
+        await process.wait()
+
+    killer = _Killer(asyncio.get_running_loop(), process)
+    if cancel_token is not None:
+        cancel_token.track(killer)
+    try:
+        await asyncio.wait_for(read_stderr(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        killer._kill()
+        await process.wait()
+        if isinstance(e, asyncio.TimeoutError):
+            raise TimeoutError(f'运行超时（{timeout} 秒）：{args[0]}') from None
+        raise
+    finally:
+        if cancel_token is not None:
+            cancel_token.untrack(killer)
+    if cancel_token is not None and cancel_token.cancelled:
+        raise Cancelled()
+    return CompletedProcess(args, process.returncode, None, '\n'.join(tail))
+
+
+def run_batch(commands: list[list[str]], jobs: int = None, timeout: float = None, durations: list[float] = None,
+              on_progress: Callable[[int, float], None] = None,
+              cancel_token: CancelToken = None) -> Iterator[tuple[int, object]]:
+    """
+    并行运行多个外部程序（事件循环在后台线程中运行），按完成顺序逐个返回结果
+
+    单个任务失败（程序未找到、超时、返回值非 0）不影响其他任务；停止迭代（如 break 或抛出异常）时
+    终止正在运行的子进程，尚未开始的任务不再运行
+
+    :param commands: 参数列表的列表
+    :param jobs: 同时运行的子进程数，默认为 CPU 核心数
+    :param timeout: 每个任务的超时时间（秒），默认为 None（不限制）
+    :param durations: 每个任务输出的总时长（秒），用于计算进度，默认从 ffmpeg 输出中读取
+    :param on_progress: 进度回调函数 callback(任务序号, 已完成比例)，在后台线程中调用，默认为 None
+    :param cancel_token: 取消标志，暂停时不再启动新的任务，取消时终止所有子进程
+    :return: (任务序号, 运行结果) 生成器，运行结果为 CompletedProcess，或 FileNotFoundError、TimeoutError、
+             Cancelled 等异常对象
+    """
+    results = Queue()
+    loop = asyncio.new_event_loop()
+    tasks = []
+    stopped = []  # 停止迭代后不为空（仅在事件循环中读写）
+
+    async def one(index: int, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            if stopped:
+                return
+            progress = None if on_progress is None else (lambda fraction: on_progress(index, fraction))
+            duration = durations[index] if durations is not None else None
+            try:
+                result = await run_tool(commands[index], timeout, duration, progress, cancel_token)
+            except Exception as e:  # 交由调用方处理，TimeoutError 为 OSError 的子类
+                result = e
+            results.put((index, result))
+
+    async def main():
+        semaphore = asyncio.Semaphore(jobs or cpu_count() or 1)
+        if not stopped:
+            tasks.extend(asyncio.create_task(one(i, semaphore)) for i in range(len(commands)))
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop():
+        stopped.append(True)
+        for task in tasks:
+            task.cancel()
+
+    thread = Thread(target=loop.run_until_complete, args=(main(),), name='runner', daemon=True)
+    thread.start()
+    try:
+        for _ in range(len(commands)):
+            index, result = results.get()
+            if isinstance(result, Exception) and not isinstance(result, (OSError, Cancelled)):
+                raise result  # 意外的错误（如进度回调函数出错）
+            yield index, result
+    finally:
+        if thread.is_alive():
+            loop.call_soon_threadsafe(stop)
+        thread.join()
+        loop.close()
+
+
+if __name__ == '__main__':
+    print('runner')
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+扫描音乐文件夹
+
+使用 os.scandir 逐个读取目录项，文件类型和文件状态来自目录项本身（Windows 上无需额外的 stat 调用），
+按后缀名（可选按文件头）过滤掉子文件夹和非音乐文件，避免为其启动 ffmpeg.exe 或 mp3gain.exe
+
+- AUDIO_EXTENSIONS: 可处理的音乐文件后缀名
+- MP3_EXTENSIONS: MP3 文件后缀名
+- MusicEntry: 扫描得到的音乐文件（名称、完整路径、大小、修改时间）
+- is_audio: 按文件头判断是否为音乐文件
+- scan_music: 逐个返回文件夹中的音乐文件（生成器），可递归扫描子文件夹
+- list_music: 获取文件夹中的音乐文件名列表
+"""
+from os import scandir, sep, path
+from typing import NamedTuple, Iterator
+
+AUDIO_EXTENSIONS = frozenset(('.mp3', '.mp2', '.wav', '.flac', '.ape', '.wv', '.m4a', '.mp4', '.aac', '.alac', '.ogg',
+                              '.oga', '.opus', '.wma', '.aif', '.aiff', '.ac3', '.amr', '.mka', '.webm'))
+MP3_EXTENSIONS = frozenset(('.mp3',))
+# 文件头标识：ID3 标签、WAV、FLAC、Ogg、APE、AIFF、WavPack、WMA（ASF）、Matroska/WebM
+_MAGIC = (b'ID3', b'RIFF', b'fLaC', b'OggS', b'MAC ', b'FORM', b'wvpk', b'\x30\x26\xb2\x75', b'\x1a\x45\xdf\xa3')
+
+
+class MusicEntry(NamedTuple):
+    """扫描得到的音乐文件"""
+    name: str  # 相对于扫描文件夹的路径（不递归时即文件名）
+    path: str  # 完整路径
+    size: int  # 文件大小（字节）
+    mtime_ns: int  # 修改时间（纳秒）
+
+    @property
+    def fingerprint(self) -> list[int]:
+        """文件指纹，与 manifest.fingerprint 一致"""
+        return [self.size, self.mtime_ns]
+
+
+def is_audio(file_path: str) -> bool:
+    """
+    按文件头判断是否为音乐文件（MP3 帧同步字、ID3 标签、WAV、FLAC、Ogg、MP4/M4A 等）
+
+    :param file_path: 文件的完整路径
+    :return: 是否为音乐文件，无法读取时返回 False
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(12)
+    except OSError:
+        return False
+    if head.startswith(_MAGIC) or head[4:8] == b'ftyp':
+        return True
+    return len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0  # MPEG 音频帧同步字
+
+
+def scan_music(input_path: str, extensions=AUDIO_EXTENSIONS, recursive: bool = False, check_magic: bool = False,
+               prefix: str = '') -> Iterator[MusicEntry]:
+    """
+    逐个返回文件夹中的音乐文件（生成器），跳过子文件夹、隐藏文件（以“.”开头）和后缀名不符的文件
+
+    :param input_path: 音乐文件夹
+    :param extensions: 音乐文件后缀名（小写，包括“.”），默认为 AUDIO_EXTENSIONS，为 None 时不按后缀名过滤
+    :param recursive: 是否递归扫描子文件夹，默认为 False
+    :param check_magic: 是否同时按文件头过滤（需读取每个文件的前 12 字节），默认为 False
+    :param prefix: 名称前缀（递归扫描时为子文件夹的相对路径）
+    :return: 音乐文件生成器
+    :raises FileNotFoundError: 音乐文件夹不存在时
+    """
+    with scandir(input_path) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                if recursive:
+                    yield from scan_music(entry.path, extensions, recursive, check_magic, prefix + entry.name + sep)
+                continue
+            if not entry.is_file():
+                continue
+            if extensions is not None and path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            if check_magic and not is_audio(entry.path):
+                continue
+            st = entry.stat()
+            yield MusicEntry(prefix + entry.name, entry.path, st.st_size, st.st_mtime_ns)
+
+
+def list_music(input_path: str, extensions=AUDIO_EXTENSIONS) -> list[str]:
+    """
+    获取文件夹中的音乐文件名列表（不递归）
+
+    :param input_path: 音乐文件夹
+    :param extensions: 音乐文件后缀名，见 scan_music
+    :return: 音乐文件名列表
+    :raises FileNotFoundError: 音乐文件夹不存在时
+    """
+    return [entry.name for entry in scan_music(input_path, extensions)]
+
+
+if __name__ == '__main__':
+    print('scanner')
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+多约束排列（标签间隔、艺术家间隔、时长均衡），使用模拟退火在给定时间内求解
+
+每次随机交换两个位置，只重新计算受影响位置附近的代价（增量计算），
+间隔约束为 O(间隔)，时长均衡约束为 O(1)，与文件数无关
+
+- Constraint: 带权重的约束
+- parse_constraint: 由“类型:参数[:权重]”格式的文本得到约束
+- get_artist: 由文件名得到艺术家（“艺术家 - 标题”格式）
+- schedule: 按约束排列音乐文件，返回排列结果和剩余代价
+"""
+from collections import Counter
+from math import exp, ceil
+from random import Random
+from time import monotonic
+from typing import NamedTuple
+
+from tokenizer import parse_name
+
+CONSTRAINT_KINDS = ('label', 'artist', 'duration')  # 约束类型：标签间隔、艺术家间隔、时长均衡
+
+
+class Constraint(NamedTuple):
+    """
+    带权重的约束
+
+    - 'label': 相同标签之间至少间隔 size 首（size 为 1 时即相同标签不相邻）
+    - 'artist': 相同艺术家之间至少间隔 size 首
+    - 'duration': 将排列按 size 秒（如 3600 为 1 小时）分为若干时间段，使各时间段的总时长尽量接近
+    """
+    kind: str  # 约束类型，见 CONSTRAINT_KINDS
+    size: float = 1  # 间隔首数或时间段长度（秒）
+    weight: float = 1.0  # 权重，代价 = 权重 × 违反次数（时长均衡为偏差的平均时长倍数）
+
+
+def parse_constraint(text: str) -> Constraint:
+    """
+    由“类型:参数[:权重]”格式的文本得到约束，如“label:2”、“artist:5:2”、“duration:3600:0.5”
+
+    :param text: 约束文本
+    :return: 约束
+    :raises ValueError: 格式错误或类型不支持时
+    """
+    parts = text.split(':')
+    if len(parts) not in (2, 3) or parts[0] not in CONSTRAINT_KINDS:
+        raise ValueError(f'无法识别的约束：{text}，格式为“类型:参数[:权重]”，类型为 {"、".join(CONSTRAINT_KINDS)}')
+    constraint = Constraint(parts[0], float(parts[1]), float(parts[2]) if len(parts) == 3 else 1.0)
+    if constraint.size <= 0 or constraint.weight < 0:
+        raise ValueError(f'约束的参数需大于0、权重不能为负数：{text}')
+    return constraint
+
+
+def get_artist(file: str) -> str:
+    """
+    由文件名得到艺术家，文件名（去除标签后）为“艺术家 - 标题”格式
+
+    :param file: 文件名
+    :return: 艺术家，无法识别时为 None
+    """
+    name = parse_name(file).name
+    t = name.find(' - ')
+    return (name[:t].strip() or None) if t > 0 else None
+
+
+def _key_ids(keys: list) -> list[int]:
+    """
+    将键转换为整数编号，None 转换为互不相同的负数（不与任何文件冲突）
+
+    :param keys: 键列表
+    :return: 整数编号列表
+    """
+    ids = {}
+    return [-i - 1 if key is None else ids.setdefault(key, len(ids)) for i, key in enumerate(keys)]
+
+
+class _Spacing:
+    """间隔约束：相同键的两个文件位置之差不大于 distance 时计一次违反"""
+
+    def __init__(self, keys: list[int], distance: int, weight: float):
+        self.keys = keys
+        self.distance = distance
+        self.weight = weight
+
+    def lower_bound(self) -> float:
+        """
+        代价的下限：某个键有 c 个文件时，相邻两个之间至少需要 distance 个其他文件，
+        其余 n - c 个文件最多满足 (n - c) // distance 个间隔，因此至少违反 c - 1 - (n - c) // distance 次
+        （distance 为 1 时即 max(0, 2 * 最多标签数 - 文件数 - 1)）
+
+        :return: 代价的下限
+        """
+        n = len(self.keys)
+        return self.weight * sum(max(0, c - 1 - (n - c) // self.distance) for c in Counter(self.keys).values())
+
+    def _local(self, order: list[int], p: int, skip: int) -> int:
+        """位置 p 与附近（不含位置 skip）相同键的文件数"""
+        keys = self.keys
+        key = keys[order[p]]
+        count = 0
+        for q in range(max(0, p - self.distance), min(len(order), p + self.distance + 1)):
+            if q != p and q != skip and keys[order[q]] == key:
+                count += 1
+        return count
+
+    def cost(self, order: list[int]) -> float:
+        keys = self.keys
+        count = 0
+        for p in range(len(order)):
+            key = keys[order[p]]
+            for q in range(p + 1, min(len(order), p + self.distance + 1)):
+                if keys[order[q]] == key:
+                    count += 1
+        return self.weight * count
+
+    def delta(self, order: list[int], i: int, j: int) -> float:
+        # 位置 i、j 之间的一对在交换前后不变，因此计算时互相排除
+        before = self._local(order, i, j) + self._local(order, j, i)
+        order[i], order[j] = order[j], order[i]
+        after = self._local(order, i, j) + self._local(order, j, i)
+        order[i], order[j] = order[j], order[i]
+        return self.weight * (after - before)
+
+    def swap(self, order: list[int], i: int, j: int):
+        pass
+
+
+class _Balance:
+    """
+    时长均衡约束：按平均时长将排列分为每段 k 首的时间段（k ≈ 时间段长度 / 平均时长），
+    代价为各时间段总时长与目标（平均时长 × 段内首数）之差的绝对值之和（以平均时长为单位）
+    """
+
+    def __init__(self, lengths: list[float], block: float, weight: float):
+        self.lengths = lengths
+        self.mean = sum(lengths) / len(lengths) or 1.0
+        self.k = max(1, round(block / self.mean))
+        self.weight = weight
+        self.sums = []
+
+    def lower_bound(self) -> float:
+        return 0.0
+
+    def reset(self, order: list[int]):
+        k = self.k
+        self.sums = [sum(self.lengths[f] for f in order[b * k:(b + 1) * k]) for b in range(ceil(len(order) / k))]
+
+    def _block_cost(self, b: int, total: float) -> float:
+        size = min(self.k, len(self.lengths) - b * self.k)
+        return abs(total - self.mean * size) / self.mean
+
+    def cost(self, order: list[int]) -> float:
+        self.reset(order)
+        return self.weight * sum(self._block_cost(b, s) for b, s in enumerate(self.sums))
+
+    def delta(self, order: list[int], i: int, j: int) -> float:
+        bi, bj = i // self.k, j // self.k
+        if bi == bj:
+            return 0.0
+        diff = self.lengths[order[j]] - self.lengths[order[i]]
+        si, sj = self.sums[bi], self.sums[bj]
+        before = self._block_cost(bi, si) + self._block_cost(bj, sj)
+        after = self._block_cost(bi, si + diff) + self._block_cost(bj, sj - diff)
+        return self.weight * (after - before)
+
+    def swap(self, order: list[int], i: int, j: int):
+        bi, bj = i // self.k, j // self.k
+        if bi != bj:
+            diff = self.lengths[order[j]] - self.lengths[order[i]]
+            self.sums[bi] += diff
+            self.sums[bj] -= diff
+
+
+def _build(music_files: list[str], constraints: list[Constraint], lengths: list[float] = None) -> list:
+    """
+    将约束转换为可增量计算代价的对象
+
+    :param music_files: 音乐文件列表
+    :param constraints: 约束列表
+    :param lengths: 音乐时长列表（秒），与音乐文件列表一一对应，时长均衡约束需要
+    :return: 约束对象列表
+    :raises ValueError: 约束类型不支持，或缺少时长均衡约束需要的时长时
+    """
+    terms = []
+    for constraint in constraints:
+        if constraint.weight == 0:
+            continue
+        if constraint.kind == 'label':
+            keys = _key_ids([parse_name(file).label for file in music_files])
+            terms.append(_Spacing(keys, int(constraint.size), constraint.weight))
+        elif constraint.kind == 'artist':
+            keys = _key_ids([get_artist(file) for file in music_files])
+            terms.append(_Spacing(keys, int(constraint.size), constraint.weight))
+        elif constraint.kind == 'duration':
+            if lengths is None:
+                raise ValueError('时长均衡约束需要音乐时长')
+            terms.append(_Balance(lengths, constraint.size, constraint.weight))
+        else:
+            raise ValueError(f'不支持的约束类型：{constraint.kind}')
+    return terms
+
+
+def schedule(music_files: list[str], constraints: list[Constraint], lengths: list[float] = None,
+             time_budget: float = 1.0, max_steps: int = None, initial: list[str] = None,
+             clock=monotonic, rng: Random = None) -> (list[str], float):
+    """
+    按约束排列音乐文件：从初始排列开始模拟退火，随时间降低温度，代价达到下限（见 _Spacing.lower_bound）或超出时间、步数时结束
+
+    :param music_files: 音乐文件列表
+    :param constraints: 约束列表
+    :param lengths: 音乐时长列表（秒），与音乐文件列表一一对应，使用时长均衡约束时需要
+    :param time_budget: 求解时间（秒），默认为 1 秒
+    :param max_steps: 最多尝试交换的次数，默认为 None（不限制）
+    :param initial: 初始排列（如 randomization._get_random 的结果），默认为音乐文件列表的顺序
+    :param clock: 计时函数，默认为 time.monotonic
+    :param rng: 随机数生成器，默认为 None（使用新的随机种子）；受 time_budget 限制时，相同种子的结果仍可能因尝试次数不同而不同
+    :return: 找到的代价最小的排列、该排列的代价
+    """
+    count = len(music_files)
+    index = {file: i for i, file in enumerate(music_files)}
+    order = [index[file] for file in initial] if initial is not None else list(range(count))
+    terms = _build(music_files, constraints, lengths)
+    cost = sum(term.cost(order) for term in terms)
+    best, best_cost = order[:], cost
+    bound = sum(term.lower_bound() for term in terms) + 1e-9
+    if count < 2 or best_cost <= bound:  # 初始排列已达到下限（如标签不相邻的排列）时直接返回
+        return [music_files[i] for i in best], best_cost
+
+    if rng is None:
+        rng = Random()
+    # 温度从 t0 按几何级数降至 t1（代价单位约为一次违反）
+    t0, t1 = 2.0, 0.02
+    start = clock()
+    temperature = t0
+    step = 0
+    while best_cost > bound:
+        if step % 256 == 0:  # 每 256 步检查一次时间并更新温度
+            progress = (clock() - start) / time_budget if time_budget else 1.0
+            if max_steps:
+                progress = max(progress, step / max_steps)
+            if progress >= 1:
+                break
+            temperature = t0 * (t1 / t0) ** progress
+        step += 1
+        i = rng.randrange(count)
+        j = rng.randrange(count - 1)
+        if j >= i:
+            j += 1
+        delta = sum(term.delta(order, i, j) for term in terms)
+        if delta <= 0 or rng.random() < exp(-delta / temperature):
+            for term in terms:
+                term.swap(order, i, j)
+            order[i], order[j] = order[j], order[i]
+            cost += delta
+            if cost < best_cost - 1e-9:
+                best, best_cost = order[:], cost
+    # 重新计算代价，避免浮点误差累积
+    best_cost = sum(term.cost(best) for term in terms)
+    return [music_files[i] for i in best], best_cost
+
+
+if __name__ == '__main__':
+    print('scheduler')
@@ -13,4 +13,14 @@ function StartTimer() {
 }
 function StopTimer() {
     clearInterval(timer);
+}
+function UpdateProgress(current, total, oldFile, newFile, speed) {
+    // 一次更新全部进度控件，减少与 Python 之间的调用次数
+    let progress = document.getElementById('progress');
+    progress.max = total;
+    progress.value = current;
+    document.getElementById('progress_value').textContent = Math.floor(current) + "/" + total;
+    document.getElementById('progress_speed').textContent = speed;
+    document.getElementById('process_old_file').textContent = oldFile;
+    document.getElementById('process_new_file').textContent = newFile;
 }
\ No newline at end of file
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+文件名解析（标签、名称、切片时间），供各模块共用，保证解析结果一致
+
+文件名格式为“[标签]名称(起始时间-结束时间).后缀名”，各部分均可省略，括号可为全角
+
+- NameRecord: 文件名解析结果
+- parse_name: 解析文件名（预编译正则表达式，结果缓存，同一文件名只解析一次）
+"""
+from functools import lru_cache
+from os import path
+from re import compile
+from typing import NamedTuple
+
+_label_pattern = compile(r'[\[【［](.*)[]】］].*')  # 文件标签
+_name_pattern = compile(r'.*[\[【［].*[]】］](.*)')  # 标签后的文件名
+_clip_pattern = compile(r'(.*)[(（](-{0,1}?[^-]*?)-(-{0,1}?[^-]*?)[)）](.*)\..*')  # 切片括号前后的名称、起止时间
+_LABEL_OPEN = '[【［'
+_LABEL_CLOSE = ']】］'
+
+
+class NameRecord(NamedTuple):
+    """文件名解析结果"""
+    label: str  # 标签，无标签时为“无标签”
+    name: str  # 标签后的名称（去除后缀名），无标签时为去除后缀名的文件名
+    ext: str  # 后缀名（包括“.”）
+    clip: bool  # 是否含有切片括号“(起始时间-结束时间)”
+    base: str  # 去除切片括号和后缀名后的名称（切片、重命名后的新名称），不含切片括号时为 None
+    start: float  # 切片起始时间（秒），未指定或无法识别时为 None
+    end: float  # 切片结束时间（秒），未指定或无法识别时为 None
+
+
+def _to_float(text: str) -> float:
+    """将切片时间转换为数字，无法识别时返回 None"""
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=1 << 17)
+def parse_name(file: str) -> NameRecord:
+    """
+    解析文件名，得到标签、名称、后缀名和切片时间
+
+    不含相应括号字符的文件名直接跳过对应的正则表达式匹配；结果按文件名缓存
+
+    :param file: 文件名
+    :return: 文件名解析结果
+    """
+    stem, ext = path.splitext(file)
+    m = _label_pattern.match(file) if file[:1] in _LABEL_OPEN else None
+    label = m.group(1) if m else '无标签'
+    m = _name_pattern.match(file) if any(c in file for c in _LABEL_CLOSE) else None
+    name = path.splitext(m.group(1))[0] if m else stem
+    m = _clip_pattern.match(file) if '(' in file or '（' in file else None
+    if m is None:
+        return NameRecord(label, name, ext, False, None, None, None)
+    return NameRecord(label, name, ext, True, m.group(1) + m.group(4), _to_float(m.group(2)), _to_float(m.group(3)))
+
+
+if __name__ == '__main__':
+    print('tokenizer')
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+外部程序（ffmpeg、mp3gain）的查找、版本探测和启动参数，统一处理 Windows 与 Linux 等平台的差异
+
+- IS_WINDOWS: 是否为 Windows 平台
+- CREATION_FLAGS: 启动子进程的平台参数（Windows 上不弹出控制台窗口，其他平台为 0）
+- FFMPEG: ffmpeg 的默认程序名（Windows 上为 ffmpeg.exe）
+- MP3GAIN: mp3gain 的默认程序名（Windows 上为 mp3gain.exe）
+- EXECUTABLE_PATTERN: 选择可执行文件时的文件名通配符
+- Tool: 已找到的外部程序（名称、完整路径、版本）
+- resolve_tool: 查找外部程序的完整路径（环境变量 PATH 的查找结果会被缓存）
+- probe_tool: 查找外部程序并读取其版本（结果会被缓存）
+- mp3gain_args: 调用 mp3gain 调整音量的参数列表
+"""
+import re
+import subprocess
+import sys
+from functools import lru_cache
+from os import path
+from shutil import which
+from subprocess import run, DEVNULL, PIPE, TimeoutExpired
+from typing import NamedTuple
+
+IS_WINDOWS = sys.platform == 'win32'
+CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if IS_WINDOWS else 0
+FFMPEG = 'ffmpeg.exe' if IS_WINDOWS else 'ffmpeg'
+MP3GAIN = 'mp3gain.exe' if IS_WINDOWS else 'mp3gain'
+EXECUTABLE_PATTERN = '*.exe' if IS_WINDOWS else '*'
+_VERSION_PATTERN = re.compile(r'version\s+(\S+)', re.IGNORECASE)
+
+
+class Tool(NamedTuple):
+    """已找到的外部程序"""
+    name: str  # 配置中的名称或路径
+    path: str  # 完整路径
+    version: str  # 版本，无法读取时为空字符串
+
+
+@lru_cache(maxsize=None)
+def _which(name: str) -> str:
+    """在环境变量 PATH 中查找程序（缓存结果，同一程序只查找一次）"""
+    return which(name)
+
+
+def resolve_tool(name: str) -> str:
+    """
+    查找外部程序的完整路径：先查找给定的路径，再在环境变量 PATH 中查找；
+    非 Windows 平台上找不到“xxx.exe”时再查找“xxx”（兼容在 Windows 上保存的配置）
+
+    :param name: 程序名或路径，如 'ffmpeg'、'ffmpeg.exe'、'/usr/bin/ffmpeg'
+    :return: 完整路径，未找到时为 None
+    """
+    if path.isfile(name):
+        return path.abspath(name)
+    found = _which(name)
+    if found is None and not IS_WINDOWS and name.lower().endswith('.exe'):
+        found = _which(name[:-4])
+    return found
+
+
+@lru_cache(maxsize=None)
+def probe_tool(name: str) -> Tool:
+    """
+    查找外部程序并读取其版本（ffmpeg -version、mp3gain -v 输出中“version”后的部分），结果会被缓存
+
+    :param name: 程序名或路径
+    :return: 已找到的外部程序，未找到时为 None
+    """
+    tool_path = resolve_tool(name)
+    if tool_path is None:
+        return None
+    option = '-v' if 'mp3gain' in path.basename(tool_path).lower() else '-version'
+    try:
+        result = run([tool_path, option], stdin=DEVNULL, stdout=PIPE, stderr=PIPE, timeout=10,
+                     creationflags=CREATION_FLAGS)
+        output = (result.stdout + result.stderr).decode('utf-8', errors='replace')
+    except (OSError, TimeoutExpired):
+        output = ''
+    match = _VERSION_PATTERN.search(output)
+    return Tool(name, tool_path, match.group(1) if match else '')
+
+
+def mp3gain_args(mp3gain_path: str, change: int, file_path: str) -> list[str]:
+    """
+    调用 mp3gain 调整音量的参数列表（各平台的 mp3gain 均支持以“-”开头的选项）
+
+    :param mp3gain_path: mp3gain 的路径
+    :param change: 相对于 89dB 的分贝数
+    :param file_path: 音乐文件的完整路径
+    :return: 参数列表，-d 为调整的分贝数，-c 为无需确认，-r 为按单曲调整
+    """
+    return [mp3gain_path, '-d', str(change), '-c', '-r', file_path]
+
+
+if __name__ == '__main__':
+    print('tools')
@@ -7,13 +7,23 @@
 
 - create_logger: 创建一个logger
 - makedirs: 若文件夹不存在则创建文件夹，并返回标准化的路径
+- copy_range: 将源文件的一段数据追加写入目标文件（优先在内核中复制）
 - time_from: 将时间秒数格式化为“0h0m0s”格式，若秒数小于0，则输出为0。
 - time_list_from: 格式化时间列表，得到总时长（-h-m-s）格式、平均时长（-m-s）格式
 - check_dependence: 检查依赖是否存在（如ffmpeg.exe、mp3gain.exe）
+- update_progress: 更新进度条（界面控件或回调函数）
+- speed_text: 将处理速度和剩余时间格式化为“0.0个/秒，剩余0h0m0s”格式
+- ProgressReporter: 节流的进度报告器，合并频繁的进度更新，限制每秒输出次数，并计算处理速度和剩余时间
+- Cancelled: 处理过程被取消时抛出的异常
+- CancelToken: 取消标志，支持暂停、继续、取消，取消时终止正在运行的子进程（如 ffmpeg.exe）
 """
 import logging
+import os
 from os import path, makedirs
-from shutil import which
+from threading import Event, Lock
+from time import monotonic
+
+from tools import resolve_tool
 
 
 def create_logger(log_name: str = 'MP3Random', log_file: str = 'mp3random.log',
@@ -59,6 +69,41 @@ def create_path(path_name: str) -> str:
     return path_name
 
 
+def copy_range(src, dst, offset: int, count: int, buffer_size: int = 8 * 1024 * 1024):
+    """
+    将源文件 offset 处的 count 字节追加写入目标文件，优先使用 copy_file_range、sendfile 在内核中复制（不经过用户空间，
+    同一文件系统上可能只复制引用），系统或文件系统不支持时（跨文件系统、旧内核、非 Linux 平台）改为普通读写
+
+    :param src: 源文件对象
+    :param dst: 目标文件对象（已写入的内容需先 flush）
+    :param offset: 源文件中的起始位置
+    :param count: 字节数
+    :param buffer_size: 每次复制的字节数，默认为 8MB
+    """
+    for copy_func in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+        if copy_func is None:
+            continue
+        try:
+            while count > 0:
+                if copy_func is os.sendfile:
+                    copied = copy_func(dst.fileno(), src.fileno(), offset, min(count, buffer_size))
+                else:
+                    copied = copy_func(src.fileno(), dst.fileno(), min(count, buffer_size), offset)
+                if copied == 0:
+                    break
+                offset += copied
+                count -= copied
+            if count == 0:
+                return
+        except OSError:  # 不支持时改用下一种方式，已复制的部分不会重复复制
+            continue
+    src.seek(offset)
+    dst.seek(0, os.SEEK_END)
+    while count > 0 and (chunk := src.read(min(count, buffer_size))):
+        dst.write(chunk)
+        count -= len(chunk)
+
+
 def time_from(second: float) -> str:
     """
     将时间秒数格式化为“0h0m0s”格式，若秒数小于0，则输出为0。
@@ -101,30 +146,189 @@ def check_dependence(dependence: str) -> bool:
     # 检查是否存在该依赖
     if path.exists(dependence):
         return True
-    # 检查环境变量中是否存在该依赖
-    elif which(dependence):
-        return True
-    else:
-        return False
+    # 检查环境变量中是否存在该依赖（查找结果会被缓存，非 Windows 平台上兼容“.exe”后缀，见 tools.resolve_tool）
+    return resolve_tool(dependence) is not None
 
 
 def update_progress(process_inner_list, current_value: int, total_value: int, old_file, new_file):
     """
     更新进度条
 
-    :param process_inner_list: 进度条控件列表，包括进度条、进度值、旧文件、新文件
-    :param current_value: 当前值
+    :param process_inner_list: 进度条控件列表，包括进度条、进度值、旧文件、新文件；
+                               也可以是回调函数 callback(current_value, total_value, old_file, new_file)（命令行等无界面运行时），
+                               为 None 时不更新
+    :param current_value: 当前值，可为小数（如格式转换时包含正在转换的文件已完成的比例）
     :param total_value: 总值
     :param old_file: 旧文件
     :param new_file: 新文件
     """
+    # 无界面运行时不更新进度条
+    if process_inner_list is None:
+        return
+    if callable(process_inner_list):
+        process_inner_list(current_value, total_value, old_file, new_file)
+        return
     progress, progress_value, process_old_file, process_new_file = process_inner_list
     progress.attributes['value'] = current_value
     progress.attributes['max'] = total_value
-    progress_value.text = f'{current_value}/{total_value}'
+    progress_value.text = f'{int(current_value)}/{total_value}'
     process_old_file.text = old_file
     process_new_file.text = new_file
 
 
+def speed_text(speed: float, eta: float) -> str:
+    """
+    将处理速度和剩余时间格式化为“0.0个/秒，剩余0h0m0s”格式
+
+    :param speed: 处理速度（个/秒），为 None 时尚无法计算
+    :param eta: 剩余时间（秒），为 None 时尚无法计算
+    :return: 格式化后的字符串，无法计算时为空字符串
+    """
+    if speed is None:
+        return ''
+    text = f'{speed:.1f}个/秒'
+    if eta is not None:
+        text += f'，剩余{time_from(eta)}'
+    return text
+
+
+class ProgressReporter:
+    """
+    节流的进度报告器
+
+    可直接作为 update_progress 的回调函数使用。更新过于频繁时只保留最新的进度，每秒最多输出 rate 次；
+    每个过程的第一次更新和完成时（当前值达到总值）的更新必定输出，以免界面显示过期的进度。
+    总值变化或当前值减小时视为新的过程开始，重新计算处理速度和剩余时间。
+    """
+
+    def __init__(self, sink, rate: float = 10.0, clock=monotonic):
+        """
+        :param sink: 输出函数 sink(current_value, total_value, old_file, new_file, speed, eta)，
+                     speed 为处理速度（个/秒），eta 为剩余时间（秒），无法计算时为 None
+        :param rate: 每秒最多输出的次数，默认为 10
+        :param clock: 计时函数，默认为 time.monotonic
+        """
+        self.sink = sink
+        self.interval = 1 / rate
+        self.clock = clock
+        self.pending = None  # 尚未输出的最新进度
+        self.last_flush = None  # 上次输出的时间
+        self.start = None  # 当前过程的 (开始时间, 开始时的当前值)
+        self.last = None  # 上次更新的 (当前值, 总值)
+
+    def __call__(self, current_value: int, total_value: int, old_file, new_file):
+        """
+        更新进度，距上次输出不足 1/rate 秒时暂不输出
+
+        :param current_value: 当前值
+        :param total_value: 总值
+        :param old_file: 旧文件
+        :param new_file: 新文件
+        """
+        now = self.clock()
+        new_stage = self.last is None or total_value != self.last[1] or current_value < self.last[0]
+        if new_stage:
+            self.start = (now, current_value)
+        self.last = (current_value, total_value)
+        self.pending = (current_value, total_value, old_file, new_file)
+        if new_stage or current_value >= total_value or now - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """立即输出尚未输出的最新进度（运行结束或中断时调用）"""
+        if self.pending is None:
+            return
+        current_value, total_value, old_file, new_file = self.pending
+        self.pending = None
+        self.last_flush = now = self.clock()
+        start_time, start_value = self.start
+        speed = eta = None
+        if now > start_time and current_value > start_value:
+            speed = (current_value - start_value) / (now - start_time)
+            eta = max(0, total_value - current_value) / speed
+        self.sink(current_value, total_value, old_file, new_file, speed, eta)
+
+
+class Cancelled(Exception):
+    """处理过程被取消"""
+
+
+class CancelToken:
+    """
+    取消标志
+
+    由界面或命令行（另一个线程）调用 cancel、pause、resume，处理过程在每个文件开始前调用 check：
+    暂停时阻塞直至继续，已取消时抛出 Cancelled。通过 track 登记的子进程（如 runner.run_batch 启动的 ffmpeg.exe）在取消时立即被终止。
+    """
+
+    def __init__(self):
+        self._cancelled = Event()
+        self._running = Event()  # 未暂停时为真
+        self._running.set()
+        self._lock = Lock()
+        self._processes = set()  # 正在运行的子进程
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已取消"""
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        """是否已暂停"""
+        return not self._running.is_set()
+
+    def cancel(self):
+        """取消处理过程，并终止正在运行的子进程"""
+        self._cancelled.set()
+        self._running.set()  # 唤醒暂停中的处理过程，使其抛出 Cancelled
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:  # 子进程已结束
+                pass
+
+    def pause(self):
+        """暂停处理过程（当前文件处理完成后暂停）"""
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        """继续处理过程"""
+        self._running.set()
+
+    def check(self):
+        """
+        检查取消标志：暂停时阻塞直至继续或取消
+
+        :raises Cancelled: 已取消时
+        """
+        self._running.wait()
+        if self.cancelled:
+            raise Cancelled()
+
+    def track(self, process):
+        """
+        登记正在运行的子进程（任何有 kill 方法的对象），取消时将其终止；已取消时立即终止
+
+        :param process: 子进程
+        """
+        with self._lock:
+            self._processes.add(process)
+        if self.cancelled:  # 启动期间被取消
+            process.kill()
+
+    def untrack(self, process):
+        """
+        取消登记已结束的子进程
+
+        :param process: 子进程
+        """
+        with self._lock:
+            self._processes.discard(process)
+
+
 if __name__ == '__main__':
     print('utils')
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：性能测试工具（benchmark/benchmark.py）
+"""
+import argparse
+from collections import Counter
+from queue import Queue
+
+import pytest
+from MP3Random.benchmark.benchmark import make_names, make_mp3, compare, _measure, SHAPES
+from MP3Random.mp3random.metadata import read_music_info
+from MP3Random.mp3random.mp3_operations import _re_name
+
+
+def test_make_names():
+    """测试 - 生成合成文件名 - 不重复、标签分布偏斜、各种文件名形式"""
+    names = make_names(1000, labels=10, skew=1.5)
+    assert len(set(names)) == 1000
+    labels = Counter(name[1:name.index(']')] for name in names if name.startswith('['))
+    assert labels.most_common(1)[0][0] == '标签0'
+    clip_need, rename_need = _re_name([(name, 60.0) for name in names])
+    assert clip_need and rename_need
+    assert make_names(100, seed=1) == make_names(100, seed=1)
+    assert all(name.startswith('歌曲') for name in make_names(10, shapes=('nolabel',)))
+
+
+def test_make_mp3(tmp_path):
+    """测试 - 生成合成 MP3 文件 - 可被正常读取"""
+    make_mp3(str(tmp_path / 'a.mp3'), frames=40)
+    info, = read_music_info(str(tmp_path), ['a.mp3'])
+    assert info.length == pytest.approx(40 * 1152 / 44100, abs=0.05)
+    assert info.bitrate == 128000
+
+
+def test_measure(tmp_path):
+    """测试 - 运行一个过程的测试 - 记录耗时和峰值内存"""
+    args = argparse.Namespace(labels=5, skew=1.0, shapes=list(SHAPES), seed=0, frames=4, work_dir=str(tmp_path),
+                              ffmpeg='ffmpeg.exe', mp3gain='mp3gain.exe', jobs=1)
+    queue = Queue()
+    _measure('mp3_random_copy', 20, args, queue)
+    result = queue.get_nowait()
+    assert result['seconds'] > 0
+    assert list(tmp_path.iterdir()) == []  # 合成音乐库已删除
+
+
+def test_compare():
+    """测试 - 与之前的结果比较"""
+    baseline = [{'stage': 'get_random', 'files': 100, 'seconds': 1.0},
+                {'stage': 're_name', 'files': 100, 'seconds': 1.0}]
+    results = [{'stage': 'get_random', 'files': 100, 'seconds': 1.5},
+               {'stage': 're_name', 'files': 100, 'seconds': 1.1},
+               {'stage': 'to_mp3', 'files': 100, 'skipped': '未找到ffmpeg'}]
+    slower = compare(results, baseline)
+    assert len(slower) == 1
+    assert slower[0].startswith('get_random[100]')
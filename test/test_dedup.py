@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：查找重复的音乐文件（dedup.py）
+"""
+import os
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+import pytest
+from MP3Random.mp3random.dedup import partial_hash, full_hash, find_duplicates, redundant_files, _same_audio, \
+    _audio_candidates
+from MP3Random.mp3random.pipeline import PipelineConfig, run_pipeline
+
+MP3_FRAME = b'\xff\xfb\x90\x00' + bytes(413)
+
+
+@pytest.fixture
+def music_path(tmp_path):
+    music_path = tmp_path / 'music'
+    music_path.mkdir()
+    song = MP3_FRAME * 400  # 大于 128KB，首尾数据块之外有中间部分
+    (music_path / 'a.mp3').write_bytes(song)
+    (music_path / 'b.mp3').write_bytes(song)
+    middle = bytearray(song)
+    middle[len(song) // 2] = 1  # 首尾相同、中间不同
+    (music_path / 'c.mp3').write_bytes(bytes(middle))
+    (music_path / 'd.mp3').write_bytes(song + MP3_FRAME)  # 大小不同
+    (music_path / 'e.flac').write_bytes(b'fLaC' + bytes(8))
+    (music_path / 'f.wav').write_bytes(b'fLaC' + bytes(8))
+    (music_path / '封面.jpg').write_bytes(b'fLaC' + bytes(8))  # 非音乐文件不参与查重
+    return music_path
+
+
+def test_hash(music_path):
+    """测试 - 首尾数据块哈希值相同时，完整文件哈希值可以不同"""
+    a, c = str(music_path / 'a.mp3'), str(music_path / 'c.mp3')
+    size = (music_path / 'a.mp3').stat().st_size
+    assert partial_hash(a, size) == partial_hash(c, size)
+    assert full_hash(a) != full_hash(c)
+    assert full_hash(a) == full_hash(str(music_path / 'b.mp3'))
+
+
+def test_find_duplicates(music_path):
+    """测试 - 按文件内容查重，只为大小相同的文件读取数据"""
+    with patch('MP3Random.mp3random.dedup.full_hash', wraps=full_hash) as mock_full:
+        duplicates = find_duplicates(str(music_path), jobs=2)
+    assert duplicates == [['a.mp3', 'b.mp3'], ['e.flac', 'f.wav']]
+    assert sorted(os.path.basename(call.args[0]) for call in mock_full.call_args_list) == \
+           ['a.mp3', 'b.mp3', 'c.mp3', 'e.flac', 'f.wav']
+    assert redundant_files(duplicates, MagicMock()) == {'b.mp3', 'f.wav'}
+    with pytest.raises(ValueError):
+        find_duplicates(str(music_path), 'name')
+
+
+def test_find_duplicates_audio(music_path):
+    """测试 - 按音频指纹查重：允许少量不同位和 1s 以内的长度差，解码失败的文件不参与"""
+    rng = np.random.default_rng(0)
+    base = rng.random(200) > 0.5
+    noisy = base.copy()
+    noisy[:10] = ~noisy[:10]
+    fingerprints = {'a.mp3': base, 'b.mp3': noisy, 'c.mp3': base[:-2], 'd.mp3': rng.random(200) > 0.5,
+                    'e.flac': base[:150]}
+
+    def fake(file_path, ffmpeg_path):
+        name = os.path.basename(file_path)
+        if name not in fingerprints:
+            raise RuntimeError('ffmpeg.exe 解码失败')
+        return fingerprints[name]
+
+    with patch('MP3Random.mp3random.dedup.audio_fingerprint', side_effect=fake):
+        assert find_duplicates(str(music_path), 'audio') == [['a.mp3', 'b.mp3', 'c.mp3']]
+    assert not _same_audio(np.zeros(0, dtype=bool), np.zeros(0, dtype=bool))
+
+
+
+def test_audio_candidates():
+    """测试 - 音频指纹分桶：相同的指纹（不同位达到上限、长度相差 2 段、过短）都在候选中，不同的指纹很少需要比较"""
+    rng = np.random.default_rng(0)
+    fingerprints = [rng.random(239) > 0.5 for _ in range(200)]
+    noisy = fingerprints[0].copy()
+    flip = rng.choice(237, 23, replace=False)  # 不同位数为 237 位的 10% 以内
+    noisy[flip] = ~noisy[flip]
+    short = rng.random(61) > 0.5
+    short_noisy = short.copy()
+    short_noisy[[0, 1, 16, 17, 32, 33]] = ~short_noisy[[0, 1, 16, 17, 32, 33]]  # 3 个完整段都相差 2 位
+    fingerprints += [noisy[:-2], short, short_noisy[:-1]]
+    candidates = _audio_candidates(fingerprints)
+    assert _same_audio(fingerprints[0], fingerprints[200]) and 200 in candidates[0]
+    assert _same_audio(short, short_noisy[:-1]) and 202 in candidates[201]
+    # 与两两比较的结果一致
+    for i, a in enumerate(fingerprints):
+        assert {j for j, b in enumerate(fingerprints) if _same_audio(a, b)} <= candidates[i]
+    assert sum(len(c) - 1 for c in candidates) < 0.01 * len(fingerprints) ** 2
+
+@patch('MP3Random.mp3random.pipeline.check_dependence', return_value=True)
+def test_run_pipeline_dedup(mock_check, tmp_path, music_path):
+    """测试 - 处理流程：转换前查重，重复文件不转换；未开启格式转换时重复文件不参与随机排列"""
+    with patch('MP3Random.mp3random.pipeline.to_mp3') as mock_to_mp3, \
+            patch('MP3Random.mp3random.pipeline.mp3_random') as mock_random:
+        config = PipelineConfig(str(tmp_path / 'new'), str(music_path), str(tmp_path / 'random'), dedup='content',
+                                process_to_mp3=True, process_random=True, incremental=False)
+        on_stage = MagicMock()
+        run_pipeline(config, MagicMock(), on_stage=on_stage)
+        assert [c.args[0] for c in on_stage.call_args_list][:2] == ['查重', '格式转换']
+        assert mock_to_mp3.call_args.kwargs['exclude'] == {'b.mp3', 'f.wav'}
+        assert mock_random.call_args.kwargs['exclude'] is None
+        run_pipeline(config._replace(music_path=str(music_path), process_to_mp3=False), MagicMock())
+        assert mock_random.call_args.kwargs['exclude'] == {'b.mp3', 'f.wav'}
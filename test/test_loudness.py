@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：响度分析与无损音量调整（loudness.py）
+"""
+import io
+import time
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+import pytest
+from MP3Random.mp3random.loudness import integrated_loudness, track_loudness, analyze_source, gain_steps, apply_gain, \
+    _crc16
+from MP3Random.mp3random.mp3_frames import parse_header, iter_frames, global_gain_bits
+
+RATE = 48000
+
+
+def sine(amplitude: float, seconds: float = 10, channels: int = 2) -> np.ndarray:
+    """生成 997Hz 正弦波"""
+    t = np.arange(int(RATE * seconds)) / RATE
+    return np.tile(amplitude * np.sin(2 * np.pi * 997 * t), (channels, 1))
+
+
+def read_gains(data: bytes) -> list[int]:
+    """读取所有帧的 global_gain 字段"""
+    gains = []
+    for offset, header in iter_frames(data):
+        value = int.from_bytes(data[offset:offset + 4 + (2 if header.protection else 0) + header.side_info_size], 'big')
+        total = (4 + (2 if header.protection else 0) + header.side_info_size) * 8
+        gains.extend((value >> (total - bit - 8)) & 0xFF for bit in global_gain_bits(header))
+    return gains
+
+
+@pytest.mark.parametrize('amplitude, channels, expected', [
+    (1.0, 1, -3.01),  # BS.1770：单声道 0dBFS 997Hz 正弦波为 -3.01LKFS
+    (1.0, 2, 0.0),
+    (0.1, 2, -20.0),
+    (0.01, 1, -43.01),
+])
+def test_integrated_loudness(amplitude, channels, expected):
+    """测试 - 综合响度"""
+    assert integrated_loudness(sine(amplitude, channels=channels)) == pytest.approx(expected, abs=0.05)
+
+
+def test_integrated_loudness_gating():
+    """测试 - 综合响度 - 静音部分不参与计算"""
+    signal = np.concatenate((sine(0.1), np.zeros((2, RATE * 20))), axis=-1)
+    assert integrated_loudness(signal) == pytest.approx(-20.0, abs=0.1)  # 过渡处的门限块略低
+    assert integrated_loudness(np.zeros((2, RATE * 5))) == float('-inf')
+
+
+def test_track_loudness():
+    """测试 - 分块读取 ffmpeg.exe 管道数据计算的响度与整体计算一致"""
+    rng = np.random.default_rng(0)
+    signal = (rng.normal(0, 0.1, (2, RATE * 75)) * np.linspace(0.2, 1, RATE * 75)).astype(np.float32)
+    process = MagicMock(returncode=0)
+    process.__enter__.return_value = process
+    process.stdout = io.BytesIO(signal.T.tobytes())
+    with patch('MP3Random.mp3random.loudness.Popen', return_value=process) as mock_popen:
+        loudness = track_loudness('test.mp3', 'ffmpeg.exe', 2)
+    assert mock_popen.call_args[0][0][:5] == ['ffmpeg.exe', '-v', 'error', '-i', 'test.mp3']
+    assert loudness == pytest.approx(integrated_loudness(signal), abs=0.01)
+
+
+
+@patch('MP3Random.mp3random.loudness.track_loudness', return_value=-20.0)
+@patch('MP3Random.mp3random.loudness.File')
+def test_analyze_source(mock_file, mock_track_loudness):
+    """测试 - 分析转换前的音乐文件 - 按声道数（最多 2 个）和切片起止时间计算响度"""
+    mock_file.return_value.info.channels = 6
+    assert analyze_source('test.flac', 'ffmpeg.exe', 30.5, 45.0) == -20.0
+    mock_track_loudness.assert_called_once_with('test.flac', 'ffmpeg.exe', 2, 30.5, 45.0)
+    mock_file.return_value = None
+    with pytest.raises(ValueError):
+        analyze_source('test.txt', 'ffmpeg.exe')
+
+@pytest.mark.parametrize('loudness, db, expected', [
+    (-18.0, 89, 0),
+    (-12.0, 89, -4),
+    (-18.0, 95, 4),
+    (-24.0, 92, 6),
+    (float('-inf'), 89, 0),
+])
+def test_gain_steps(loudness, db, expected):
+    """测试 - global_gain 步数"""
+    assert gain_steps(loudness, db) == expected
+
+
+@pytest.mark.parametrize('header', [b'\xff\xfb\x90\x00', b'\xff\xfa\xe4\xc0', b'\xff\xf3\x84\x00'])
+def test_apply_gain(tmp_path, header):
+    """测试 - 修改 global_gain 调整音量"""
+    frame_length = parse_header(header).frame_length
+    frame = bytearray(header + b'\x00' * (frame_length - 4))
+    if parse_header(header).protection:
+        frame[4:6] = _crc16(frame[2:4] + frame[6:6 + parse_header(header).side_info_size]).to_bytes(2, 'big')
+    music_file = tmp_path / 'test.mp3'
+    music_file.write_bytes(b'ID3\x04\x00\x00\x00\x00\x00\x00' + bytes(frame) * 20)
+
+    assert apply_gain(str(music_file), 4) == 20
+    gains = read_gains(music_file.read_bytes())
+    assert gains and all(gain == 4 for gain in gains)
+    assert apply_gain(str(music_file), -10) == 20
+    assert all(gain == 0 for gain in read_gains(music_file.read_bytes()))  # 不小于 0
+    assert apply_gain(str(music_file), 0) == 0
+    data = music_file.read_bytes()
+    if parse_header(header).protection:  # CRC 已更新
+        side_info_size = parse_header(header).side_info_size
+        for offset, _ in iter_frames(data):
+            crc = _crc16(data[offset + 2:offset + 4] + data[offset + 6:offset + 6 + side_info_size])
+            assert data[offset + 4:offset + 6] == crc.to_bytes(2, 'big')
+
+
+@pytest.mark.parametrize('minutes', [1, 3])
+def test_integrated_loudness_performance(minutes):
+    """测试 - 综合响度 - 性能测试"""
+    signal = np.random.default_rng(0).normal(0, 0.1, (2, RATE * 60 * minutes)).astype(np.float32)
+    start_time = time.perf_counter()
+    loudness = integrated_loudness(signal)
+    use_time = time.perf_counter() - start_time
+    print(f'\t[{minutes}]分钟音乐响度：{loudness:.2f}LUFS，耗时：{use_time:.4f}秒')
+    assert use_time < 2 * minutes
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：运行记录（manifest.py）
+"""
+import os
+from unittest.mock import MagicMock
+
+import pytest
+from MP3Random.mp3random.manifest import RunManifest, fingerprint
+
+
+@pytest.fixture
+def music_file(tmp_path):
+    music_path = tmp_path / 'music'
+    os.makedirs(music_path)
+    music_file = music_path / 'test.mp3'
+    music_file.write_bytes(b'\xff' * 10)
+    return music_file
+
+
+def test_fingerprint(music_file):
+    """测试 - 文件指纹"""
+    st = os.stat(music_file)
+    assert fingerprint(str(music_file)) == [10, st.st_mtime_ns]
+    assert fingerprint(str(music_file) + '.none') is None
+
+
+def test_run_manifest(music_file):
+    """测试 - 运行记录 - 记录并跳过"""
+    manifest = RunManifest(str(music_file.parent))
+    assert manifest.manifest_file == str(music_file.parent.parent / '.music.mp3random.json')
+    assert not manifest.is_done('mp3_gain', str(music_file), {'db': 89})
+    manifest.record('mp3_gain', str(music_file), {'db': 89})
+    assert manifest.is_done('mp3_gain', str(music_file), {'db': 89})
+    assert not manifest.is_done('mp3_gain', str(music_file), {'db': 95})  # 参数改变
+    assert not manifest.is_done('to_mp3', str(music_file), {'db': 89})  # 过程不同
+    manifest.save()
+
+    manifest = RunManifest(str(music_file.parent))
+    assert manifest.is_done('mp3_gain', str(music_file), {'db': 89})
+    music_file.write_bytes(b'\xff' * 20)  # 文件改变
+    assert not manifest.is_done('mp3_gain', str(music_file), {'db': 89})
+
+
+def test_run_manifest_output(music_file, tmp_path):
+    """测试 - 运行记录 - 记录的输出文件不存在时视为未处理"""
+    output = tmp_path / 'test.mp3'
+    output.write_bytes(b'\xff')
+    manifest = RunManifest(str(music_file.parent))
+    manifest.record('to_mp3', str(music_file), {'bitrate': '128k'}, output=str(output))
+    assert manifest.is_done('to_mp3', str(music_file), {'bitrate': '128k'})
+    output.unlink()
+    assert not manifest.is_done('to_mp3', str(music_file), {'bitrate': '128k'})
+
+
+def test_run_manifest_prune(music_file):
+    """测试 - 运行记录 - 清理已不存在的文件"""
+    manifest = RunManifest(str(music_file.parent))
+    manifest.record('to_mp3', str(music_file), {'bitrate': '128k'})
+    os.remove(music_file)
+    manifest.save()
+    assert RunManifest(str(music_file.parent)).stages == {'to_mp3': {}}
+
+
+def test_run_manifest_broken(music_file):
+    """测试 - 运行记录 - 记录文件损坏时重新记录"""
+    manifest_file = music_file.parent.parent / '.music.mp3random.json'
+    manifest_file.write_text('{broken', encoding='utf-8')
+    manifest = RunManifest(str(music_file.parent))
+    assert manifest.stages == {}
+    manifest.save()
+    assert RunManifest(str(music_file.parent)).stages == {}
+
+
+def test_run_manifest_unwritable(music_file, tmp_path):
+    """测试 - 运行记录 - 记录文件无法写入时记录警告并继续"""
+    logger = MagicMock()
+    manifest = RunManifest(str(music_file.parent), str(tmp_path / 'missing' / 'manifest.json'))
+    manifest.record('to_mp3', str(music_file), {'bitrate': '128k'})
+    assert not manifest.save(logger)
+    logger.warning.assert_called_once()
+    assert not (tmp_path / 'missing').exists()
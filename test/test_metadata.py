@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：音乐文件信息读取与缓存（metadata.py）
+"""
+import os
+from unittest.mock import patch, MagicMock
+
+import pytest
+from mutagen.mp3 import MP3
+from mutagen import MutagenError
+from MP3Random.mp3random.metadata import MetadataCache, MusicInfo, read_music_info, probe_music
+
+
+@pytest.fixture
+def mock_mp3():
+    with patch('MP3Random.mp3random.metadata.mp3_info') as mock:
+        mock.return_value.length = 300.0
+        mock.return_value.bitrate = 128000
+        yield mock
+
+
+@pytest.fixture
+def music_path(tmp_path):
+    music_path = tmp_path / 'music'
+    os.makedirs(music_path)
+    for name in ['[标签1]测试1.mp3', '【标签2】测试2(5-10).mp3', '测试3.mp3']:
+        (music_path / name).write_bytes(b'\xff' * 10)
+    return music_path
+
+
+def test_read_music_info(mock_mp3, music_path):
+    """测试 - 读取音乐信息"""
+    files = sorted(os.listdir(music_path))
+    infos = read_music_info(str(music_path), files)
+    assert infos == [MusicInfo(300.0, 128000, '标签1', '测试1'),
+                     MusicInfo(300.0, 128000, '标签2', '测试2(5-10)'),
+                     MusicInfo(300.0, 128000, '无标签', '测试3')]
+    assert mock_mp3.call_count == 3
+    # 缓存文件保存在音乐文件夹旁
+    assert os.path.exists(music_path.parent / '.music.mp3random.db')
+    assert sorted(os.listdir(music_path)) == files
+
+
+def test_read_music_info_cached(mock_mp3, music_path):
+    """测试 - 读取音乐信息 - 文件未改变时使用缓存"""
+    files = sorted(os.listdir(music_path))
+    first = read_music_info(str(music_path), files)
+    mock_mp3.reset_mock()
+    second = read_music_info(str(music_path), files)
+    assert first == second
+    mock_mp3.assert_not_called()
+
+
+def test_read_music_info_changed(mock_mp3, music_path):
+    """测试 - 读取音乐信息 - 文件改变后重新解析"""
+    files = sorted(os.listdir(music_path))
+    read_music_info(str(music_path), files)
+    mock_mp3.reset_mock()
+    mock_mp3.return_value.length = 60.0
+    (music_path / '测试3.mp3').write_bytes(b'\xff' * 20)
+    infos = read_music_info(str(music_path), files)
+    mock_mp3.assert_called_once_with(os.path.join(str(music_path), '测试3.mp3'))
+    assert infos[2].length == 60.0
+    assert infos[0].length == 300.0
+
+
+def test_metadata_cache_prune(mock_mp3, music_path):
+    """测试 - 清理已不存在文件的缓存"""
+    files = sorted(os.listdir(music_path))
+    read_music_info(str(music_path), files)
+    with MetadataCache(str(music_path)) as cache:
+        assert cache.prune(files[1:]) == 1
+        cache.read(files[1])
+        assert (cache.hits, cache.misses) == (1, 0)
+        cache.read(files[0])
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_read_music_info_subset(mock_mp3, music_path):
+    """测试 - 读取音乐信息 - 只读取部分文件时不删除其他仍存在文件的缓存，删除已不存在文件的缓存"""
+    files = sorted(os.listdir(music_path))
+    read_music_info(str(music_path), files)
+    read_music_info(str(music_path), files[:1])
+    (music_path / files[2]).unlink()
+    read_music_info(str(music_path), files[:1])
+    mock_mp3.reset_mock()
+    with MetadataCache(str(music_path)) as cache:
+        assert cache.prune(files) == 0  # 已不存在的文件此前已被清理
+        cache.read(files[1])
+        assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_metadata_cache_unwritable(mock_mp3, music_path, tmp_path):
+    """测试 - 缓存文件无法创建时改用内存缓存并提示"""
+    logger = MagicMock()
+    cache_file = str(tmp_path / '不存在' / 'cache.db')
+    with MetadataCache(str(music_path), cache_file, logger) as cache:
+        assert cache.cache_file == ':memory:'
+        assert cache.read('测试3.mp3').length == 300.0
+    logger.warning.assert_called_once()
+    assert read_music_info(str(music_path), ['测试3.mp3'], cache_file)[0].name == '测试3'
+    assert not os.path.exists(cache_file)
+
+def test_read_music_info_not_exist(mock_mp3, tmp_path):
+    """测试 - 读取音乐信息 - 文件不存在时不使用缓存"""
+    music_path = tmp_path / 'music'
+    os.makedirs(music_path)
+    mock_mp3.side_effect = FileNotFoundError
+    with pytest.raises(FileNotFoundError):
+        read_music_info(str(music_path), ['不存在.mp3'])
+
+
+def test_read_music_info_parallel(tmp_path):
+    """测试 - 读取音乐信息 - 并行解析 MP3 文件，结果与 mutagen 一致"""
+    music_path = tmp_path / 'music'
+    os.makedirs(music_path)
+    files = [f'[标签{i % 3}]测试{i}.mp3' for i in range(20)]
+    for i, file in enumerate(files):
+        (music_path / file).write_bytes((b'\xff\xfb\x90\x00' + bytes(413)) * (10 + i))
+    infos = read_music_info(str(music_path), files, jobs=4)
+    assert [info.label for info in infos] == [f'标签{i % 3}' for i in range(20)]
+    for file, info in zip(files, infos):
+        assert info.length == pytest.approx(MP3(str(music_path / file)).info.length)
+        assert info.bitrate == 128000
+
+
+def test_probe_music(mock_mp3, music_path):
+    """测试 - 批量读取音乐信息 - 单个文件损坏时不中断，单独返回无法读取的文件且不写入缓存"""
+    files = sorted(os.listdir(music_path))
+    info = mock_mp3.return_value
+    broken = MutagenError('无法同步帧头')
+
+    def parse(file_path):
+        if '测试1' in file_path:
+            raise broken
+        return info
+
+    mock_mp3.side_effect = parse
+    result = probe_music(str(music_path), files, jobs=2)
+    assert result.files == files[1:]
+    assert [info.length for info in result.infos] == [300.0, 300.0]
+    assert result.errors == {files[0]: broken}
+    # 不提供 errors 时仍抛出异常，损坏的文件未写入缓存
+    mock_mp3.reset_mock()
+    with pytest.raises(MutagenError):
+        read_music_info(str(music_path), files)
+    mock_mp3.assert_called_once_with(os.path.join(str(music_path), files[0]))
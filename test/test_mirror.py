@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：增量备份（mirror.py）
+"""
+import errno
+import json
+import os
+from unittest.mock import patch, MagicMock
+
+import pytest
+from MP3Random.mp3random.dedup import full_hash
+from MP3Random.mp3random.mirror import copy_file, manifest_path, sync_tree, verify_backup, SyncResult, Cancelled, \
+    CancelToken
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / 'source'
+    (source / '专辑' / '碟1').mkdir(parents=True)
+    (source / '空文件夹').mkdir()
+    (source / 'a.mp3').write_bytes(b'a' * 1000)
+    (source / '专辑' / 'b.mp3').write_bytes(b'b' * 2000)
+    (source / '专辑' / '碟1' / 'c.mp3').write_bytes(b'')
+    return source
+
+
+def tree(root) -> dict:
+    """文件夹中全部文件的 {相对路径: 内容}"""
+    return {str(p.relative_to(root)): p.read_bytes() for p in sorted(root.rglob('*')) if p.is_file()}
+
+
+def test_copy_file(tmp_path):
+    """测试 - 复制单个文件：保留修改时间；copy_file_range 不支持时改为普通复制；失败时不留下临时文件"""
+    src, dst = tmp_path / 'src.mp3', tmp_path / 'dst.mp3'
+    src.write_bytes(os.urandom(300000))
+    os.utime(src, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+    copy_file(str(src), str(dst), buffer_size=4096)
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_mtime_ns == src.stat().st_mtime_ns
+
+    dst.unlink()
+    with patch('MP3Random.mp3random.mirror.os.copy_file_range', create=True,
+               side_effect=OSError(errno.EXDEV, '跨文件系统')):
+        copy_file(str(src), str(dst))
+    assert dst.read_bytes() == src.read_bytes()
+
+    with patch('MP3Random.mp3random.mirror.copystat', side_effect=PermissionError('拒绝访问')):
+        with pytest.raises(PermissionError):
+            copy_file(str(src), str(tmp_path / 'other.mp3'))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['dst.mp3', 'src.mp3']
+
+
+def test_sync_tree(tmp_path, source):
+    """测试 - 增量备份：只复制新增或修改过的文件，删除已不存在的文件和文件夹、中断后残留的临时文件"""
+    backup_place = tmp_path / 'backup'
+    logger = MagicMock()
+    assert sync_tree(str(source), str(backup_place), logger, jobs=2) == SyncResult(3, 0, 0, 0)
+    assert tree(backup_place) == tree(source)
+    assert (backup_place / '空文件夹').is_dir()
+
+    # 未改变时不复制任何文件
+    with patch('MP3Random.mp3random.mirror.copy_file') as mock_copy:
+        assert sync_tree(str(source), str(backup_place), logger) == SyncResult(0, 3, 0, 0)
+        mock_copy.assert_not_called()
+
+    # 修改、删除、新增文件，文件与文件夹互换
+    (source / 'a.mp3').write_bytes(b'A' * 1000)
+    os.utime(source / 'a.mp3', ns=(0, (source / 'a.mp3').stat().st_mtime_ns + 10_000_000_000))
+    (source / '专辑' / 'b.mp3').unlink()
+    (source / '专辑' / '碟1' / 'c.mp3').unlink()
+    (source / '专辑' / '碟1').rmdir()
+    (source / '专辑' / '碟1').write_bytes(b'1')
+    (source / '空文件夹').rmdir()
+    (source / 'd.mp3').write_bytes(b'd')
+    (backup_place / 'd.mp3.mp3random-part').write_bytes(b'')  # 上次中断后残留的临时文件
+    (backup_place / '多余').mkdir()
+    (backup_place / '多余' / 'e.mp3').write_bytes(b'e')
+    result = sync_tree(str(source), str(backup_place), logger)
+    assert result == SyncResult(3, 0, 3, 0)
+    assert tree(backup_place) == tree(source)
+    assert sorted(p.name for p in backup_place.iterdir()) == ['a.mp3', 'd.mp3', '专辑']
+
+
+def test_sync_tree_checksum(tmp_path, source):
+    """测试 - 增量备份：大小和修改时间相同、内容不同的文件只在比较哈希值时复制"""
+    backup_place = tmp_path / 'backup'
+    sync_tree(str(source), str(backup_place), MagicMock())
+    stat = (backup_place / 'a.mp3').stat()
+    (backup_place / 'a.mp3').write_bytes(b'x' * 1000)
+    os.utime(backup_place / 'a.mp3', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert sync_tree(str(source), str(backup_place), MagicMock()).copied == 0
+    assert sync_tree(str(source), str(backup_place), MagicMock(), checksum=True) == SyncResult(1, 2, 0, 0)
+    assert (backup_place / 'a.mp3').read_bytes() == b'a' * 1000
+
+
+def test_sync_tree_manifest(tmp_path, source):
+    """测试 - 哈希记录：写入后可校验备份，未改变的文件沿用上次的哈希值"""
+    backup_place = tmp_path / 'backup'
+    sync_tree(str(source), str(backup_place), MagicMock(), write_manifest=True)
+    manifest_file = manifest_path(str(backup_place))
+    assert manifest_file == str(tmp_path / '.backup.backup.json')
+    with open(manifest_file, encoding='utf-8') as f:
+        files = json.load(f)['files']
+    assert sorted(files) == ['a.mp3', '专辑/b.mp3', '专辑/碟1/c.mp3']
+    assert files['a.mp3'][2] == full_hash(str(source / 'a.mp3')).hex()
+    assert verify_backup(str(backup_place)) == []
+
+    with patch('MP3Random.mp3random.mirror.full_hash', wraps=full_hash) as mock_hash:
+        (source / 'd.mp3').write_bytes(b'd')
+        sync_tree(str(source), str(backup_place), MagicMock(), write_manifest=True)
+        assert [os.path.basename(c.args[0]) for c in mock_hash.call_args_list] == ['d.mp3']
+
+    (backup_place / '专辑' / 'b.mp3').write_bytes(b'x' * 2000)
+    (backup_place / 'd.mp3').unlink()
+    assert verify_backup(str(backup_place)) == ['d.mp3', '专辑/b.mp3']
+    with pytest.raises(FileNotFoundError):
+        verify_backup(str(tmp_path / 'source'))
+
+
+def test_sync_tree_cancel(tmp_path, source):
+    """测试 - 增量备份：取消时抛出 Cancelled，备份中不留下临时文件，再次备份时只复制剩余的文件"""
+    backup_place = tmp_path / 'backup'
+    cancel_token = CancelToken()
+    cancel_token.cancel()
+    logger = MagicMock()
+    with pytest.raises(Cancelled):
+        sync_tree(str(source), str(backup_place), logger, cancel_token=cancel_token)
+    logger.warning.assert_called_once()
+    assert tree(backup_place) == {}
+    assert sync_tree(str(source), str(backup_place), logger).copied == 3
+
+
+def test_sync_tree_errors(tmp_path, source):
+    """测试 - 增量备份：单个文件复制失败不影响其他文件；源文件夹不存在时抛出 FileNotFoundError"""
+    backup_place = tmp_path / 'backup'
+    logger = MagicMock()
+    with patch('MP3Random.mp3random.mirror.copy_file', side_effect=PermissionError('拒绝访问')):
+        assert sync_tree(str(source), str(backup_place), logger) == SyncResult(0, 0, 0, 3)
+    assert logger.error.call_count == 3
+    with pytest.raises(FileNotFoundError):
+        sync_tree(str(tmp_path / '不存在'), str(backup_place), logger)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：MP3 帧解析（mp3_frames.py）
+"""
+import os
+
+import pytest
+from unittest.mock import patch
+
+from MP3Random.mp3random.mp3_frames import parse_header, skip_id3v2, iter_frames, global_gain_bits, mp3_info, \
+    read_vbr_header, make_info_frame, clip_mp3
+from mutagen.mp3 import MP3
+
+# MPEG-1 Layer III，128kbps，44.1kHz，立体声，无 CRC
+HEADER_128K = b'\xff\xfb\x90\x00'
+
+
+def make_frames(header: bytes = HEADER_128K, count: int = 10) -> bytes:
+    """生成 count 个静音帧（边信息和主数据全为 0）"""
+    return (header + b'\x00' * (parse_header(header).frame_length - 4)) * count
+
+
+@pytest.mark.parametrize('header, expected', [
+    (b'\xff\xfb\x90\x00', (1, False, 128000, 44100, 0, 2, 417, 1152, 32)),  # MPEG-1 立体声
+    (b'\xff\xfb\x92\x00', (1, False, 128000, 44100, 1, 2, 418, 1152, 32)),  # 填充
+    (b'\xff\xfa\xe4\xc0', (1, True, 320000, 48000, 0, 1, 960, 1152, 17)),  # 单声道、CRC
+    (b'\xff\xf3\x84\x00', (2, False, 64000, 24000, 0, 2, 192, 576, 17)),  # MPEG-2
+    (b'\xff\xe3\x40\xc0', (2.5, False, 32000, 11025, 0, 1, 208, 576, 9)),  # MPEG-2.5 单声道
+])
+def test_parse_header(header, expected):
+    """测试 - 解析帧头"""
+    assert tuple(parse_header(header)) == expected
+
+
+@pytest.mark.parametrize('header', [b'\xff\xfb\xf0\x00', b'\xff\xfb\x0c\x00', b'\xff\xfd\x90\x00', b'\xfe\xfb\x90\x00',
+                                    b'\xff\xfb'])
+def test_parse_header_invalid(header):
+    """测试 - 解析帧头 - 无效帧头（码率、采样率、层无效或长度不足）"""
+    assert parse_header(header) is None
+
+
+def test_skip_id3v2():
+    """测试 - 跳过 ID3v2 标签"""
+    tag = b'ID3\x04\x00\x00\x00\x00\x01\x00' + b'\x00' * 128
+    assert skip_id3v2(tag + make_frames()) == len(tag)
+    assert skip_id3v2(make_frames()) == 0
+
+
+def test_iter_frames():
+    """测试 - 遍历音频帧 - 跳过标签和无效数据"""
+    tag = b'ID3\x04\x00\x00\x00\x00\x00\x20' + b'\x00' * 32
+    data = tag + make_frames(count=3) + b'\x00\xff\x00' + make_frames(count=2) + b'TAG' + b'\x00' * 125
+    frames = list(iter_frames(data))
+    assert len(frames) == 5
+    assert frames[0][0] == len(tag)
+    assert frames[3][0] == len(tag) + 3 * 417 + 3
+
+
+@pytest.mark.parametrize('header, expected', [
+    (b'\xff\xfb\x90\x00', [73, 132, 191, 250]),  # MPEG-1 立体声：32 + 20 + 21
+    (b'\xff\xfa\xe4\xc0', [87, 146]),  # MPEG-1 单声道、CRC：48 + 18 + 21
+    (b'\xff\xf3\x84\x00', [63, 126]),  # MPEG-2 立体声：32 + 10 + 21
+])
+def test_global_gain_bits(header, expected):
+    """测试 - global_gain 字段位置"""
+    assert global_gain_bits(parse_header(header)) == expected
+
+
+def make_vbr_frame(tag: bytes, frames: int, size: int) -> bytes:
+    """生成带 Xing/Info（边信息之后）或 VBRI（帧头后 32 字节）信息头的第一帧"""
+    if tag == b'VBRI':
+        body = bytes(32) + tag + bytes(6) + size.to_bytes(4, 'big') + frames.to_bytes(4, 'big')
+    else:
+        body = bytes(32) + tag + (3).to_bytes(4, 'big') + frames.to_bytes(4, 'big') + size.to_bytes(4, 'big')
+    return HEADER_128K + body + bytes(413 - len(body))
+
+
+def test_read_vbr_header():
+    """测试 - 读取 Xing/Info/VBRI 信息头"""
+    header = parse_header(HEADER_128K)
+    assert read_vbr_header(make_vbr_frame(b'Xing', 40, 16680), 0, header) == ('Xing', 40, 16680)
+    assert read_vbr_header(make_vbr_frame(b'Info', 40, 16680), 0, header) == ('Info', 40, 16680)
+    assert read_vbr_header(make_vbr_frame(b'VBRI', 40, 16680), 0, header) == ('VBRI', 40, 16680)
+    assert read_vbr_header(make_frames(count=1), 0, header) is None
+
+
+@pytest.mark.parametrize('data', [
+    make_frames(count=40),  # 固定码率
+    b'ID3\x04\x00\x00\x00\x00\x01\x00' + b'\x00' * 128 + make_frames(count=40),  # ID3v2 标签
+    make_vbr_frame(b'Xing', 40, 41 * 417) + make_frames(count=40),  # Xing 信息头
+    make_vbr_frame(b'Info', 100, 101 * 417) + make_frames(count=100),  # Info 信息头
+])
+def test_mp3_info(tmp_path, data):
+    """测试 - 读取时长与 mutagen 一致"""
+    file = tmp_path / 'test.mp3'
+    file.write_bytes(data)
+    assert mp3_info(str(file)).length == pytest.approx(MP3(str(file)).info.length)
+
+
+def test_mp3_info_special(tmp_path):
+    """测试 - 读取时长 - VBRI 信息头、ID3v1 标签、无效文件"""
+    file = tmp_path / 'test.mp3'
+    file.write_bytes(make_vbr_frame(b'VBRI', 40, 41 * 417) + make_frames(count=40))
+    assert tuple(mp3_info(str(file))) == (pytest.approx(40 * 1152 / 44100), 130899, 40, 'VBRI')
+    file.write_bytes(make_frames(count=40) + b'TAG' + b'\x00' * 125)
+    assert mp3_info(str(file)).length == pytest.approx(40 * 417 * 8 / 128000)
+    for data in [b'', b'\x00' * 1000]:
+        file.write_bytes(data)
+        with pytest.raises(ValueError):
+            mp3_info(str(file))
+
+
+def test_make_info_frame():
+    """测试 - 生成信息帧：去除 CRC 标志，帧长与参照帧相同"""
+    frame = make_info_frame(b'\xff\xfa\x90\x00', 10, 5000, True)
+    header = parse_header(frame[:4])
+    assert not header.protection
+    assert len(frame) == header.frame_length == 417
+    assert read_vbr_header(frame, 0, header) == ('Xing', 10, 5000)
+
+
+
+def test_make_info_frame_short():
+    """测试 - 生成信息帧 - 8kbps 的低采样率帧：MPEG-2.5（12kHz，48 字节）可容纳，MPEG-2（24kHz，24 字节）不足时报错"""
+    frame = make_info_frame(b'\xff\xe3\x14\x00', 10, 5000, False)
+    assert len(frame) == parse_header(frame[:4]).frame_length == 48
+    with pytest.raises(ValueError):
+        make_info_frame(b'\xff\xf3\x14\x00', 10, 5000, False)
+
+@pytest.mark.parametrize('kernel_copy', [True, False])
+def test_clip_mp3(tmp_path, kernel_copy):
+    """测试 - 截取音频帧：保留 ID3v2 标签，写入新的信息帧，时长与 mutagen 读取的一致"""
+    tag = b'ID3\x04\x00\x00\x00\x00\x00\x20' + b'\x00' * 32
+    source = tmp_path / 'source.mp3'
+    source.write_bytes(tag + make_vbr_frame(b'Xing', 100, 101 * 417) + make_frames(count=100))
+    output = tmp_path / 'output.mp3'
+    if kernel_copy:
+        assert clip_mp3(str(source), str(output), 1.0, 2.0) == 39
+    else:  # 系统不支持内核复制时改为普通读写
+        with patch.object(os, 'copy_file_range', side_effect=OSError, create=True), \
+                patch.object(os, 'sendfile', side_effect=OSError, create=True):
+            assert clip_mp3(str(source), str(output), 1.0, 2.0) == 39
+    data = output.read_bytes()
+    assert data.startswith(tag)
+    assert len(data) == len(tag) + 40 * 417
+    assert data[len(tag) + 417:] == make_frames(count=39)
+    info = mp3_info(str(output))
+    assert (info.frames, info.vbr_header) == (39, 'Info')
+    assert info.length == pytest.approx(MP3(str(output)).info.length)
+    assert info.length == pytest.approx(1.0, abs=0.03)
+
+
+def test_clip_mp3_invalid(tmp_path):
+    """测试 - 截取音频帧 - 无效文件、起止时间之间没有音频帧"""
+    file = tmp_path / 'test.mp3'
+    for data, start, end in [(b'', 0, 1), (b'\x00' * 1000, 0, 1), (make_frames(count=10), 5, 10),
+                             (make_frames(count=10), 0.1, 0.1)]:
+        file.write_bytes(data)
+        with pytest.raises(ValueError):
+            clip_mp3(str(file), str(tmp_path / 'output.mp3'), start, end)
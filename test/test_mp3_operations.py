@@ -3,11 +3,35 @@
 # 凌乱之主
 # 2024年07月26日
 import os
-from subprocess import CREATE_NO_WINDOW
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
 import pytest
-from MP3Random.mp3random.mp3_operations import backup, to_mp3, mp3_clip, mp3_gain, _re_name
+from MP3Random.mp3random.manifest import RunManifest
+from MP3Random.mp3random.metadata import MusicInfo, ProbeResult
+from MP3Random.mp3random.mirror import SyncResult
+from MP3Random.mp3random.scanner import MusicEntry
+from MP3Random.mp3random.tools import FFMPEG, MP3GAIN
+from MP3Random.mp3random.mp3_operations import backup, to_mp3, mp3_clip, mp3_gain, mp3_gain_native, _re_name, \
+    clip_mp3, Cancelled, CancelToken
+from MP3Random.test.test_runner import fake_exec
+
+
+def music_info(length):
+    """模拟批量读取音乐信息，所有文件时长均为 length"""
+    return lambda input_path, files, jobs=None: ProbeResult(
+        list(files), [MusicInfo(length, 128000, '无标签', '') for _ in files], {})
+
+
+def not_found(args):
+    """模拟程序未找到"""
+    raise FileNotFoundError(args[0])
+
+
+def scanned(files):
+    """模拟扫描音乐文件夹，返回文件列表 files"""
+    return lambda input_path, *args, **kwargs: [MusicEntry(file, input_path + os.sep + file, 0, 0) for file in files]
 
 
 @pytest.fixture
@@ -50,187 +74,385 @@ def create_music_gain_file(paths):
     return music_file
 
 
-@patch('MP3Random.mp3random.mp3_operations.copytree')
-@patch('MP3Random.mp3random.mp3_operations.rmtree')
-@patch('MP3Random.mp3random.mp3_operations.path.exists')
-def test_backup(mock_exists, mock_rmtree, mock_copytree, mock_logger):
-    """测试 - 备份文件夹"""
-    mock_exists.return_value = True
-    result = backup('/source', '/backup', mock_logger)
-    expected_backup_place = os.path.normpath('/backup/source')
-    mock_rmtree.assert_called_once_with(expected_backup_place)
-    mock_copytree.assert_called_once_with('/source', expected_backup_place)
-    mock_logger.info.assert_any_call(f'删除已存在的备份文件夹：{expected_backup_place}')
-    mock_logger.info.assert_any_call(f'备份文件夹：/source -> {expected_backup_place}')
+def test_backup(tmp_path, mock_logger):
+    """测试 - 增量备份文件夹"""
+    source = tmp_path / 'source'
+    (source / '子文件夹').mkdir(parents=True)
+    (source / 'a.mp3').write_bytes(b'a' * 100)
+    (source / '子文件夹' / 'b.mp3').write_bytes(b'b' * 100)
+    result = backup(str(source), str(tmp_path / 'backup'), mock_logger)
+    expected_backup_place = os.path.normpath(str(tmp_path / 'backup' / 'source'))
+    assert (tmp_path / 'backup' / 'source' / '子文件夹' / 'b.mp3').read_bytes() == b'b' * 100
+    mock_logger.info.assert_any_call(f'备份文件夹：{source} -> {expected_backup_place}（复制 2 个，未改变 0 个，删除 0 个）')
     assert result
 
-    mock_exists.return_value = False
-    mock_rmtree.reset_mock()
-    mock_copytree.reset_mock()
-    result = backup('/source', '/backup', mock_logger)
-    mock_rmtree.assert_not_called()
-    mock_copytree.assert_called_with('/source', expected_backup_place)
-    mock_logger.info.assert_any_call(f'备份文件夹：/source -> {expected_backup_place}')
+    mock_logger.reset_mock()
+    (source / 'a.mp3').unlink()
+    result = backup(str(source), str(tmp_path / 'backup'), mock_logger)
+    mock_logger.info.assert_any_call(f'备份文件夹：{source} -> {expected_backup_place}（复制 0 个，未改变 1 个，删除 1 个）')
+    assert not (tmp_path / 'backup' / 'source' / 'a.mp3').exists()
     assert result
 
 
-@patch('MP3Random.mp3random.mp3_operations.copytree')
-@patch('MP3Random.mp3random.mp3_operations.rmtree')
-@patch('MP3Random.mp3random.mp3_operations.path.exists')
-def test_backup_no_write_permission(mock_exists, mock_rmtree, mock_copytree, mock_logger):
+@patch('MP3Random.mp3random.mp3_operations.sync_tree')
+def test_backup_no_write_permission(mock_sync, mock_logger):
     """测试 - 备份文件夹 - 无写入权限"""
-    mock_exists.return_value = True
-    mock_copytree.side_effect = PermissionError("No write permission")
+    mock_sync.side_effect = PermissionError("No write permission")
     result = backup('/source', '/backup', mock_logger)
-    mock_rmtree.assert_called_once()
+    mock_sync.assert_called_once()
     mock_logger.error.assert_called_once_with('备份文件夹 /source 失败：No write permission')
     assert not result
 
 
-@patch('MP3Random.mp3random.mp3_operations.copytree')
-@patch('MP3Random.mp3random.mp3_operations.rmtree')
-@patch('MP3Random.mp3random.mp3_operations.path.exists')
-def test_backup_source_not_exist(mock_exists, mock_rmtree, mock_copytree, mock_logger):
+def test_backup_source_not_exist(tmp_path, mock_logger):
     """测试 - 备份文件夹 - 源文件夹不存在"""
-    mock_exists.return_value = False
-    mock_copytree.side_effect = FileNotFoundError("No such file or directory")
-    result = backup('/nonexistent_source', '/backup', mock_logger)
-    expected_backup_place = os.path.normpath('/backup/nonexistent_source')
-    mock_rmtree.assert_not_called()
-    mock_copytree.assert_called_once_with('/nonexistent_source', expected_backup_place)
-    mock_logger.error.assert_called_once_with('备份文件夹 /nonexistent_source 失败：No such file or directory')
+    source = str(tmp_path / 'nonexistent_source')
+    result = backup(source, str(tmp_path / 'backup'), mock_logger)
+    assert mock_logger.error.call_args.args[0].startswith(f'备份文件夹 {source} 失败：')
+    assert not (tmp_path / 'backup').exists()
     assert not result
 
 
-@patch('MP3Random.mp3random.mp3_operations.copytree')
-@patch('MP3Random.mp3random.mp3_operations.rmtree')
-@patch('MP3Random.mp3random.mp3_operations.path.exists')
-def test_backup_io_error(mock_exists, mock_rmtree, mock_copytree, mock_logger):
+@patch('MP3Random.mp3random.mp3_operations.sync_tree')
+def test_backup_io_error(mock_sync, mock_logger):
     """测试 - 备份文件夹 - I/O 错误"""
-    mock_exists.return_value = True
-    mock_copytree.side_effect = IOError("I/O error")
+    mock_sync.side_effect = IOError("I/O error")
     result = backup('/source', '/backup', mock_logger)
-    mock_rmtree.assert_called_once()
     mock_logger.error.assert_called_once_with('备份文件夹 /source 失败：I/O error')
     assert not result
+    # 部分文件复制失败
+    mock_logger.reset_mock()
+    mock_sync.side_effect = None
+    mock_sync.return_value = SyncResult(3, 5, 0, 2)
+    assert not backup('/source', '/backup', mock_logger)
+    mock_logger.error.assert_called_once_with('备份文件夹 /source 失败：2 个文件复制失败')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.wav'])
-@patch('MP3Random.mp3random.mp3_operations.run')
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test.wav']))
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
 @patch('MP3Random.mp3random.mp3_operations.remove')
-def test_to_mp3(mock_remove, mock_run, mock_listdir, mock_logger, paths, create_old_file):
+def test_to_mp3(mock_remove, mock_exec, mock_scan, mock_logger, paths, create_old_file):
     """测试 - 转换为 MP3"""
     old_path, music_path, backup_path = paths
     old_file = create_old_file
-    mock_run.return_value.returncode = 0
+    new_file = music_path / 'test.mp3'
 
     to_mp3(str(old_path), str(music_path), mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"ffmpeg.exe" -i "{old_file}" -b:a 128k "{music_path}\\test.mp3" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [FFMPEG, '-i', str(old_file), '-b:a', '128k', str(new_file), '-y']
     mock_remove.assert_called_once_with(os.path.normpath(old_file))
-    mock_logger.info.assert_any_call(f'转换文件：{old_file} -> {music_path}\\test.mp3')
+    mock_logger.info.assert_any_call(f'转换文件：{old_file} -> {new_file}')
     mock_logger.info.assert_any_call(f'删除旧文件：{old_file}')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=[])
-def test_to_mp3_no_files(mock_listdir, mock_logger, paths):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned([]))
+def test_to_mp3_no_files(mock_scan, mock_logger, paths):
     """测试 - 转换为 MP3 - 无文件"""
     old_path, music_path, backup_path = paths
     to_mp3(str(old_path), str(music_path), mock_logger)
     mock_logger.warning.assert_called_once_with(f'音乐文件夹 {old_path} 为空')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.wav'])
-@patch('MP3Random.mp3random.mp3_operations.run', side_effect=FileNotFoundError)
-def test_to_mp3_ffmpeg_not_found(mock_run, mock_listdir, mock_logger, paths, create_old_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test.wav']))
+def test_to_mp3_ffmpeg_not_found(mock_scan, mock_logger, paths, create_old_file):
     """测试 - 转换为 MP3 - ffmpeg.exe 未找到"""
     old_path, music_path, backup_path = paths
-    old_file = create_old_file
 
-    to_mp3(str(old_path), str(music_path), mock_logger)
+    with patch('asyncio.create_subprocess_exec', new=fake_exec(side_effect=not_found)) as mock_exec:
+        to_mp3(str(old_path), str(music_path), mock_logger, jobs=1)
 
-    mock_run.assert_called_once_with(
-        f'"ffmpeg.exe" -i "{old_file}" -b:a 128k "{music_path}\\test.mp3" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
     mock_logger.error.assert_called_once_with(
         f'转换失败：ffmpeg.exe 未找到'
     )
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.wav'])
-@patch('MP3Random.mp3random.mp3_operations.run')
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test file "1".wav']))
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
 @patch('MP3Random.mp3random.mp3_operations.remove')
-def test_to_mp3_ffmpeg_path_no_remove(mock_remove, mock_run, mock_listdir, mock_logger, paths, create_old_file):
-    """测试 - 转换为 MP3 - 不删除原文件"""
+def test_to_mp3_ffmpeg_path_no_remove(mock_remove, mock_exec, mock_scan, mock_logger, paths):
+    """测试 - 转换为 MP3 - 不删除原文件，路径中的空格和引号无需转义"""
     old_path, music_path, backup_path = paths
-    old_file = create_old_file
-    mock_run.return_value.returncode = 0
+    old_file = old_path / 'test file "1".wav'
+    new_file = music_path / 'test file "1".mp3'
     ffmpeg_path = 'adcf 5/ffmpeg_15sd1_ds.exe'
 
-    to_mp3(str(old_path), str(music_path), mock_logger, ffmpeg_path, False)
+    to_mp3(str(old_path), str(music_path), mock_logger, None, ffmpeg_path, False)
 
-    mock_run.assert_called_once_with(
-        f'"{ffmpeg_path}" -i "{old_file}" -b:a 128k "{music_path}\\test.mp3" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
-    mock_logger.info.assert_any_call(f'转换文件：{old_file} -> {music_path}\\test.mp3')
+    assert list(mock_exec.call_args.args) == [ffmpeg_path, '-i', str(old_file), '-b:a', '128k', str(new_file), '-y']
+    mock_logger.info.assert_any_call(f'转换文件：{old_file} -> {new_file}')
     mock_remove.assert_not_called()
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.wav'])
-@patch('MP3Random.mp3random.mp3_operations.run', return_value=MagicMock(returncode=1, stderr="Error"))
-def test_to_mp3_conversion_fail(mock_run, mock_listdir, mock_logger, paths, create_old_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test.wav']))
+@patch('asyncio.create_subprocess_exec', new=fake_exec(returncode=1, stderr=b'Error\n'))
+def test_to_mp3_conversion_fail(mock_scan, mock_logger, paths, create_old_file):
     """测试 - 转换为 MP3 - 转换失败"""
     old_path, music_path, backup_path = paths
     old_file = create_old_file
 
     to_mp3(str(old_path), str(music_path), mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"ffmpeg.exe" -i "{old_file}" -b:a 128k "{music_path}\\test.mp3" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
     mock_logger.error.assert_called_once_with(
-        f'转换失败：{old_file} -> {music_path}\\test.mp3， Error'
+        f'转换失败：{old_file} -> {music_path / "test.mp3"}， Error'
     )
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test(30.5-45).mp3'])
-@patch('MP3Random.mp3random.mp3_operations.MP3')
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned([f'test{i}.wav' for i in range(8)]))
+@patch('MP3Random.mp3random.mp3_operations.remove')
+def test_to_mp3_parallel(mock_remove, mock_scan, mock_logger, paths):
+    """测试 - 转换为 MP3 - 并行转换"""
+    old_path, music_path, backup_path = paths
+    process_inner_list = [MagicMock() for _ in range(4)]
+
+    with patch('asyncio.create_subprocess_exec', new=fake_exec(delay=0.1)) as mock_exec:
+        start_time = time.perf_counter()
+        to_mp3(str(old_path), str(music_path), mock_logger, process_inner_list, jobs=1)
+        serial_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        to_mp3(str(old_path), str(music_path), mock_logger, process_inner_list, jobs=8)
+        parallel_time = time.perf_counter() - start_time
+
+    print(f'\t串行耗时：{serial_time:.4f}秒，并行耗时：{parallel_time:.4f}秒')
+    assert mock_exec.call_count == 16
+    assert mock_remove.call_count == 16
+    assert parallel_time < serial_time / 4
+    assert process_inner_list[1].text == '8/8'
+
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['long.wav', 'test(30-90).wav']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
+def test_to_mp3_progress(mock_music_info, mock_scan, mock_logger, paths):
+    """测试 - 转换为 MP3 - 按 ffmpeg.exe 输出的“time=”连续更新进度，切片时按切片长度计算"""
+    old_path, music_path, backup_path = paths
+    mock_music_info.side_effect = music_info(120)
+    progress = MagicMock()
+    stderr = b'Duration: 00:02:00.00, start: 0\nsize=1kB time=00:00:30.00 bitrate=128k\r'
+
+    with patch('asyncio.create_subprocess_exec', new=fake_exec(stderr=stderr)):
+        to_mp3(str(old_path), str(music_path), mock_logger, remove_flag=False, jobs=1, clip_flag=True,
+               process_inner_list=progress)
+
+    values = [call.args[0] for call in progress.call_args_list]
+    # 30 / 120、30 / (90 - 30)；run_batch 在其事件循环线程中，一个进程结束即启动下一个（jobs=1 时也是如此），
+    # 不等待调用方处理结果，因此第二个文件可能在第一个文件的结果被处理前启动，此时其进度叠加在 0.25 上，
+    # 只检查首尾的值、单调递增及第二个文件的进度
+    assert values[:2] == [0, 0.25] and values[-1] == 2
+    assert values == sorted(values)
+    assert 1.5 in values or 0.75 in values
+
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['slow.wav', 'fast.wav']))
+def test_to_mp3_timeout(mock_scan, mock_logger, paths):
+    """测试 - 转换为 MP3 - 超时时终止该文件的转换并删除未完成的输出文件，继续转换其他文件"""
+    old_path, music_path, backup_path = paths
+
+    def start(args):
+        open(args[-2], 'wb').close()  # 写入部分输出文件
+
+    with patch('asyncio.create_subprocess_exec', new=fake_exec(side_effect=start, hang=lambda args: 'slow' in args[2])):
+        to_mp3(str(old_path), str(music_path), mock_logger, remove_flag=False, timeout=0.3)
+
+    assert os.listdir(music_path) == ['fast.mp3']
+    mock_logger.info.assert_any_call(f'转换文件：{old_path / "fast.wav"} -> {music_path / "fast.mp3"}')
+    assert mock_logger.error.call_args.args[0].startswith(f'转换超时：{old_path / "slow.wav"}')
+
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(30.5-45).wav', 'plain.flac', 'name(---).wav']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
+@patch('MP3Random.mp3random.mp3_operations.ProcessPoolExecutor', ThreadPoolExecutor)
+@patch('MP3Random.mp3random.mp3_operations.analyze_source')
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
+def test_to_mp3_fused(mock_exec, mock_analyze_source, mock_music_info, mock_scan, mock_logger, paths):
+    """测试 - 转换为 MP3 - 同时切片和调整音量（按切片部分的响度线性调整）"""
+    old_path, music_path, backup_path = paths
+    mock_music_info.side_effect = music_info(60)
+    loudness = {'test(30.5-45).wav': -18.0, 'plain.flac': -9.0, 'name(---).wav': ValueError('无法识别的音乐文件')}
+
+    def analyze(file_path, ffmpeg_path, sta, end):
+        result = loudness[os.path.basename(file_path)]
+        if isinstance(result, Exception):
+            raise result
+        return result
+    mock_analyze_source.side_effect = analyze
+    manifest = RunManifest(str(music_path))
+
+    to_mp3(str(old_path), str(music_path), mock_logger, None, remove_flag=False, manifest=manifest,
+           clip_flag=True, db=95)
+
+    mock_analyze_source.assert_any_call(str(old_path / 'test(30.5-45).wav'), FFMPEG, 30.5, 45.0)
+    mock_analyze_source.assert_any_call(str(old_path / 'plain.flac'), FFMPEG, None, None)
+    commands = sorted(list(call.args) for call in mock_exec.call_args_list)
+    assert commands == sorted([
+        [FFMPEG, '-ss', '30.5', '-to', '45.0', '-i', str(old_path / 'test(30.5-45).wav'), '-af', 'volume=6.0dB',
+         '-b:a', '128k', str(music_path / 'test.mp3'), '-y'],
+        [FFMPEG, '-i', str(old_path / 'plain.flac'), '-af', 'volume=-3.0dB', '-b:a', '128k',
+         str(music_path / 'plain.mp3'), '-y'],
+        [FFMPEG, '-i', str(old_path / 'name(---).wav'), '-b:a', '128k', str(music_path / 'name.mp3'), '-y'],
+    ])
+    mock_logger.warning.assert_any_call('无法分析响度，不调整音量：name(---).wav，无法识别的音乐文件')
+    # 转换时已调整音量的文件记录在运行记录中，之后的音量调整过程跳过；无法分析响度的文件仍需调整
+    gained = manifest.stages['mp3_gain']
+    assert sorted(gained) == sorted(str(music_path / name) for name in ['test.mp3', 'plain.mp3'])
+    assert all(record['params'] == {'db': 95} for record in gained.values())
+
+
+def touch_output(args):
+    """模拟 ffmpeg.exe 生成输出文件（参数列表的倒数第二项）"""
+    open(args[-2], 'wb').close()
+
+
+@patch('asyncio.create_subprocess_exec', new_callable=lambda: fake_exec(side_effect=touch_output))
+def test_to_mp3_manifest(mock_exec, mock_logger, paths):
+    """测试 - 转换为 MP3 - 跳过已转换且未改变的文件"""
+    old_path, music_path, backup_path = paths
+    for name in ['test1.wav', 'test2.wav']:
+        (old_path / name).write_bytes(b'RIFF')
+    manifest = RunManifest(str(music_path))
+
+    to_mp3(str(old_path), str(music_path), mock_logger, None, remove_flag=False, manifest=manifest)
+    assert mock_exec.call_count == 2
+
+    mock_exec.reset_mock()
+    (old_path / 'test2.wav').write_bytes(b'RIFF-changed')
+    to_mp3(str(old_path), str(music_path), mock_logger, None, remove_flag=False, manifest=manifest)
+    mock_exec.assert_called_once()
+    assert str(old_path / 'test2.wav') in mock_exec.call_args.args
+    mock_logger.info.assert_any_call('跳过已转换的文件：1 个')
+
+    mock_exec.reset_mock()
+    to_mp3(str(old_path), str(music_path), mock_logger, None, remove_flag=False, manifest=manifest)
+    mock_exec.assert_not_called()
+    mock_logger.info.assert_any_call('无需转换')
+
+
+@patch('asyncio.create_subprocess_exec', new_callable=lambda: fake_exec(side_effect=touch_output))
+def test_to_mp3_manifest_output_removed(mock_exec, mock_logger, paths):
+    """测试 - 转换为 MP3 - 转换后的文件已被删除（如随机排列后删除转换后音乐目录）时重新转换"""
+    old_path, music_path, backup_path = paths
+    for name in ['test1.wav', 'test2.wav']:
+        (old_path / name).write_bytes(b'RIFF')
+    manifest = RunManifest(str(music_path))
+    to_mp3(str(old_path), str(music_path), mock_logger, None, remove_flag=False, manifest=manifest)
+    assert mock_exec.call_count == 2
+
+    mock_exec.reset_mock()
+    (music_path / 'test1.mp3').unlink()
+    to_mp3(str(old_path), str(music_path), mock_logger, None, remove_flag=False, manifest=manifest)
+    mock_exec.assert_called_once()
+    assert str(old_path / 'test1.wav') in mock_exec.call_args.args
+    assert (music_path / 'test1.mp3').exists()
+
+    mock_exec.reset_mock()
+    for name in os.listdir(music_path):
+        os.remove(music_path / name)
+    to_mp3(str(old_path), str(music_path), mock_logger, None, remove_flag=False, manifest=manifest)
+    assert mock_exec.call_count == 2
+
+
+def test_to_mp3_cancel(mock_logger, paths):
+    """测试 - 转换为 MP3 - 取消时终止正在运行的转换，删除未完成的输出文件，已完成的文件写入运行记录"""
+    old_path, music_path, backup_path = paths
+    for i in range(6):
+        (old_path / f'test{i}.wav').write_bytes(b'RIFF')
+    cancel_token = CancelToken()
+    manifest = RunManifest(str(music_path))
+    calls = []
+
+    def start(args):
+        new = args[-2]
+        open(new, 'wb').close()  # 写入部分输出文件
+        calls.append(new)
+        if len(calls) == 3:  # 转换第 3 个文件时取消
+            cancel_token.cancel()
+
+    with patch('asyncio.create_subprocess_exec', new=fake_exec(side_effect=start)):
+        with pytest.raises(Cancelled):
+            to_mp3(str(old_path), str(music_path), mock_logger, remove_flag=False, jobs=1, manifest=manifest,
+                   cancel_token=cancel_token)
+    assert len(calls) == 3
+    assert sorted(os.listdir(music_path)) == sorted(os.path.basename(new) for new in calls[:2])
+    assert len(manifest.stages['to_mp3']) == 2
+    mock_logger.warning.assert_called_once_with('格式转换已取消：完成 2 / 6 个文件')
+
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(30.5-45).mp3']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
 @patch('MP3Random.mp3random.mp3_operations.copy')
-@patch('MP3Random.mp3random.mp3_operations.run')
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
 @patch('MP3Random.mp3random.mp3_operations.remove')
-def test_mp3_clip(mock_remove, mock_run, mock_copy, mock_mp3, mock_listdir, mock_logger, paths, create_music_file):
+def test_mp3_clip(mock_remove, mock_exec, mock_copy, mock_music_info, mock_scan, mock_logger, paths, create_music_file):
     """测试 - 切片 MP3"""
     music_path = paths[1]
     old_file = os.path.normpath(create_music_file)
-    mock_mp3.return_value.info.length = 60
-    mock_run.return_value.returncode = 0
+    mock_music_info.side_effect = music_info(60)
 
     mp3_clip(str(music_path), str(music_path), mock_logger)
 
     mock_copy.assert_not_called()
-    mock_run.assert_called_once_with(
-        f'"ffmpeg.exe" -i "{old_file}" -vn -acodec copy -ss 30.5 -to 45.0 "{music_path / "test.mp3"}" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [FFMPEG, '-i', str(old_file), '-vn', '-acodec', 'copy', '-ss', '30.5', '-to',
+                                              '45.0', str(music_path / 'test.mp3'), '-y']
     mock_remove.assert_called_once_with(old_file)
     mock_logger.info.assert_any_call(f'切片文件：{old_file} -> {music_path / "test.mp3"}')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test(---).mp3'])
-@patch('MP3Random.mp3random.mp3_operations.MP3')
+def test_mp3_clip_native(mock_logger, paths):
+    """测试 - 切片 MP3 - 直接截取音频帧，不启动 ffmpeg.exe"""
+    music_path = paths[1]
+    (music_path / 'test(1-2).mp3').write_bytes((b'\xff\xfb\x90\x00' + bytes(413)) * 100)
+    with patch('asyncio.create_subprocess_exec', new_callable=fake_exec) as mock_exec:
+        mp3_clip(str(music_path), str(music_path), mock_logger)
+    mock_exec.assert_not_called()
+    assert os.listdir(music_path) == ['test.mp3']
+    assert os.path.getsize(music_path / 'test.mp3') == 40 * 417
+    mock_logger.error.assert_not_called()
+
+
+
+def test_mp3_clip_native_os_error(mock_logger, paths):
+    """测试 - 切片 MP3 - 直接截取音频帧时读写失败，记录错误后继续切片其他文件"""
+    music_path = paths[1]
+    for name in ['a(1-2).mp3', 'b(1-2).mp3']:
+        (music_path / name).write_bytes((b'\xff\xfb\x90\x00' + bytes(413)) * 100)
+
+    def clip(old, new, sta, end):
+        if 'a(1-2)' in old:
+            open(new, 'wb').close()  # 写入部分输出文件
+            raise OSError(28, 'No space left on device')
+        return clip_mp3(old, new, sta, end)
+
+    with patch('MP3Random.mp3random.mp3_operations.clip_mp3', side_effect=clip), \
+            patch('asyncio.create_subprocess_exec', new_callable=fake_exec) as mock_exec:
+        mp3_clip(str(music_path), str(music_path), mock_logger)
+    mock_exec.assert_not_called()
+    assert sorted(os.listdir(music_path)) == ['a(1-2).mp3', 'b.mp3']
+    mock_logger.error.assert_called_once()
+    assert mock_logger.error.call_args.args[0].startswith(f'切片失败：{music_path / "a(1-2).mp3"} -> {music_path / "a.mp3"}')
+
+def test_mp3_clip_unreadable(mock_logger, paths):
+    """测试 - 切片 MP3 - 无法读取音乐信息的文件报告后跳过，不影响其他文件"""
+    music_path = paths[1]
+    (music_path / 'test(1-2).mp3').write_bytes((b'\xff\xfb\x90\x00' + bytes(413)) * 100)
+    (music_path / 'bad(1-2).mp3').write_bytes(b'not an mp3' * 10)
+    with patch('asyncio.create_subprocess_exec', new_callable=fake_exec) as mock_exec:
+        mp3_clip(str(music_path), str(music_path), mock_logger, jobs=2)
+    mock_exec.assert_not_called()
+    assert sorted(os.listdir(music_path)) == ['bad(1-2).mp3', 'test.mp3']
+    mock_logger.error.assert_called_once()
+    assert mock_logger.error.call_args.args[0].startswith('切片失败：bad(1-2).mp3，无法读取音乐信息：')
+
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(---).mp3']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
 @patch('MP3Random.mp3random.mp3_operations.copy')
 @patch('MP3Random.mp3random.mp3_operations.remove')
-def test_mp3_clip_rename(mock_remove, mock_copy, mock_mp3, mock_listdir, mock_logger, paths, create_music_file):
+def test_mp3_clip_rename(mock_remove, mock_copy, mock_music_info, mock_scan, mock_logger, paths, create_music_file):
     """测试 - 切片 MP3 - 重命名"""
     music_path = paths[1]
     old_file = os.path.normpath(create_music_file)
-    mock_mp3.return_value.info.length = 20
+    mock_music_info.side_effect = music_info(20)
 
     mp3_clip(str(music_path), str(music_path), mock_logger)
 
@@ -240,175 +462,174 @@ def test_mp3_clip_rename(mock_remove, mock_copy, mock_mp3, mock_listdir, mock_lo
     mock_logger.info.assert_any_call(f'重命名文件：{old_file} -> {music_path / "test.mp3"}')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test(30.5-45).mp3'])
-@patch('MP3Random.mp3random.mp3_operations.MP3')
-def test_mp3_clip_rename(mock_mp3, mock_listdir, mock_logger, paths, create_music_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(30.5-45).mp3']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
+def test_mp3_clip_rename(mock_music_info, mock_scan, mock_logger, paths, create_music_file):
     """测试 - 切片 MP3 - 无需切片"""
     music_path = paths[1]
-    mock_mp3.return_value.info.length = 20
+    mock_music_info.side_effect = music_info(20)
 
     mp3_clip(str(music_path), str(music_path), mock_logger)
 
     mock_logger.info.assert_any_call(f'无需切片')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test(30.5-45).mp3'])
-@patch('MP3Random.mp3random.mp3_operations.MP3')
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(30.5-45).mp3']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
 @patch('MP3Random.mp3random.mp3_operations.copy')
-@patch('MP3Random.mp3random.mp3_operations.run')
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
 @patch('MP3Random.mp3random.mp3_operations.remove')
-def test_mp3_clip_ffmpeg_path_no_remove(mock_remove, mock_run, mock_copy, mock_mp3, mock_listdir, mock_logger, paths,
+def test_mp3_clip_ffmpeg_path_no_remove(mock_remove, mock_exec, mock_copy, mock_music_info, mock_scan, mock_logger, paths,
                                         create_music_file):
     """测试 - 切片 MP3 - 不删除原文件"""
     music_path = paths[1]
     old_file = os.path.normpath(create_music_file)
-    mock_mp3.return_value.info.length = 60
-    mock_run.return_value.returncode = 0
+    mock_music_info.side_effect = music_info(60)
     ffmpeg_path = 'adcf 5/ffmpeg_15sd1_ds.exe'
 
-    mp3_clip(str(music_path), str(music_path), mock_logger, ffmpeg_path, False)
+    mp3_clip(str(music_path), str(music_path), mock_logger, None, ffmpeg_path, False)
 
     mock_copy.assert_not_called()
-    mock_run.assert_called_once_with(
-        f'"{ffmpeg_path}" -i "{old_file}" -vn -acodec copy -ss 30.5 -to 45.0 "{music_path / "test.mp3"}" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [ffmpeg_path, '-i', str(old_file), '-vn', '-acodec', 'copy', '-ss', '30.5', '-to',
+                                              '45.0', str(music_path / 'test.mp3'), '-y']
     mock_remove.assert_not_called()
     mock_logger.info.assert_any_call(f'切片文件：{old_file} -> {music_path / "test.mp3"}')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test(30.5-45).mp3'])
-@patch('MP3Random.mp3random.mp3_operations.MP3')
-@patch('MP3Random.mp3random.mp3_operations.run')
-def test_mp3_clip_error(mock_run, mock_mp3, mock_listdir, mock_logger, paths, create_music_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(30.5-45).mp3']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
+@patch('asyncio.create_subprocess_exec',
+       new_callable=lambda: fake_exec(returncode=4294967274, stderr=b'Error: Invalid argument\n'))
+def test_mp3_clip_error(mock_exec, mock_music_info, mock_scan, mock_logger, paths, create_music_file):
     """测试 - 切片 MP3 - 错误"""
     music_path = paths[1]
     old_file = os.path.normpath(create_music_file)
-    mock_mp3.return_value.info.length = 60
-    mock_run.return_value.returncode = 4294967274
-    mock_run.return_value.stderr = "Error: Invalid argument"
+    mock_music_info.side_effect = music_info(60)
 
     mp3_clip(str(music_path), str(music_path), mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"ffmpeg.exe" -i "{old_file}" -vn -acodec copy -ss 30.5 -to 45.0 "{music_path / "test.mp3"}" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [FFMPEG, '-i', str(old_file), '-vn', '-acodec', 'copy', '-ss', '30.5', '-to',
+                                              '45.0', str(music_path / 'test.mp3'), '-y']
     mock_logger.error.assert_called_once_with(
         f'切片失败：{old_file} -> {music_path / "test.mp3"}， Error: Invalid argument')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test(30.5-45).mp3'])
-@patch('MP3Random.mp3random.mp3_operations.MP3')
-@patch('MP3Random.mp3random.mp3_operations.run', side_effect=FileNotFoundError)
-def test_mp3_clip_ffmpeg_not_found(mock_run, mock_mp3, mock_listdir, mock_logger, paths, create_music_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(30.5-45).mp3']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
+@patch('asyncio.create_subprocess_exec', new_callable=lambda: fake_exec(side_effect=not_found))
+def test_mp3_clip_ffmpeg_not_found(mock_exec, mock_music_info, mock_scan, mock_logger, paths, create_music_file):
     """测试 - 切片 MP3 - ffmpeg.exe 未找到"""
     music_path = paths[1]
     old_file = create_music_file
-    mock_mp3.return_value.info.length = 60
+    mock_music_info.side_effect = music_info(60)
 
     mp3_clip(str(music_path), str(music_path), mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"ffmpeg.exe" -i "{old_file}" -vn -acodec copy -ss 30.5 -to 45.0 "{music_path / "test.mp3"}" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [FFMPEG, '-i', str(old_file), '-vn', '-acodec', 'copy', '-ss', '30.5', '-to',
+                                              '45.0', str(music_path / 'test.mp3'), '-y']
     mock_logger.error.assert_called_once_with(
         f'切片失败：ffmpeg.exe 未找到'
     )
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test(30.5-45).mp3'])
-@patch('MP3Random.mp3random.mp3_operations.MP3')
-@patch('MP3Random.mp3random.mp3_operations.run', return_value=MagicMock(returncode=1, stderr="Error"))
-def test_mp3_clip_conversion_fail(mock_run, mock_mp3, mock_listdir, mock_logger, paths, create_music_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test(30.5-45).mp3']))
+@patch('MP3Random.mp3random.mp3_operations.probe_music')
+@patch('asyncio.create_subprocess_exec', new_callable=lambda: fake_exec(returncode=1, stderr=b'Error\n'))
+def test_mp3_clip_conversion_fail(mock_exec, mock_music_info, mock_scan, mock_logger, paths, create_music_file):
     """测试 - 切片 MP3 - 切片失败"""
     music_path = paths[1]
     old_file = create_music_file
-    mock_mp3.return_value.info.length = 60
+    mock_music_info.side_effect = music_info(60)
 
     mp3_clip(str(music_path), str(music_path), mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"ffmpeg.exe" -i "{old_file}" -vn -acodec copy -ss 30.5 -to 45.0 "{music_path / "test.mp3"}" -y',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [FFMPEG, '-i', str(old_file), '-vn', '-acodec', 'copy', '-ss', '30.5', '-to',
+                                              '45.0', str(music_path / 'test.mp3'), '-y']
     mock_logger.error.assert_called_once_with(
         f'切片失败：{old_file} -> {music_path / "test.mp3"}， Error'
     )
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.mp3'])
-@patch('MP3Random.mp3random.mp3_operations.run')
-def test_mp3_gain(mock_run, mock_listdir, mock_logger, paths, create_music_gain_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test.mp3']))
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
+def test_mp3_gain(mock_exec, mock_scan, mock_logger, paths, create_music_gain_file):
     """测试 - 调整音量"""
     music_path, backup_path = paths[1], paths[2]
     music_file = os.path.normpath(create_music_gain_file)
-    mock_run.return_value.returncode = 0
 
     mp3_gain(str(music_path), 95, mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"mp3gain.exe" /d 6 /c /r "{music_file}"',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [MP3GAIN, '-d', '6', '-c', '-r', str(music_file)]
     mock_logger.info.assert_any_call(f'调整音量：test.mp3 -> 95dB')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.mp3'])
-@patch('MP3Random.mp3random.mp3_operations.run')
-def test_mp3_gain_mp3gain_path(mock_run, mock_listdir, mock_logger, paths, create_music_gain_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test.mp3']))
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
+def test_mp3_gain_mp3gain_path(mock_exec, mock_scan, mock_logger, paths, create_music_gain_file):
     """测试 - 调整音量 - mp3gain_path"""
     music_path, backup_path = paths[1], paths[2]
     music_file = os.path.normpath(create_music_gain_file)
-    mock_run.return_value.returncode = 0
     mp3gain_path = 'adcf 5/mp3gain_15sd1_ds.exe'
 
-    mp3_gain(str(music_path), 95, mock_logger, mp3gain_path)
+    mp3_gain(str(music_path), 95, mock_logger, None, mp3gain_path)
 
-    mock_run.assert_called_once_with(
-        f'"{mp3gain_path}" /d 6 /c /r "{music_file}"',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [mp3gain_path, '-d', '6', '-c', '-r', str(music_file)]
     mock_logger.info.assert_any_call(f'调整音量：test.mp3 -> 95dB')
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.mp3'])
-@patch('MP3Random.mp3random.mp3_operations.run', side_effect=FileNotFoundError)
-def test_mp3_gain_mp3gain_not_found(mock_run, mock_listdir, mock_logger, paths, create_music_gain_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test.mp3']))
+@patch('asyncio.create_subprocess_exec', new_callable=lambda: fake_exec(side_effect=not_found))
+def test_mp3_gain_mp3gain_not_found(mock_exec, mock_scan, mock_logger, paths, create_music_gain_file):
     """测试 - 调整音量 - mp3gain.exe 未找到"""
     music_path, backup_path = paths[1], paths[2]
     music_file = create_music_gain_file
 
     mp3_gain(str(music_path), 95, mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"mp3gain.exe" /d 6 /c /r "{music_file}"',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [MP3GAIN, '-d', '6', '-c', '-r', str(music_file)]
     mock_logger.error.assert_called_once_with(
         f'调整音量失败：mp3gain.exe 未找到'
     )
 
 
-@patch('MP3Random.mp3random.mp3_operations.listdir', return_value=['test.mp3'])
-@patch('MP3Random.mp3random.mp3_operations.run', return_value=MagicMock(returncode=1, stderr="Error"))
-def test_mp3_gain_fail(mock_run, mock_listdir, mock_logger, paths, create_music_gain_file):
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test.mp3']))
+@patch('asyncio.create_subprocess_exec', new_callable=lambda: fake_exec(returncode=1, stderr=b'Error\n'))
+def test_mp3_gain_fail(mock_exec, mock_scan, mock_logger, paths, create_music_gain_file):
     """测试 - 调整音量 - 失败"""
     music_path, backup_path = paths[1], paths[2]
     music_file = create_music_gain_file
 
     mp3_gain(str(music_path), 95, mock_logger)
 
-    mock_run.assert_called_once_with(
-        f'"mp3gain.exe" /d 6 /c /r "{music_file}"',
-        capture_output=True, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW
-    )
+    mock_exec.assert_called_once()
+    assert list(mock_exec.call_args.args) == [MP3GAIN, '-d', '6', '-c', '-r', str(music_file)]
     mock_logger.error.assert_called_once_with(
         f'调整音量失败：{os.path.basename(music_file)} -> 95dB， Error'
     )
 
 
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['a.mp3', 'slow.mp3', 'b.mp3']))
+def test_mp3_gain_parallel_timeout(mock_scan, mock_logger, paths):
+    """测试 - 调整音量 - 多个 mp3gain.exe 并行运行，超时的文件报告后跳过，不影响其他文件"""
+    music_path = paths[1]
+    manifest = RunManifest(str(music_path))
+    with patch('asyncio.create_subprocess_exec', new=fake_exec(hang=lambda args: 'slow' in args[-1])) as mock_exec:
+        mp3_gain(str(music_path), 95, mock_logger, manifest=manifest, jobs=3, timeout=0.5)
+    assert mock_exec.call_count == 3
+    mock_logger.info.assert_any_call('调整音量：a.mp3 -> 95dB')
+    mock_logger.info.assert_any_call('调整音量：b.mp3 -> 95dB')
+    mock_logger.error.assert_called_once()
+    assert mock_logger.error.call_args.args[0].startswith('调整音量失败：slow.mp3 -> 95dB， 运行超时')
+    assert sorted(os.path.basename(p) for p in manifest.stages['mp3_gain']) == ['a.mp3', 'b.mp3']
+
 @pytest.mark.parametrize("files, expected_clip, expected_rename", [
     ([("song（30.5-10.0).mp3", 60.0)], [["song（30.5-10.0).mp3", "song.mp3", 10.0, 30.5]], []),
     ([("song.mp3", 60.0)], [], []),  # no need to clip or rename
@@ -437,3 +658,51 @@ def test_re_name(files, expected_clip, expected_rename):
     clip_need, rename_need = _re_name(files)
     assert clip_need == expected_clip
     assert rename_need == expected_rename
+
+
+def test_re_name_performance():
+    """测试 - 切片和重命名文件名称提取 - 10 万个文件、1 万个名称各重复 10 次"""
+    files = [(f"歌曲{i % 10000}(1-2).mp3", 60.0) for i in range(100000)]
+    start_time = time.perf_counter()
+    clip_need, rename_need = _re_name(files)
+    use_time = time.perf_counter() - start_time
+    assert len({name for _, name, _, _ in clip_need}) == 100000
+    assert clip_need[-1][1] == f"歌曲9999{'_2' * 9}.mp3"
+    assert use_time < 5
+
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test1.mp3', 'test2.mp3', 'test3.mp3']))
+@patch('MP3Random.mp3random.mp3_operations.ProcessPoolExecutor', ThreadPoolExecutor)
+@patch('MP3Random.mp3random.mp3_operations.apply_gain')
+@patch('MP3Random.mp3random.mp3_operations.analyze_file')
+def test_mp3_gain_native(mock_analyze_file, mock_apply_gain, mock_scan, mock_logger, paths):
+    """测试 - 调整音量 - 内置响度分析"""
+    music_path = paths[1]
+    loudness = {'test1.mp3': -12.0, 'test2.mp3': -18.0, 'test3.mp3': float('-inf')}
+    mock_analyze_file.side_effect = lambda file_path, ffmpeg_path: loudness[os.path.basename(file_path)]
+
+    mp3_gain_native(str(music_path), 95, mock_logger, None)
+
+    mock_apply_gain.assert_any_call(os.path.join(str(music_path), 'test1.mp3'), 0)
+    mock_apply_gain.assert_any_call(os.path.join(str(music_path), 'test2.mp3'), 4)
+    mock_apply_gain.assert_any_call(os.path.join(str(music_path), 'test3.mp3'), 0)
+    mock_logger.info.assert_any_call('调整音量：test2.mp3 -> 95dB（+6.0dB）')
+
+
+@patch('MP3Random.mp3random.mp3_operations.scan_music', side_effect=scanned(['test1.mp3', 'test2.mp3']))
+@patch('MP3Random.mp3random.mp3_operations.ProcessPoolExecutor', ThreadPoolExecutor)
+@patch('MP3Random.mp3random.mp3_operations.apply_gain')
+@patch('MP3Random.mp3random.mp3_operations.analyze_file')
+def test_mp3_gain_native_error(mock_analyze_file, mock_apply_gain, mock_scan, mock_logger, paths):
+    """测试 - 调整音量 - 内置响度分析 - 文件损坏、ffmpeg.exe 未找到"""
+    music_path = paths[1]
+    mock_analyze_file.side_effect = ValueError('未找到有效的 MP3 帧')
+    mp3_gain_native(str(music_path), 95, mock_logger, None)
+    mock_logger.error.assert_any_call('调整音量失败：test1.mp3 -> 95dB， 未找到有效的 MP3 帧')
+    assert mock_logger.error.call_count == 2
+    mock_apply_gain.assert_not_called()
+
+    mock_logger.reset_mock()
+    mock_analyze_file.side_effect = FileNotFoundError(2, 'No such file', FFMPEG)
+    mp3_gain_native(str(music_path), 95, mock_logger, None)
+    mock_logger.error.assert_called_once_with('调整音量失败：ffmpeg.exe 未找到')
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：处理流程（pipeline.py）、命令行入口（cli.py）
+"""
+from unittest.mock import patch, MagicMock
+
+import pytest
+from MP3Random.mp3random.cli import create_parser, config_from_args, main
+from MP3Random.mp3random.pipeline import PipelineConfig, PipelineResult, check_config, run_pipeline, start_pipeline, \
+    Cancelled, CancelToken
+from MP3Random.mp3random.tools import FFMPEG, MP3GAIN
+
+
+@pytest.fixture
+def paths(tmp_path):
+    old_path, music_path = tmp_path / 'old', tmp_path / 'music'
+    old_path.mkdir()
+    music_path.mkdir()
+    return str(old_path), str(music_path), str(tmp_path / 'random'), str(tmp_path / 'backup')
+
+
+@pytest.fixture
+def mock_stages():
+    with patch('MP3Random.mp3random.pipeline.backup') as mock_backup, \
+            patch('MP3Random.mp3random.pipeline.to_mp3') as mock_to_mp3, \
+            patch('MP3Random.mp3random.pipeline.mp3_clip') as mock_clip, \
+            patch('MP3Random.mp3random.pipeline.mp3_gain') as mock_gain, \
+            patch('MP3Random.mp3random.pipeline.mp3_gain_native') as mock_gain_native, \
+            patch('MP3Random.mp3random.pipeline.mp3_random') as mock_random:
+        yield {'backup': mock_backup, 'to_mp3': mock_to_mp3, 'mp3_clip': mock_clip, 'mp3_gain': mock_gain,
+               'mp3_gain_native': mock_gain_native, 'mp3_random': mock_random}
+
+
+@patch('MP3Random.mp3random.pipeline.check_dependence', return_value=True)
+def test_check_config(mock_check, paths):
+    """测试 - 检查配置 - 通过"""
+    old_path, music_path, random_path, backup_path = paths
+    config = PipelineConfig(music_path, old_path, random_path, backup_path=backup_path, process_to_mp3=True,
+                            process_clip=True, process_gain=True, process_random=True, backup_music=True)
+    assert check_config(config) == []
+
+
+@pytest.mark.parametrize('kwargs, error', [
+    ({}, '请至少开启一个处理过程！'),
+    ({'process_to_mp3': True, 'old_path': 'not_exist'}, '[转换前音乐目录]不存在！'),
+    ({'process_random': True, 'random_path': 'MUSIC'}, '[转换后音乐目录]不能与[随机排列后目录]相同！'),
+    ({'process_random': True, 'music_path': 'not_exist'}, '[转换后音乐目录]不存在！'),
+    ({'process_clip': True, 'backup_music': True}, '[备份音乐文件至]不能为空！'),
+    ({'process_random': True, 'link_mode': 'move'}, '不支持的输出方式：move'),
+])
+@patch('MP3Random.mp3random.pipeline.check_dependence', return_value=True)
+def test_check_config_error(mock_check, paths, kwargs, error):
+    """测试 - 检查配置 - 错误信息"""
+    old_path, music_path, random_path, backup_path = paths
+    kwargs = {'music_path': music_path, 'old_path': old_path, 'random_path': random_path, **kwargs}
+    if kwargs['random_path'] == 'MUSIC':
+        kwargs['random_path'] = music_path
+    assert error in check_config(PipelineConfig(**kwargs))
+
+
+@pytest.mark.parametrize('gain_engine, found, error', [
+    ('auto', {FFMPEG}, None),
+    ('auto', {MP3GAIN}, None),
+    ('auto', set(), '未找到ffmpeg或mp3gain！'),
+    ('native', {MP3GAIN}, '未找到ffmpeg！'),
+    ('mp3gain', {FFMPEG}, '未找到mp3gain！'),
+])
+def test_check_config_gain_engine(paths, gain_engine, found, error):
+    """测试 - 检查配置 - 音量调整依赖"""
+    config = PipelineConfig(paths[1], process_gain=True, gain_engine=gain_engine)
+    with patch('MP3Random.mp3random.pipeline.check_dependence', side_effect=lambda name: name in found):
+        errors = check_config(config)
+    assert errors == ([] if error is None else [error])
+
+
+@patch('MP3Random.mp3random.pipeline.check_dependence', return_value=True)
+def test_run_pipeline(mock_check, paths, mock_stages):
+    """测试 - 执行处理流程 - 各过程的调用顺序与参数、进度回调"""
+    old_path, music_path, random_path, backup_path = paths
+    config = PipelineConfig(music_path, old_path, random_path, backup_path=backup_path, db=92, process_to_mp3=True,
+                            process_clip=True, process_gain=True, process_random=True, backup_old=True,
+                            link_mode='hardlink', incremental=False)
+    progress, on_stage, logger = MagicMock(), MagicMock(), MagicMock()
+    run_pipeline(config, logger, progress, on_stage)
+
+    assert [c.args[0] for c in on_stage.call_args_list] == ['文件备份', '格式转换', '音乐切片', '音量调整', '随机排列',
+                                                            '运行结束']
+    mock_stages['backup'].assert_called_once_with(old_path, backup_path, logger, checksum=False, write_manifest=False,
+                                                  jobs=None, cancel_token=None, process_inner_list=progress)
+    to_mp3_kwargs = mock_stages['to_mp3'].call_args.kwargs
+    assert to_mp3_kwargs['clip_flag'] is True
+    assert to_mp3_kwargs['db'] == 92
+    assert to_mp3_kwargs['manifest'] is None
+    assert mock_stages['to_mp3'].call_args.args[3] is progress
+    mock_stages['mp3_gain_native'].assert_called_once()
+    mock_stages['mp3_gain'].assert_not_called()
+    assert mock_stages['mp3_random'].call_args.args[8] == 'hardlink'
+    progress.assert_called_with(1, 1, '', '')
+
+
+@patch('MP3Random.mp3random.pipeline.check_dependence', return_value=False)
+def test_run_pipeline_mp3gain(mock_check, paths, mock_stages):
+    """测试 - 执行处理流程 - 未找到 ffmpeg 时使用 mp3gain 调整音量，并保存运行记录"""
+    config = PipelineConfig(paths[1], process_gain=True)
+    with patch('MP3Random.mp3random.pipeline.RunManifest') as mock_manifest:
+        run_pipeline(config, MagicMock())
+    mock_stages['mp3_gain'].assert_called_once()
+    mock_stages['mp3_gain_native'].assert_not_called()
+    mock_stages['to_mp3'].assert_not_called()
+    mock_manifest.return_value.save.assert_called_once()
+
+
+def test_config_from_args():
+    """测试 - 命令行参数转换为配置"""
+    args = create_parser().parse_args(['-m', 'new', '-o', 'old', '--to-mp3', '--gain', '95', '--random',
+                                       '--backup', 'old', 'random', '--backup-manifest', '--link-mode', 'symlink', '--full',
+                                       '-j', '4', '--report-format', 'txt', 'csv', '--seed', '42'])
+    config = config_from_args(args)
+    assert config.music_path == 'new'
+    assert config.old_path == 'old'
+    assert config.process_to_mp3 and config.process_gain and config.process_random
+    assert not config.process_clip
+    assert config.db == 95
+    assert config.backup_old and config.backup_random and not config.backup_music
+    assert config.backup_manifest and not config.backup_checksum
+    assert config.link_mode == 'symlink'
+    assert config.incremental is False
+    assert config.jobs == 4
+    assert config.report_formats == ('txt', 'csv')
+    assert config.seed == 42 and config.replay is False
+
+
+def test_cli_main(paths, capsys):
+    """测试 - 命令行入口 - 配置错误时不运行，返回 2"""
+    with patch('MP3Random.mp3random.cli.run_pipeline') as mock_run:
+        assert main(['-m', paths[1]]) == 2
+        mock_run.assert_not_called()
+    assert '请至少开启一个处理过程！' in capsys.readouterr().err
+    with patch('MP3Random.mp3random.cli.run_pipeline', return_value=PipelineResult(['随机排列'], None, 1.0)) as mock_run, \
+            patch('MP3Random.mp3random.cli.create_logger'):
+        assert main(['-m', paths[1], '--random', '-r', paths[2], '-q']) == 0
+        mock_run.assert_called_once()
+    assert mock_run.call_args.args[2] is None
+    with patch('MP3Random.mp3random.cli.run_pipeline', return_value=PipelineResult([], '随机排列', 1.0)), \
+            patch('MP3Random.mp3random.cli.create_logger'):
+        assert main(['-m', paths[1], '--random', '-r', paths[2], '-q']) == 130
+
+
+@patch('MP3Random.mp3random.pipeline.check_dependence', return_value=True)
+def test_run_pipeline_cancel(mock_check, paths, mock_stages):
+    """测试 - 执行处理流程 - 取消后不再执行后续过程，保存运行记录并返回运行结果"""
+    old_path, music_path, random_path, backup_path = paths
+    config = PipelineConfig(music_path, old_path, random_path, backup_path=backup_path, process_to_mp3=True,
+                            process_gain=True, process_random=True, backup_old=True)
+    mock_stages['to_mp3'].side_effect = Cancelled
+    on_stage, logger = MagicMock(), MagicMock()
+    with patch('MP3Random.mp3random.pipeline.RunManifest') as mock_manifest:
+        result = run_pipeline(config, logger, on_stage=on_stage, cancel_token=CancelToken())
+    assert result.completed == ['文件备份']
+    assert result.cancelled == '格式转换'
+    assert '在[格式转换]过程中取消' in result.summary()
+    mock_manifest.return_value.save.assert_called_once()
+    mock_stages['mp3_gain_native'].assert_not_called()
+    mock_stages['mp3_random'].assert_not_called()
+    on_stage.assert_called_with('运行已取消')
+    logger.info.assert_called_with('运行已取消')
+
+
+@patch('MP3Random.mp3random.pipeline.check_dependence', return_value=True)
+def test_start_pipeline(mock_check, paths, mock_stages):
+    """测试 - 在后台线程中执行处理流程 - 暂停时后台线程等待，取消后返回运行结果"""
+    cancel_token = CancelToken()
+    started = []
+
+    def slow_random(*args, cancel_token=None, **kwargs):
+        started.append(True)
+        cancel_token.check()  # 暂停时在此等待
+
+    mock_stages['mp3_random'].side_effect = slow_random
+    cancel_token.pause()
+    future = start_pipeline(PipelineConfig(paths[1], random_path=paths[2], process_random=True, incremental=False),
+                            MagicMock(), cancel_token=cancel_token)
+    assert not future.done()
+    cancel_token.cancel()
+    result = future.result(timeout=5)
+    assert started
+    assert result.cancelled == '随机排列'
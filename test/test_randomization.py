@@ -5,12 +5,17 @@
 """
 测试：随机排列音乐文件（randomization.py）
 """
+import json
 import os
+import random
 import time
-from unittest.mock import patch, mock_open, MagicMock
+from unittest.mock import patch, MagicMock
 
 import pytest
-from MP3Random.mp3random.randomization import _get_random, mp3_random
+from MP3Random.mp3random.metadata import MusicInfo, ProbeResult
+from MP3Random.mp3random.randomization import _get_random, _label_stats, mp3_random
+from MP3Random.mp3random.scheduler import Constraint
+from MP3Random.mp3random.utils import time_list_from
 
 # 测试用例
 test_cases = ['［标签4］测试8（---）.mp3',
@@ -53,27 +58,28 @@ names_dict = {'［标签4］测试8（---）.mp3': '测试8（---）',
 
 
 @pytest.fixture
-def mock_mp3():
-    with patch('MP3Random.mp3random.randomization.MP3') as mock:
-        mock.return_value.info.length = 300.0
+def mock_music_info():
+    with patch('MP3Random.mp3random.randomization.probe_music') as mock:
+        mock.side_effect = lambda input_path, files, jobs=None: ProbeResult(
+            list(files), [MusicInfo(300.0, 128000, labels_dict[file], names_dict[file]) for file in files], {})
         yield mock
 
 
 @pytest.fixture
-def mock_open_file():
-    with patch('MP3Random.mp3random.randomization.open', new_callable=mock_open) as mock:
+def mock_report():
+    with patch('MP3Random.mp3random.randomization.ReportWriter') as mock:
         yield mock
 
 
 @pytest.fixture
-def mock_listdir():
-    with patch('MP3Random.mp3random.randomization.listdir', return_value=test_cases) as mock:
+def mock_list_music():
+    with patch('MP3Random.mp3random.randomization.list_music', return_value=test_cases) as mock:
         yield mock
 
 
 @pytest.fixture
-def mock_listdir_no_exist():
-    with patch('MP3Random.mp3random.randomization.listdir', side_effect=FileNotFoundError) as mock:
+def mock_list_music_no_exist():
+    with patch('MP3Random.mp3random.randomization.list_music', side_effect=FileNotFoundError) as mock:
         yield mock
 
 
@@ -121,6 +127,16 @@ def test_get_random():
     assert len(result) == len(test_cases)
 
 
+def test_get_random_seed():
+    """测试 - 获取随机结果（_get_random）- 相同种子得到相同的排列"""
+    first = _get_random(test_cases, rng=random.Random(42))
+    assert _get_random(test_cases, rng=random.Random(42)) == first
+    assert sorted(first[0]) == sorted(test_cases)
+    # 与文件列表的顺序无关
+    assert _get_random(sorted(test_cases), rng=random.Random(42)) == first
+    assert _get_random(sorted(test_cases, reverse=True), rng=random.Random(42)) == first
+
+
 def test_get_random_empty():
     """测试 - 获取随机结果（_get_random）- 空列表"""
     result, min_adjacent_count, quality = _get_random([])
@@ -147,10 +163,45 @@ def test_get_random_performance(num):
     assert use_time < 0.00005 * files_count * files_count + 0.0005 * files_count + 0.005
 
 
+def test_label_stats():
+    """测试 - 按标签分类统计 - 与逐个标签遍历的结果相同"""
+    labels = ['标签2', '标签1', '标签2', '', '标签3', '标签1', '标签2', '标签3']
+    time_list = [61.5, 120.0, -1, 30.2, 45.0, 200.7, 99.9, 45.0]
+    labels_index = {ll: [i for i, l in enumerate(labels) if l == ll] for ll in set(labels)}
+    expected_num = sorted(((len(i), ll) for ll, i in labels_index.items()), reverse=True)
+    expected_time = {ll: time_list_from([time_list[t] for t in i]) for ll, i in labels_index.items()}
+    assert _label_stats(labels, time_list) == (expected_num, expected_time)
+    assert _label_stats([], []) == ([], {})
+
+
+def test_label_stats_performance():
+    """测试 - 按标签分类统计 - 10 万个文件、1 万个标签时耗时与标签数无关"""
+    labels = [f'标签{i % 10000}' for i in range(100000)]
+    start_time = time.perf_counter()
+    labels_num, time_group = _label_stats(labels, [60.0] * len(labels))
+    use_time = time.perf_counter() - start_time
+    assert len(labels_num) == len(time_group) == 10000
+    assert labels_num[0] == (10, '标签9999')
+    assert use_time < 2
+
+
+@pytest.mark.parametrize('label_counts', [[1], [5], [3, 3], [6, 1], [10, 2, 2], [7, 3, 3, 1], [50, 30, 20], [100, 1, 1, 1]])
+def test_get_random_min_adjacent(label_counts):
+    """测试 - 获取随机结果（_get_random）- 相邻次数达到理论最小值"""
+    music_files = [f'[标签{j}]测试{i}.mp3' for j, num in enumerate(label_counts) for i in range(num)]
+    result, min_adjacent_count, quality = _get_random(music_files)
+    labels = [name[1:name.index(']')] for name in result]
+    adjacent_count = sum(a == b for a, b in zip(labels[1:], labels[:-1]))
+    assert sorted(result) == sorted(music_files)
+    assert adjacent_count == min_adjacent_count
+    assert min_adjacent_count == max(0, 2 * max(label_counts) - len(music_files) - 1)
+    assert 0.0 <= quality <= 100.0
+
+
 def test_mp3_random(
-        mock_mp3,
-        mock_open_file,
-        mock_listdir,
+        mock_music_info,
+        mock_report,
+        mock_list_music,
         mock_path_exists,
         mock_create_path,
         mock_get_random,
@@ -166,13 +217,14 @@ def test_mp3_random(
 
     mock_create_path.assert_called_once_with(random_path)
     mock_get_random.assert_called_once()
-    mock_open_file.assert_called_once_with(result_txt, 'w')
+    mock_report.assert_called_once_with(result_txt, ('txt',))
     mock_copy.assert_called()
 
-    handle = mock_open_file()
-    handle.write.assert_called()
+    report = mock_report.return_value.__enter__.return_value
+    report.write_summary.assert_called_once()
+    assert report.write_track.call_count == len(test_cases)
 
-    assert mock_mp3.call_count == 12
+    mock_music_info.assert_called_once_with(music_path, sorted(test_cases), None)
 
     for i, file in enumerate(test_cases):
         mock_copy.assert_any_call(
@@ -183,9 +235,9 @@ def test_mp3_random(
 
 @pytest.mark.parametrize('label_flag, name_flag', [(True, True), (True, False), (False, True), (False, False)])
 def test_mp3_random_label_name(
-        mock_mp3,
-        mock_open_file,
-        mock_listdir,
+        mock_music_info,
+        mock_report,
+        mock_list_music,
         mock_path_exists,
         mock_create_path,
         mock_get_random,
@@ -199,17 +251,18 @@ def test_mp3_random_label_name(
     music_path = 'test_music'
     random_path = 'test_random'
     result_txt = 'test_result.txt'
-    mp3_random(music_path, random_path, result_txt, mock_logger, label_flag, name_flag)
+    mp3_random(music_path, random_path, result_txt, mock_logger, None, label_flag, name_flag)
 
     mock_create_path.assert_called_once_with(random_path)
     mock_get_random.assert_called_once()
-    mock_open_file.assert_called_once_with(result_txt, 'w')
+    mock_report.assert_called_once_with(result_txt, ('txt',))
     mock_copy.assert_called()
 
-    handle = mock_open_file()
-    handle.write.assert_called()
+    report = mock_report.return_value.__enter__.return_value
+    report.write_summary.assert_called_once()
+    assert report.write_track.call_count == len(test_cases)
 
-    assert mock_mp3.call_count == 12
+    mock_music_info.assert_called_once_with(music_path, sorted(test_cases), None)
 
     for i, file in enumerate(test_cases):
         new_name = f'{i + 1:02d}'
@@ -226,9 +279,9 @@ def test_mp3_random_label_name(
 @patch('MP3Random.mp3random.randomization.remove')
 def test_mp3_random_remove(
         mock_remove,
-        mock_mp3,
-        mock_open_file,
-        mock_listdir,
+        mock_music_info,
+        mock_report,
+        mock_list_music,
         mock_path_exists,
         mock_create_path,
         mock_get_random,
@@ -245,13 +298,14 @@ def test_mp3_random_remove(
 
     mock_create_path.assert_called_once_with(random_path)
     mock_get_random.assert_called_once()
-    mock_open_file.assert_called_once_with(result_txt, 'w')
+    mock_report.assert_called_once_with(result_txt, ('txt',))
     mock_copy.assert_called()
 
-    handle = mock_open_file()
-    handle.write.assert_called()
+    report = mock_report.return_value.__enter__.return_value
+    report.write_summary.assert_called_once()
+    assert report.write_track.call_count == len(test_cases)
 
-    assert mock_mp3.call_count == 12
+    mock_music_info.assert_called_once_with(music_path, sorted(test_cases), None)
 
     for i, file in enumerate(test_cases):
         mock_copy.assert_any_call(
@@ -262,12 +316,12 @@ def test_mp3_random_remove(
 
 
 def test_mp3_random_music_path_not_exist(
-        mock_listdir_no_exist,
+        mock_list_music_no_exist,
         mock_path_exists,
         mock_create_path,
         mock_get_random,
-        mock_mp3,
-        mock_open_file,
+        mock_music_info,
+        mock_report,
         mock_copy,
         mock_rmtree,
         mock_logger
@@ -283,9 +337,9 @@ def test_mp3_random_music_path_not_exist(
 
 
 def test_mp3_random_result_txt_cannot_write(
-        mock_mp3,
-        mock_open_file,
-        mock_listdir,
+        mock_music_info,
+        mock_report,
+        mock_list_music,
         mock_path_exists,
         mock_create_path,
         mock_get_random,
@@ -294,7 +348,7 @@ def test_mp3_random_result_txt_cannot_write(
         mock_logger
 ):
     """测试 - 无法写入结果统计文件（mp3_random）"""
-    mock_open_file.side_effect = IOError
+    mock_report.side_effect = IOError
 
     music_path = 'test_music'
     random_path = 'test_random'
@@ -305,3 +359,192 @@ def test_mp3_random_result_txt_cannot_write(
 
     mock_create_path.assert_called_once_with(random_path)
     mock_get_random.assert_called_once()
+
+
+def _make_music(tmp_path):
+    """创建测试用的音乐文件夹"""
+    music_path = tmp_path / 'music'
+    music_path.mkdir()
+    for i, label in enumerate(['A', 'A', 'B']):
+        (music_path / f'[{label}]测试{i}.mp3').write_bytes(b'mp3' * (i + 1))
+    return music_path
+
+
+def _fake_music_info(input_path, files, jobs=None):
+    return ProbeResult(list(files), [MusicInfo(61.4, 128000, file[1], file[3:-4]) for file in files], {})
+
+
+@pytest.mark.parametrize('link_mode', ['copy', 'hardlink', 'symlink'])
+def test_mp3_random_link_mode(tmp_path, mock_logger, link_mode):
+    """测试 - 随机排列音乐文件（mp3_random）- 输出方式"""
+    music_path = _make_music(tmp_path)
+    random_path = tmp_path / 'random'
+    with patch('MP3Random.mp3random.randomization.probe_music', side_effect=_fake_music_info):
+        mp3_random(str(music_path), str(random_path), str(tmp_path / 'result.txt'), mock_logger, None,
+                   label_flag=True, name_flag=True, link_mode=link_mode)
+    outputs = sorted(os.listdir(random_path))
+    assert len(outputs) == 3
+    assert sorted(f.read_bytes() for f in random_path.iterdir()) == sorted(f.read_bytes() for f in music_path.iterdir())
+    sources = {f.read_bytes(): f for f in music_path.iterdir()}  # 各文件内容不同
+    for output in outputs:
+        output_file = random_path / output
+        source = sources[output_file.read_bytes()]
+        assert output.endswith(f'[{source.name[1]}]{source.name[3:]}')
+        assert output_file.is_symlink() == (link_mode == 'symlink')
+        assert os.path.samefile(output_file, source) == (link_mode != 'copy')
+
+
+def test_mp3_random_link_fallback(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 硬链接失败时改为复制"""
+    music_path = _make_music(tmp_path)
+    random_path = tmp_path / 'random'
+    with patch('MP3Random.mp3random.randomization.probe_music', side_effect=_fake_music_info), \
+            patch('MP3Random.mp3random.randomization.link', side_effect=OSError('跨文件系统')) as mock_link:
+        mp3_random(str(music_path), str(random_path), str(tmp_path / 'result.txt'), mock_logger, None,
+                   link_mode='hardlink')
+    mock_link.assert_called_once()  # 失败后不再尝试硬链接
+    mock_logger.warning.assert_called_once()
+    assert len(os.listdir(random_path)) == 3
+    assert not any(os.path.samefile(random_path / f, music_path / g)
+                   for f in os.listdir(random_path) for g in os.listdir(music_path))
+
+
+def test_mp3_random_playlist(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 仅生成播放列表，不删除原文件夹"""
+    music_path = _make_music(tmp_path)
+    random_path = tmp_path / 'random'
+    with patch('MP3Random.mp3random.randomization.probe_music', side_effect=_fake_music_info):
+        mp3_random(str(music_path), str(random_path), str(tmp_path / 'result.txt'), mock_logger, None,
+                   remove_flag=True, link_mode='playlist')
+    assert os.listdir(random_path) == ['playlist.m3u8']
+    lines = (random_path / 'playlist.m3u8').read_text(encoding='utf-8').splitlines()
+    assert lines[0] == '#EXTM3U'
+    assert len(lines) == 7
+    assert all(line.startswith('#EXTINF:61,') for line in lines[1::2])
+    assert sorted(lines[2::2]) == sorted(str(f) for f in music_path.iterdir())
+    assert music_path.exists()
+    mock_logger.warning.assert_called_once()
+
+
+def test_mp3_random_link_mode_invalid(mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 不支持的输出方式"""
+    with pytest.raises(ValueError):
+        mp3_random('test_music', 'test_random', 'test_result.txt', mock_logger, None, link_mode='move')
+
+
+def test_mp3_random_constraints(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 按约束排列"""
+    music_path = _make_music(tmp_path)
+    random_path = tmp_path / 'random'
+    result_txt = tmp_path / 'result.txt'
+    with patch('MP3Random.mp3random.randomization.probe_music', side_effect=_fake_music_info):
+        mp3_random(str(music_path), str(random_path), str(result_txt), mock_logger, label_flag=True,
+                   constraints=[Constraint('label', 1)], time_budget=0.1)
+    outputs = sorted(os.listdir(random_path))
+    assert [output[1:4] for output in outputs] == ['[A]', '[B]', '[A]']
+    text = result_txt.read_text()
+    assert '相邻次数：0\n' in text
+    assert '约束代价：0\n' in text
+
+
+def test_mp3_random_report_formats(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 同时生成文本、JSON Lines、CSV 格式的结果文件，排列顺序一致"""
+    music_path = _make_music(tmp_path)
+    result_txt = tmp_path / 'result.txt'
+    with patch('MP3Random.mp3random.randomization.probe_music', side_effect=_fake_music_info):
+        mp3_random(str(music_path), str(tmp_path / 'random'), str(result_txt), mock_logger,
+                   report_formats=('txt', 'jsonl', 'csv'))
+    order = [line.split(' ', 1)[1] for line in result_txt.read_text(encoding='utf-8').splitlines()[-3:]]
+    rows = [json.loads(line) for line in (tmp_path / 'result.jsonl').read_text(encoding='utf-8').splitlines()]
+    assert [row['name'] for row in rows] == order
+    assert [row['start'] for row in rows] == [0.0, 61.4, 122.8]
+    assert (tmp_path / 'result.csv').read_text(encoding='utf-8-sig').count('\n') == 4
+    with pytest.raises(ValueError):
+        mp3_random(str(music_path), str(tmp_path / 'random'), str(result_txt), mock_logger, report_formats=('xml',))
+
+
+def test_mp3_random_unreadable(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 无法读取音乐信息的文件报告后不参与排列"""
+    music_path = _make_music(tmp_path)
+    random_path = tmp_path / 'random'
+    result_txt = tmp_path / 'result.txt'
+    (music_path / '[B]损坏.mp3').write_bytes(b'not an mp3')
+
+    def probe(input_path, files, jobs=None):
+        readable = [file for file in files if '损坏' not in file]
+        return ProbeResult(readable, _fake_music_info(input_path, readable).infos, {'[B]损坏.mp3': ValueError('帧头')})
+
+    with patch('MP3Random.mp3random.randomization.probe_music', side_effect=probe) as mock_probe:
+        mp3_random(str(music_path), str(random_path), str(result_txt), mock_logger, jobs=2)
+    assert mock_probe.call_args.args[2] == 2
+    assert len(os.listdir(random_path)) == 3
+    assert not any('损坏' in output for output in os.listdir(random_path))
+    mock_logger.error.assert_called_once_with('随机排列跳过：[B]损坏.mp3，无法读取音乐信息：帧头')
+    assert '总计：3 - ' in result_txt.read_text(encoding='utf-8')
+
+
+def test_mp3_random_seed_replay(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 相同种子得到相同的排列，种子记录在结果文件中，可按上次的结果重新生成"""
+    music_path = tmp_path / 'music'
+    music_path.mkdir()
+    for i in range(12):
+        (music_path / f'[{"ABC"[i % 3]}]测试{i}.mp3').write_bytes(b'mp3')
+    random_path = tmp_path / 'random'
+    result_txt = tmp_path / 'result.txt'
+    with patch('MP3Random.mp3random.randomization.probe_music', side_effect=_fake_music_info):
+        mp3_random(str(music_path), str(random_path), str(result_txt), mock_logger, name_flag=True, seed=7)
+        first = sorted(os.listdir(random_path))
+        text = result_txt.read_text(encoding='utf-8')
+        assert '  随机种子：7\n' in text
+        mp3_random(str(music_path), str(random_path), str(result_txt), mock_logger, name_flag=True, seed=7)
+        assert sorted(os.listdir(random_path)) == first
+        assert result_txt.read_text(encoding='utf-8') == text
+
+        # 重新生成时不重新排列，已不存在的文件跳过
+        (music_path / '[A]测试0.mp3').unlink()
+        with patch('MP3Random.mp3random.randomization._get_random') as mock_get_random:
+            mp3_random(str(music_path), str(random_path), str(result_txt), mock_logger, name_flag=True, replay=True)
+        mock_get_random.assert_not_called()
+    expected = [name for name in first if not name.endswith('测试0.mp3')]
+    assert [name.lstrip('0123456789') for name in sorted(os.listdir(random_path))] == \
+           [name.lstrip('0123456789') for name in expected]
+    assert '  随机种子：7\n' in result_txt.read_text(encoding='utf-8')
+    mock_logger.warning.assert_any_call('上次排序结果中的 1 个文件已不存在，跳过')
+
+
+def test_mp3_random_seed_file_order(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 相同种子的排列与文件系统返回文件的顺序无关"""
+    files = [f'[{"ABCD"[i % 4]}]测试{i}.mp3' for i in range(20)]
+    results = []
+    for order in (files, files[::-1]):
+        result_txt = tmp_path / f'result{len(results)}.txt'
+        with patch('MP3Random.mp3random.randomization.list_music', return_value=list(order)), \
+                patch('MP3Random.mp3random.randomization.probe_music', side_effect=_fake_music_info), \
+                patch('MP3Random.mp3random.randomization.copy'):
+            mp3_random(str(tmp_path / 'music'), str(tmp_path / 'random'), str(result_txt), mock_logger, seed=42)
+        results.append(result_txt.read_text(encoding='utf-8'))
+    assert results[0] == results[1]
+
+
+def test_mp3_random_replay_no_report(tmp_path, mock_logger):
+    """测试 - 随机排列音乐文件（mp3_random）- 重新生成时结果文件不存在"""
+    music_path = _make_music(tmp_path)
+    mp3_random(str(music_path), str(tmp_path / 'random'), str(tmp_path / 'result.txt'), mock_logger, replay=True)
+    mock_logger.error.assert_called_once_with(f'结果统计文件 {tmp_path / "result.txt"} 未找到，无法按上次的结果重新生成')
+    assert not (tmp_path / 'random').exists()
+
+
+@pytest.mark.parametrize('content', [
+    '【排序结果】\n  随机种子：abc\n'.encode('utf-8'),  # 种子不是整数
+    '【排序结果】\n测试0.mp3\n'.encode('utf-8'),  # 排序结果缺少编号
+    b'\xff\xfe\x00garbage',  # 不是 UTF-8 编码
+])
+def test_mp3_random_replay_broken_report(tmp_path, mock_logger, content):
+    """测试 - 随机排列音乐文件（mp3_random）- 重新生成时结果文件已损坏"""
+    music_path = _make_music(tmp_path)
+    (tmp_path / 'result.txt').write_bytes(content)
+    mp3_random(str(music_path), str(tmp_path / 'random'), str(tmp_path / 'result.txt'), mock_logger, replay=True)
+    mock_logger.error.assert_called_once()
+    assert mock_logger.error.call_args.args[0].startswith(
+        f'结果统计文件 {tmp_path / "result.txt"} 格式错误，无法按上次的结果重新生成：')
+    assert not (tmp_path / 'random').exists()
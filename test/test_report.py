@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：随机排列的结果文件（report.py）
+"""
+import csv
+import json
+import os
+
+import pytest
+from MP3Random.mp3random.report import report_path, ReportWriter, read_report
+
+
+@pytest.mark.parametrize('result_file, report_format, expected', [
+    ('result.txt', 'txt', 'result.txt'),
+    ('result.txt', 'csv', 'result.csv'),
+    ('结果', 'jsonl', '结果.jsonl'),
+    ('result.log', 'txt', 'result.log'),
+    ('result.CSV', 'csv', 'result.CSV'),
+    ('result.csv', 'txt', 'result.txt'),
+])
+def test_report_path(result_file, report_format, expected):
+    """测试 - 各格式结果文件的路径"""
+    assert report_path(result_file, report_format) == expected
+
+
+def test_report_writer(tmp_path):
+    """测试 - 写入文本（与原格式相同）、JSON Lines、CSV 格式，开始时间为之前各首时长之和"""
+    result_txt = str(tmp_path / 'result.txt')
+    with ReportWriter(result_txt, ('txt', 'jsonl', 'csv')) as report:
+        report.write_summary(2, ('00:03:30', '01:45'), [(1, '标签2'), (1, '标签1')],
+                             {'标签1': ('00:01:30', '01:30'), '标签2': ('00:02:00', '02:00')}, 0, 100.0, 1.5)
+        report.write_track('1', '[标签2]歌曲,"二".mp3', '标签2', 120.0)
+        report.write_track('2', '[标签1]歌曲一.mp3', '标签1', 90.25)
+    assert sorted(os.listdir(tmp_path)) == ['result.csv', 'result.jsonl', 'result.txt']
+    with open(result_txt, encoding='utf-8') as f:
+        assert f.read() == ('【分类统计】\n标签：个数 - 总时长 - 平均时长\n总计：2 - 00:03:30 - 01:45\n'
+                            '标签2：1 - 00:02:00 - 02:00\n标签1：1 - 00:01:30 - 01:30\n'
+                            '【排序结果】\n  相邻次数：0\n  随机质量：100.0%\n  约束代价：1.5\n'
+                            '1 [标签2]歌曲,"二".mp3\n2 [标签1]歌曲一.mp3\n')
+    with open(tmp_path / 'result.jsonl', encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == [{'index': 1, 'id': '1', 'name': '[标签2]歌曲,"二".mp3', 'label': '标签2', 'duration': 120.0,
+                     'start': 0.0},
+                    {'index': 2, 'id': '2', 'name': '[标签1]歌曲一.mp3', 'label': '标签1', 'duration': 90.25,
+                     'start': 120.0}]
+    with open(tmp_path / 'result.csv', encoding='utf-8-sig', newline='') as f:
+        assert list(csv.DictReader(f)) == [{key: str(value) for key, value in row.items()} for row in rows]
+
+
+def test_report_writer_empty(tmp_path):
+    """测试 - 未进行随机排列时相邻次数和随机质量为“-”，其他格式只有表头"""
+    result_txt = tmp_path / 'result.txt'
+    with ReportWriter(str(result_txt), ('txt', 'csv')) as report:
+        report.write_summary(0, ('00:00:00', '00:00'), [], {})
+    assert result_txt.read_text(encoding='utf-8') == ('【分类统计】\n标签：个数 - 总时长 - 平均时长\n总计：0 - 00:00:00 - 00:00\n'
+                                                      '【排序结果】\n  相邻次数：-\n  随机质量：-%\n')
+    assert (tmp_path / 'result.csv').read_text(encoding='utf-8-sig').splitlines() == \
+           ['index,id,name,label,duration,start']
+
+
+def test_report_writer_atomic(tmp_path):
+    """测试 - 写入中途出错时保留原结果文件，不留下临时文件；格式不支持时抛出 ValueError"""
+    result_txt = tmp_path / 'result.txt'
+    result_txt.write_text('上次的结果', encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        with ReportWriter(str(result_txt), ('txt', 'jsonl')) as report:
+            report.write_track('1', 'a.mp3', '无标签', 60.0)
+            raise RuntimeError('中途出错')
+    assert os.listdir(tmp_path) == ['result.txt']
+    assert result_txt.read_text(encoding='utf-8') == '上次的结果'
+    with pytest.raises(ValueError):
+        ReportWriter(str(result_txt), ('xml',))
+
+
+def test_read_report(tmp_path):
+    """测试 - 读取结果文件中的随机种子和排序结果（原文件名可包含空格）；未记录种子时为 None"""
+    result_txt = str(tmp_path / 'result.txt')
+    with ReportWriter(result_txt, ('txt', 'csv')) as report:
+        report.write_summary(2, ('00:03:30', '01:45'), [(1, '标签2'), (1, '标签1')],
+                             {'标签1': ('00:01:30', '01:30'), '标签2': ('00:02:00', '02:00')}, 0, 100.0, seed=123)
+        report.write_track('1', '[标签2]歌曲 二.mp3', '标签2', 120.0)
+        report.write_track('2', '[标签1]歌曲一.mp3', '标签1', 90.0)
+    assert read_report(str(tmp_path / 'result.csv')) == (123, ['[标签2]歌曲 二.mp3', '[标签1]歌曲一.mp3'])
+    with ReportWriter(result_txt) as report:
+        report.write_summary(0, ('00:00:00', '00:00'), [], {})
+    assert read_report(result_txt) == (None, [])
+    with pytest.raises(FileNotFoundError):
+        read_report(str(tmp_path / '不存在.txt'))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：基于 asyncio 的外部程序运行器（runner.py）
+"""
+import asyncio
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from MP3Random.mp3random.runner import parse_time, run_tool, run_batch, _DURATION_PATTERN, Cancelled, CancelToken
+
+
+class FakeProcess:
+    """模拟 asyncio 子进程：输出标准错误后以 returncode 结束，hang 为真时直至被终止才结束"""
+
+    def __init__(self, returncode: int = 0, stderr: bytes = b'', hang: bool = False):
+        self.returncode = None
+        self._returncode = returncode
+        self.stderr = asyncio.StreamReader()
+        self.stderr.feed_data(stderr)
+        if not hang:
+            self.stderr.feed_eof()
+
+    async def wait(self) -> int:
+        await self.stderr.read()  # 标准错误结束即子进程结束
+        if self.returncode is None:
+            self.returncode = self._returncode
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+        self.stderr.feed_eof()
+
+
+def fake_exec(returncode: int = 0, stderr: bytes = b'', delay: float = 0, side_effect=None, hang=None) -> MagicMock:
+    """
+    模拟 asyncio.create_subprocess_exec，调用参数为 (程序, 参数...)
+
+    :param returncode: 子进程的返回值
+    :param stderr: 子进程的标准错误
+    :param delay: 启动子进程的耗时（秒）
+    :param side_effect: 启动时调用的函数 callback(参数列表)，可抛出异常（如 FileNotFoundError）
+    :param hang: 判断子进程是否不结束（直至被终止）的函数 callback(参数列表)，默认为 None（均正常结束）
+    """
+    async def create(*args, **kwargs):
+        if side_effect is not None:
+            side_effect(list(args))
+        await asyncio.sleep(delay)
+        return FakeProcess(returncode, stderr, hang is not None and hang(list(args)))
+
+    return MagicMock(side_effect=create)
+
+
+def python(code: str) -> list[str]:
+    """以当前 Python 解释器运行代码的参数列表"""
+    return [sys.executable, '-c', code]
+
+
+def test_parse_time():
+    """测试 - 解析 ffmpeg 输出中的时间"""
+    assert parse_time('size=     512kB time=00:01:02.50 bitrate= 128.0kbits/s speed=40x') == 62.5
+    assert parse_time('time=N/A bitrate=N/A') is None
+    assert parse_time('  Duration: 01:02:03.04, start: 0.025057, bitrate: 320 kb/s', _DURATION_PATTERN) == 3723.04
+
+
+def test_run_tool():
+    """测试 - 逐行读取标准错误（含“\\r”结尾的进度行），按总时长计算进度，只保留最后 20 行"""
+    code = ("import sys\n"
+            "sys.stderr.write('Duration: 00:00:10.00, start: 0\\n' + ''.join(f'line {i}\\n' for i in range(30)))\n"
+            "for t in (2, 5, 12):\n"
+            "    sys.stderr.write(f'size=1kB time=00:00:{t:02d}.00 bitrate=128k\\r'); sys.stderr.flush()\n"
+            "sys.exit(3)")
+    progress = []
+    result = asyncio.run(run_tool(python(code), on_progress=progress.append))
+    assert result.returncode == 3
+    assert progress == [0.0, 0.2, 0.5, 1.0]
+    lines = result.stderr.split('\n')
+    assert len(lines) == 20 and lines[-1].startswith('size=1kB time=00:00:12')
+    # 指定总时长时不读取“Duration:”
+    progress.clear()
+    asyncio.run(run_tool(python(code), duration=20, on_progress=progress.append))
+    assert progress == [0.0, 0.1, 0.25, 0.6]
+
+
+def test_run_tool_errors():
+    """测试 - 程序未找到、超时时终止子进程、已取消时不启动"""
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(run_tool(['不存在的程序.exe']))
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(run_tool(python('import time; time.sleep(30)'), timeout=0.5))
+    assert time.monotonic() - start < 10
+    cancel_token = CancelToken()
+    cancel_token.cancel()
+    with pytest.raises(Cancelled):
+        asyncio.run(run_tool(python(''), cancel_token=cancel_token))
+
+
+def test_run_batch():
+    """测试 - 按完成顺序返回结果，同时运行的子进程数不超过 jobs，单个任务失败不影响其他任务"""
+    commands = [python(f'import time; time.sleep({0.6 - 0.1 * i})') for i in range(4)] + [['不存在的程序.exe']]
+    start = time.monotonic()
+    results = dict(run_batch(commands, jobs=2))
+    elapsed = time.monotonic() - start
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert all(results[i].returncode == 0 for i in range(4))
+    assert isinstance(results[4], FileNotFoundError)
+    assert 0.9 < elapsed < 10  # 两个一组：0.6 + 0.4 秒
+    order = [index for index, _ in run_batch(commands[:3], jobs=3)]
+    assert order == [2, 1, 0]
+
+
+def test_run_batch_stop():
+    """测试 - 停止迭代或取消时终止正在运行的子进程，尚未开始的任务不再运行"""
+    commands = [python('import time; time.sleep(0.1)')] + [python('import time; time.sleep(30)')] * 3
+    start = time.monotonic()
+    for index, result in run_batch(commands, jobs=2):
+        assert index == 0
+        break
+    assert time.monotonic() - start < 10
+
+    cancel_token = CancelToken()
+    threading.Timer(0.5, cancel_token.cancel).start()
+    start = time.monotonic()
+    results = list(run_batch(commands[1:], jobs=2, cancel_token=cancel_token))
+    assert time.monotonic() - start < 10
+    assert len(results) == 3 and all(isinstance(result, Cancelled) for _, result in results)
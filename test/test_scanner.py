@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：扫描音乐文件夹（scanner.py）
+"""
+import os
+from unittest.mock import patch, MagicMock
+
+import pytest
+from MP3Random.mp3random.manifest import fingerprint
+from MP3Random.mp3random.mp3_operations import to_mp3
+from MP3Random.mp3random.scanner import MP3_EXTENSIONS, is_audio, scan_music, list_music
+from MP3Random.test.test_runner import fake_exec
+
+MP3_FRAME = b'\xff\xfb\x90\x00' + bytes(413)
+
+
+@pytest.fixture
+def music_path(tmp_path):
+    music_path = tmp_path / 'music'
+    (music_path / '专辑').mkdir(parents=True)
+    (music_path / '1.mp3').write_bytes(MP3_FRAME)
+    (music_path / '2.FLAC').write_bytes(b'fLaC' + bytes(8))
+    (music_path / '3.wav').write_bytes(b'not audio')
+    (music_path / '封面.jpg').write_bytes(b'\xff\xd8\xff\xe0')
+    (music_path / '.隐藏.mp3').write_bytes(MP3_FRAME)
+    (music_path / '专辑' / '4.mp3').write_bytes(b'ID3' + bytes(9))
+    return music_path
+
+
+def test_scan_music(music_path):
+    """测试 - 跳过子文件夹、隐藏文件和非音乐文件，文件状态与 stat 一致"""
+    entries = {entry.name: entry for entry in scan_music(str(music_path))}
+    assert sorted(entries) == ['1.mp3', '2.FLAC', '3.wav']
+    entry = entries['1.mp3']
+    assert entry.path == str(music_path) + os.sep + '1.mp3'
+    assert entry.fingerprint == fingerprint(entry.path)
+    assert sorted(list_music(str(music_path), MP3_EXTENSIONS)) == ['1.mp3']
+
+
+def test_scan_music_options(music_path):
+    """测试 - 递归扫描、按文件头过滤"""
+    names = sorted(entry.name for entry in scan_music(str(music_path), recursive=True, check_magic=True))
+    assert names == ['1.mp3', '2.FLAC', os.path.join('专辑', '4.mp3')]
+    names = sorted(entry.name for entry in scan_music(str(music_path), extensions=None, check_magic=True))
+    assert names == ['1.mp3', '2.FLAC']
+    assert not is_audio(str(music_path / '不存在.mp3'))
+    with pytest.raises(FileNotFoundError):
+        list_music(str(music_path / '不存在'))
+
+
+@patch('asyncio.create_subprocess_exec', new_callable=fake_exec)
+def test_to_mp3_skip_non_audio(mock_exec, music_path):
+    """测试 - 格式转换不为子文件夹和非音乐文件启动 ffmpeg.exe"""
+    to_mp3(str(music_path), str(music_path.parent / 'out'), MagicMock(), remove_flag=False)
+    assert mock_exec.call_count == 3
+    assert not any('封面.jpg' in ' '.join(call.args) or '专辑' in ' '.join(call.args) for call in mock_exec.call_args_list)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：多约束排列（scheduler.py）
+"""
+import random
+import time
+
+import pytest
+from MP3Random.mp3random.scheduler import Constraint, parse_constraint, get_artist, schedule, _build
+
+
+def _files(labels: int, per_label: int, artists: int = 0) -> list[str]:
+    """生成“[标签]艺术家 - 标题.mp3”格式的文件名"""
+    files = []
+    for i in range(labels * per_label):
+        artist = f'艺术家{i % artists} - ' if artists else ''
+        files.append(f'[标签{i % labels}]{artist}歌曲{i}.mp3')
+    return files
+
+
+def test_parse_constraint():
+    """测试 - 解析约束文本"""
+    assert parse_constraint('label:2') == Constraint('label', 2.0, 1.0)
+    assert parse_constraint('duration:3600:0.5') == Constraint('duration', 3600.0, 0.5)
+    for text in ['tempo:2', 'label', 'label:0', 'label:1:-1', 'label:a']:
+        with pytest.raises(ValueError):
+            parse_constraint(text)
+
+
+def test_get_artist():
+    """测试 - 由文件名得到艺术家"""
+    assert get_artist('[标签]歌手 - 歌曲.mp3') == '歌手'
+    assert get_artist('歌手 - 歌曲(5-10).mp3') == '歌手'
+    assert get_artist('歌曲.mp3') is None
+    assert get_artist(' - 歌曲.mp3') is None
+
+
+def test_delta_matches_cost():
+    """测试 - 增量代价与重新计算的代价一致"""
+    random.seed(1)
+    files = _files(5, 20, 7)
+    lengths = [random.uniform(120, 360) for _ in files]
+    terms = _build(files, [Constraint('label', 3), Constraint('artist', 5, 2.0), Constraint('duration', 1200, 0.5)],
+                   lengths)
+    order = list(range(len(files)))
+    random.shuffle(order)
+    for term in terms:
+        cost = term.cost(order)
+        for _ in range(200):
+            i, j = random.sample(range(len(order)), 2)
+            delta = term.delta(order, i, j)
+            term.swap(order, i, j)
+            order[i], order[j] = order[j], order[i]
+            cost += delta
+            assert cost == pytest.approx(term.cost(order))
+
+
+def test_schedule_spacing():
+    """测试 - 满足标签间隔和艺术家间隔"""
+    files = _files(6, 10, 5)
+    result, cost = schedule(files, [Constraint('label', 4), Constraint('artist', 3)], time_budget=5,
+                            rng=random.Random(2))
+    assert sorted(result) == sorted(files)
+    assert cost == 0
+    for i in range(len(result)):
+        for j in range(i + 1, min(len(result), i + 5)):
+            assert result[i][:4] != result[j][:4]  # 标签不同
+        for j in range(i + 1, min(len(result), i + 4)):
+            assert get_artist(result[i]) != get_artist(result[j])
+
+
+def test_schedule_duration():
+    """测试 - 时长均衡：代价不高于初始排列"""
+    files = _files(4, 25)
+    lengths = [600 if i < 20 else 100 for i in range(len(files))]
+    constraints = [Constraint('duration', 3600)]
+    initial_cost = sum(term.cost(list(range(len(files)))) for term in _build(files, constraints, lengths))
+    result, cost = schedule(files, constraints, lengths, time_budget=5, max_steps=20000, rng=random.Random(3))
+    assert sorted(result) == sorted(files)
+    assert cost < initial_cost / 4
+
+
+def test_schedule_budget():
+    """测试 - 无约束时返回初始排列；超出时间后结束"""
+    files = _files(2, 50)
+    assert schedule(files, [], initial=files[::-1]) == (files[::-1], 0)
+    ticks = iter(range(1000))
+    result, cost = schedule(files, [Constraint('label', 10)], time_budget=3, clock=lambda: next(ticks))
+    assert sorted(result) == sorted(files)
+    assert cost > 0  # 相同标签之间不可能间隔 10 首
+    with pytest.raises(ValueError):
+        schedule(files, [Constraint('duration', 3600)])
+
+
+def test_lower_bound():
+    """测试 - 代价下限：标签间隔为 1 时为 max(0, 2 * 最多标签数 - 文件数 - 1)"""
+    files = ['[A]%d.mp3' % i for i in range(8)] + ['[B]%d.mp3' % i for i in range(2)]
+    assert _build(files, [Constraint('label', 1)])[0].lower_bound() == 5
+    assert _build(files, [Constraint('label', 2, 2.0)])[0].lower_bound() == 2.0 * (7 - 1)
+    assert _build(_files(5, 4), [Constraint('label', 1)])[0].lower_bound() == 0
+    assert _build(files, [Constraint('artist', 1)])[0].lower_bound() == 0  # 无艺术家时不冲突
+
+
+def test_schedule_early_stop():
+    """测试 - 达到代价下限时提前结束，不用完求解时间"""
+    files = ['[A]%d.mp3' % i for i in range(80)] + ['[B]%d.mp3' % i for i in range(20)]
+    start = time.monotonic()
+    result, cost = schedule(files, [Constraint('label', 1)], time_budget=60, rng=random.Random(4))
+    assert cost == 2 * 80 - 100 - 1
+    assert time.monotonic() - start < 30
+    # 初始排列已达到下限时直接返回初始排列
+    initial = _files(4, 5)
+    assert schedule(initial, [Constraint('label', 3)], initial=initial, max_steps=1) == (initial, 0)
+
+
+def test_schedule_seed():
+    """测试 - 相同种子、相同步数时得到相同的排列（固定计时，温度只随步数变化）"""
+    files = _files(3, 20, 4)
+    constraints = [Constraint('label', 3), Constraint('artist', 2)]
+    first = schedule(files, constraints, max_steps=2000, clock=lambda: 0.0, rng=random.Random(7))
+    second = schedule(files, constraints, max_steps=2000, clock=lambda: 0.0, rng=random.Random(7))
+    assert first == second
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：文件名解析（tokenizer.py）
+"""
+import re
+from os import path
+
+import pytest
+from MP3Random.mp3random.tokenizer import NameRecord, parse_name
+
+NAMES = ['[标签1]测试1.mp3', '【标签2】测试2(5-10).mp3', '［标签3］测试3（-5--1）.flac', '测试4.mp3', '测试5(-).mp3',
+         '测试6(a-b).mp3', '[标签7]测试7(10-).mp3', '(5-10).mp3', '[]空标签.mp3', '[a]b[c]d(1-2)e.mp3', '无后缀名',
+         '[未闭合.mp3', '测试8)(1-2.mp3', '']
+
+
+def _legacy(file):
+    """修改前各模块分别使用的正则表达式解析结果"""
+    m = re.match(r'[\[【［](.*)[]】］].*', file)
+    label = m.group(1) if m else '无标签'
+    m = re.match(r'.*[\[【［].*[]】］](.*)', file)
+    name = path.splitext(m.group(1) if m else file)[0]
+    m = re.match(r'(.*)[(（](-{0,1}?[^-]*?)-(-{0,1}?[^-]*?)[)）](.*)\..*', file)
+    if m is None:
+        return label, name, None
+    return label, name, m.group(1) + m.group(4)
+
+
+@pytest.mark.parametrize('file', NAMES)
+def test_parse_name_legacy(file):
+    """测试 - 解析结果与修改前的正则表达式一致"""
+    record = parse_name(file)
+    assert (record.label, record.name, record.base) == _legacy(file)
+    assert record.clip == (record.base is not None)
+    assert record.ext == path.splitext(file)[1]
+
+
+def test_parse_name_clip():
+    """测试 - 切片时间"""
+    assert parse_name('【标签2】测试2(5-10).mp3') == NameRecord('标签2', '测试2(5-10)', '.mp3', True, '【标签2】测试2',
+                                                         5.0, 10.0)
+    assert parse_name('［标签3］测试3（-5--1）.flac')[4:] == ('［标签3］测试3', -5.0, -1.0)
+    assert parse_name('[标签7]测试7(10-).mp3')[4:] == ('[标签7]测试7', 10.0, None)
+    assert parse_name('测试6(a-b).mp3')[4:] == ('测试6', None, None)
+    assert parse_name('测试4.mp3')[3:] == (False, None, None, None)
+
+
+def test_parse_name_cache():
+    """测试 - 同一文件名只解析一次"""
+    parse_name.cache_clear()
+    first = parse_name('[标签1]测试1.mp3')
+    assert parse_name('[标签1]测试1.mp3') is first
+    assert parse_name.cache_info().hits == 1
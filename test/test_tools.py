@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# 凌乱之主
+# 2026年10月18日
+"""
+测试：外部程序的查找、版本探测和启动参数（tools.py）
+"""
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+from MP3Random.mp3random.tools import IS_WINDOWS, CREATION_FLAGS, FFMPEG, MP3GAIN, resolve_tool, probe_tool, \
+    mp3gain_args, _which
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    _which.cache_clear()
+    probe_tool.cache_clear()
+    yield
+    _which.cache_clear()
+    probe_tool.cache_clear()
+
+
+def test_platform_defaults():
+    """测试 - 默认程序名和启动参数随平台不同"""
+    if IS_WINDOWS:
+        assert (FFMPEG, MP3GAIN) == ('ffmpeg.exe', 'mp3gain.exe')
+        assert CREATION_FLAGS != 0
+    else:
+        assert (FFMPEG, MP3GAIN) == ('ffmpeg', 'mp3gain')
+        assert CREATION_FLAGS == 0
+    assert mp3gain_args('mp3gain', 6, os.path.join('音乐', 'a b.mp3')) == \
+           ['mp3gain', '-d', '6', '-c', '-r', os.path.join('音乐', 'a b.mp3')]
+
+
+def test_resolve_tool(tmp_path):
+    """测试 - 查找外部程序：给定路径、环境变量 PATH（结果缓存）、非 Windows 平台兼容“.exe”后缀"""
+    tool = tmp_path / 'ffmpeg'
+    tool.write_bytes(b'')
+    assert resolve_tool(str(tool)) == str(tool)
+    assert resolve_tool(str(tmp_path / '不存在')) is None
+    found = {'ffmpeg': '/usr/bin/ffmpeg'}
+    with patch('MP3Random.mp3random.tools.which', side_effect=found.get) as mock_which:
+        assert resolve_tool('ffmpeg') == '/usr/bin/ffmpeg'
+        assert resolve_tool('ffmpeg') == '/usr/bin/ffmpeg'
+        assert mock_which.call_count == 1
+        with patch('MP3Random.mp3random.tools.IS_WINDOWS', False):
+            assert resolve_tool('ffmpeg.exe') == '/usr/bin/ffmpeg'
+        with patch('MP3Random.mp3random.tools.IS_WINDOWS', True):
+            assert resolve_tool('mp3gain.exe') is None
+
+
+@pytest.mark.skipif(IS_WINDOWS, reason='使用 shell 脚本模拟外部程序')
+def test_probe_tool(tmp_path):
+    """测试 - 读取外部程序的版本，结果缓存；无法读取时版本为空"""
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_text(f'#!/bin/sh\necho "ffmpeg version 6.1.1-static Copyright (c) 2000-2023" >&2\n')
+    ffmpeg.chmod(0o755)
+    tool = probe_tool(str(ffmpeg))
+    assert tool.path == str(ffmpeg) and tool.version == '6.1.1-static'
+    assert probe_tool(str(ffmpeg)) is tool
+    mp3gain = tmp_path / 'mp3gain'
+    mp3gain.write_text('#!/bin/sh\n[ "$1" = "-v" ] && echo "mp3gain version 1.6.2"\n')
+    mp3gain.chmod(0o755)
+    assert probe_tool(str(mp3gain)).version == '1.6.2'
+    broken = tmp_path / 'broken'
+    broken.write_bytes(b'')
+    broken.chmod(0o644)  # 不可执行
+    assert probe_tool(str(broken)).version == ''
+    assert probe_tool(str(tmp_path / '不存在')) is None
+
+
+@pytest.mark.skipif(IS_WINDOWS, reason='检查非 Windows 平台')
+def test_import_without_windows_flags():
+    """测试 - 非 Windows 平台上各模块可直接导入（不依赖 Windows 专有的 subprocess.CREATE_NO_WINDOW）"""
+    source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mp3random')
+    code = 'import subprocess; assert not hasattr(subprocess, "CREATE_NO_WINDOW"); import cli, dedup, runner'
+    result = subprocess.run([sys.executable, '-c', code], cwd=source, capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONPATH': source})
+    assert result.returncode == 0, result.stderr
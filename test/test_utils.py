@@ -4,10 +4,13 @@
 # 2024年07月26日
 import logging
 import os
-from unittest.mock import patch
+import threading
+import time
+from unittest.mock import patch, MagicMock
 
 import pytest
-from MP3Random.mp3random.utils import create_logger, create_path, time_from, time_list_from, check_dependence
+from MP3Random.mp3random.utils import create_logger, create_path, copy_range, time_from, time_list_from, \
+    check_dependence, update_progress, speed_text, ProgressReporter, Cancelled, CancelToken
 
 
 def test_create_logger():
@@ -67,6 +70,34 @@ def test_create_path_special_characters(tmp_path):
     assert created_path == str(test_dir)
 
 
+
+def test_copy_range(tmp_path):
+    """测试 - 追加复制一段数据：内核复制中途失败时，从已复制的位置继续普通读写"""
+    src_file, dst_file = tmp_path / 'src.bin', tmp_path / 'dst.bin'
+    data = os.urandom(100000)
+    src_file.write_bytes(data)
+
+    def partial(fd_in, fd_out, count, offset_src):
+        """模拟 copy_file_range：复制到 30000 字节处后不再支持"""
+        if offset_src >= 30000:
+            raise OSError('不支持')
+        return os.write(fd_out, data[offset_src:offset_src + min(count, 1000)])
+
+    with open(src_file, 'rb') as src, open(dst_file, 'wb') as dst:
+        dst.write(b'head')
+        dst.flush()
+        copy_range(src, dst, 10000, 50000, buffer_size=4096)
+    assert dst_file.read_bytes() == b'head' + data[10000:60000]
+
+    with open(src_file, 'rb') as src, open(dst_file, 'wb') as dst, \
+            patch.object(os, 'copy_file_range', side_effect=partial, create=True) as mock_copy, \
+            patch.object(os, 'sendfile', side_effect=OSError('不支持'), create=True):
+        dst.write(b'head')
+        dst.flush()
+        copy_range(src, dst, 10000, 50000, buffer_size=4096)
+    assert mock_copy.call_count == 21
+    assert dst_file.read_bytes() == b'head' + data[10000:60000]
+
 @pytest.mark.parametrize("seconds, expected", [
     (3661, '01h01m01s'),
     (0, '00h00m00s'),
@@ -106,14 +137,14 @@ def test_check_dependence_current_folder(mocked_exists):
 
 
 @patch('MP3Random.mp3random.utils.path.exists')
-@patch('MP3Random.mp3random.utils.path.dirname')
-def test_check_dependence_env_folder(mocked_dirname, mocked_exists):
+@patch('MP3Random.mp3random.utils.resolve_tool')
+def test_check_dependence_env_folder(mocked_resolve, mocked_exists):
     """测试 - 检查依赖是否存在 - 环境变量文件夹"""
-    mocked_exists.side_effect = [False, True]
-    mocked_dirname.return_value = '/mocked/path'
+    mocked_exists.return_value = False
+    mocked_resolve.return_value = os.path.join('/mocked/path', 'ffmpeg.exe')
     assert check_dependence('ffmpeg.exe') is True
-    mocked_exists.assert_any_call('ffmpeg.exe')
-    mocked_exists.assert_any_call(os.path.join('/mocked/path', 'ffmpeg.exe'))
+    mocked_exists.assert_called_once_with('ffmpeg.exe')
+    mocked_resolve.assert_called_once_with('ffmpeg.exe')
 
 
 @patch('MP3Random.mp3random.utils.path.exists')
@@ -121,3 +152,103 @@ def test_check_dependence_not_found(mocked_exists):
     """测试 - 检查依赖是否存在 - 依赖不存在"""
     mocked_exists.return_value = False
     assert check_dependence('ffmpeg.exe') is False
+
+
+def test_update_progress_elements():
+    """测试 - 更新进度条 - 界面控件"""
+    process_inner_list = [MagicMock() for _ in range(4)]
+    update_progress(process_inner_list, 3, 10, 'old.wav', 'new.mp3')
+    assert process_inner_list[0].attributes.__setitem__.call_count == 2
+    assert process_inner_list[1].text == '3/10'
+    assert process_inner_list[2].text == 'old.wav'
+    assert process_inner_list[3].text == 'new.mp3'
+
+
+def test_update_progress_callback():
+    """测试 - 更新进度条 - 回调函数、无进度条"""
+    callback = MagicMock()
+    update_progress(callback, 3, 10, 'old.wav', 'new.mp3')
+    callback.assert_called_once_with(3, 10, 'old.wav', 'new.mp3')
+    update_progress(None, 3, 10, 'old.wav', 'new.mp3')
+
+
+def test_speed_text():
+    """测试 - 格式化处理速度和剩余时间"""
+    assert speed_text(None, None) == ''
+    assert speed_text(2.5, None) == '2.5个/秒'
+    assert speed_text(2.5, 3725) == '2.5个/秒，剩余01h02m05s'
+
+
+def test_progress_reporter_throttle():
+    """测试 - 节流的进度报告器 - 合并更新、完成时必定输出、处理速度和剩余时间"""
+    clock = MagicMock(return_value=0.0)
+    sink = MagicMock()
+    reporter = ProgressReporter(sink, rate=10, clock=clock)
+    # 每 0.01 秒更新一次，共 1000 次（10 秒），最多输出约 100 次
+    for i in range(1, 1001):
+        clock.return_value = i / 100
+        update_progress(reporter, i, 1000, f'old{i}', f'new{i}')
+    assert 90 <= sink.call_count <= 102
+    current_value, total_value, old_file, new_file, speed, eta = sink.call_args.args
+    assert (current_value, total_value, old_file, new_file) == (1000, 1000, 'old1000', 'new1000')
+    assert speed == pytest.approx(100, rel=0.01)
+    assert eta == 0
+
+
+def test_progress_reporter_stage():
+    """测试 - 节流的进度报告器 - 新过程的第一次更新立即输出，flush 输出暂存的进度"""
+    clock = MagicMock(return_value=0.0)
+    sink = MagicMock()
+    reporter = ProgressReporter(sink, rate=1, clock=clock)
+    reporter(1, 10, 'a', 'a')
+    clock.return_value = 0.5
+    reporter(2, 10, 'b', 'b')
+    assert sink.call_count == 1  # 第二次更新被暂存
+    assert sink.call_args.args[4] is None  # 尚无法计算速度
+    clock.return_value = 0.6
+    reporter(0, 5, 'c', 'c')  # 总值变化，视为新的过程
+    assert sink.call_count == 2
+    assert sink.call_args.args[:4] == (0, 5, 'c', 'c')
+    clock.return_value = 1.0
+    reporter(2, 5, 'd', 'd')
+    reporter.flush()
+    assert sink.call_count == 3
+    assert sink.call_args.args[4] == pytest.approx(5.0)
+    assert sink.call_args.args[5] == pytest.approx(0.6)
+    reporter.flush()  # 无暂存的进度时不输出
+    assert sink.call_count == 3
+
+
+def test_cancel_token():
+    """测试 - 取消标志 - 暂停、继续、取消"""
+    cancel_token = CancelToken()
+    cancel_token.check()
+    cancel_token.pause()
+    assert cancel_token.paused
+    timer = threading.Timer(0.1, cancel_token.resume)
+    timer.start()
+    start_time = time.perf_counter()
+    cancel_token.check()  # 暂停时阻塞，直至继续
+    assert time.perf_counter() - start_time >= 0.09
+    cancel_token.pause()
+    threading.Timer(0.1, cancel_token.cancel).start()
+    with pytest.raises(Cancelled):
+        cancel_token.check()  # 暂停时取消，立即抛出 Cancelled
+    assert cancel_token.cancelled
+    cancel_token.pause()  # 取消后不再暂停
+    assert not cancel_token.paused
+
+
+def test_cancel_token_track():
+    """测试 - 取消标志 - 取消时终止已登记的子进程，已取消时登记即终止"""
+    cancel_token = CancelToken()
+    running, finished = MagicMock(), MagicMock()
+    cancel_token.track(running)
+    cancel_token.track(finished)
+    cancel_token.untrack(finished)
+    cancel_token.cancel()
+    running.kill.assert_called_once()
+    finished.kill.assert_not_called()
+    late = MagicMock()
+    cancel_token.track(late)  # 启动期间被取消
+    late.kill.assert_called_once()